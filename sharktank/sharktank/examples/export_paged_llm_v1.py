@@ -137,6 +137,7 @@ def main():
             "transformer_block_count": hp.block_count,
             "logits_normalization": logits_normalization,
             "top_k": args.top_k,
+            "has_prefill_final_logits": args.prefill_final_logits_variant,
             "paged_kv_cache": {
                 "attention_head_count_kv": hp.attention_head_count_kv,
                 "block_seq_stride": llama_config.block_seq_stride,
@@ -248,16 +249,7 @@ def main():
             "cs": cache_dynamic_shapes,
         }
 
-        print(f"Exporting prefill_bs{bs}")
-
-        @fxb.export_program(
-            name=f"prefill_bs{bs}",
-            args=(tokens, seq_lens, seq_block_ids, cache),
-            dynamic_shapes=dynamic_shapes,
-            strict=args.strict,
-            arg_device=arg_affinities,
-        )
-        def _(model, tokens, seq_lens, seq_block_ids, cs):
+        def prefill(model, tokens, seq_lens, seq_block_ids, cs, final_logits):
             cache_tensors = cs
 
             attention_mask = None
@@ -324,7 +316,7 @@ def main():
             if args.logits_normalization == "log_softmax":
                 logits = ops.elementwise(torch.log, ops.softmax(logits, dim=-1))
 
-            if args.prefill_final_logits:
+            if final_logits:
                 last_seq_lens = seq_lens
                 bsi = torch.tensor(list(range(logits.shape[0])))
 
@@ -345,6 +337,44 @@ def main():
                 use_linalgext_topk=args.use_linalgext_topk,
             )
 
+        print(f"Exporting prefill_bs{bs}")
+
+        @fxb.export_program(
+            name=f"prefill_bs{bs}",
+            args=(tokens, seq_lens, seq_block_ids, cache),
+            dynamic_shapes=dynamic_shapes,
+            strict=args.strict,
+            arg_device=arg_affinities,
+        )
+        def _(model, tokens, seq_lens, seq_block_ids, cs):
+            return prefill(
+                model,
+                tokens,
+                seq_lens,
+                seq_block_ids,
+                cs,
+                final_logits=args.prefill_final_logits,
+            )
+
+        if not args.prefill_final_logits_variant:
+            return
+
+        # Gathers the logits of each row's last position on device, so callers
+        # that only sample the next token transfer [bs, 1, vocab] to the host.
+        print(f"Exporting prefill_final_bs{bs}")
+
+        @fxb.export_program(
+            name=f"prefill_final_bs{bs}",
+            args=(tokens, seq_lens, seq_block_ids, cache),
+            dynamic_shapes=dynamic_shapes,
+            strict=args.strict,
+            arg_device=arg_affinities,
+        )
+        def _(model, tokens, seq_lens, seq_block_ids, cs):
+            return prefill(
+                model, tokens, seq_lens, seq_block_ids, cs, final_logits=True
+            )
+
     def generate_batch_decode(bs: int):
         # torch.export.Dim would make min at least 2
         block_dim_min = 2
@@ -175,6 +175,11 @@ def add_model_options(parser: argparse.ArgumentParser):
         help="Return only the final logits",
         action="store_true",
     )
+    parser.add_argument(
+        "--prefill-final-logits-variant",
+        help="Also export `prefill_final_bs{bs}` entrypoints returning only the final logits",
+        action="store_true",
+    )
     parser.add_argument(
         "--attention-chunk-size",
         help="the size of each chunk used during chunked attention computation",
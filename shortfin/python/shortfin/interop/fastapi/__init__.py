@@ -94,6 +94,8 @@ class FastAPIResponder(AbstractResponder):
         self.response = asyncio.Future(loop=self._loop)
         self.responded = False
         self._streaming_queue: asyncio.Queue | None = None
+        self._streaming_backlog = 0
+        self._streaming_lock = threading.Lock()
         self._status_tracker = RequestStatusTracker(request)
 
     def close(self):
@@ -120,12 +122,18 @@ class FastAPIResponder(AbstractResponder):
     ):
         """Sends an error response back for the transaction.
 
-        This is intended to sending error responses back to the user
+        This is intended to sending error responses back to the user. A
+        `retry_after` extra field, in seconds, is also sent as the
+        `Retry-After` header.
         """
         status_code = _fastapi_response_map[code]
+        headers = None
+        if "retry_after" in extra_fields:
+            headers = {"Retry-After": str(extra_fields["retry_after"])}
         error_response = JSONResponse(
             status_code=status_code,
             content={"error": error_message, "code": code.value, **extra_fields},
+            headers=headers,
         )
         self.send_response(error_response)
         self.ensure_response()
@@ -167,6 +175,8 @@ class FastAPIResponder(AbstractResponder):
                 if part is None:
                     break
                 yield part
+                with self._streaming_lock:
+                    self._streaming_backlog -= 1
 
         def start(request, streaming_queue, response_future):
             response = StreamingResponse(gen(request, streaming_queue), **kwargs)
@@ -184,6 +194,18 @@ class FastAPIResponder(AbstractResponder):
         assert self._streaming_queue is not None, "stream_start() not called"
         if self._loop.is_closed():
             raise IOError("Web server is shut down")
+        if content is not None:
+            with self._streaming_lock:
+                self._streaming_backlog += 1
         self._loop.call_soon_threadsafe(self._streaming_queue.put_nowait, content)
         if content is None:
             self._streaming_queue = None
+
+    def stream_backlog(self) -> int:
+        """Number of streamed parts not yet sent to the client.
+
+        Producers can use this to coalesce parts instead of queueing without
+        bound for a slow client.
+        """
+        with self._streaming_lock:
+            return self._streaming_backlog
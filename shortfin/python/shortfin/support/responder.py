@@ -40,3 +40,7 @@ class AbstractResponder:
 
     def stream_part(self, content: bytes | None):
         pass
+
+    def stream_backlog(self) -> int:
+        """Number of streamed parts not yet consumed by the client."""
+        return 0
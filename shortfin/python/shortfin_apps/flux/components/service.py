@@ -7,6 +7,7 @@
 import asyncio
 import logging
 import math
+import time
 import torch
 import numpy as np
 from tqdm.auto import tqdm
@@ -17,7 +18,15 @@ from PIL import Image
 import shortfin as sf
 import shortfin.array as sfnp
 
-from ...utils import GenerateService, BatcherProcess
+from ...utils import (
+    AdaptiveFlushPolicy,
+    GenerateService,
+    BatcherProcess,
+    DenoiseCohort,
+    DenoiseLoop,
+    EmbeddingCache,
+    embedding_key,
+)
 
 from .config_struct import ModelParams
 from .manager import FluxSystemManager
@@ -75,6 +84,8 @@ class FluxGenerateService(GenerateService):
         prog_isolation: str = "per_fiber",
         show_progress: bool = False,
         trace_execution: bool = False,
+        batch_latency_budget_ms: float = 50.0,
+        embedding_cache_mb: int = 0,
     ):
         super().__init__(sysman, fibers_per_device, workers_per_device)
         self.name = name
@@ -83,6 +94,14 @@ class FluxGenerateService(GenerateService):
         self.model_params = model_params
         self.trace_execution = trace_execution
         self.show_progress = show_progress
+        # Longest time a request waits in the batcher for others to fly with.
+        self.batch_latency_budget_ms = batch_latency_budget_ms
+        # Text embeddings of recent prompts, shared by all devices. 0 disables it.
+        self.embedding_cache = (
+            EmbeddingCache(embedding_cache_mb * 2**20)
+            if embedding_cache_mb > 0
+            else None
+        )
 
         # Finish initialization
         self.set_isolation(prog_isolation)
@@ -127,6 +146,13 @@ class FluxGenerateService(GenerateService):
         )
         return worker_idx
 
+    def status(self) -> dict:
+        """Returns the counters of the embedding cache, or None if it is disabled."""
+        cache = self.embedding_cache
+        if cache is None:
+            return {"embedding_cache": None}
+        return {"embedding_cache": {**cache.counters(), "hit_rate": cache.hit_rate}}
+
     def start(self):
         # Initialize programs.
         for component in self.inference_modules.keys():
@@ -202,7 +228,10 @@ class FluxBatcherProcess(BatcherProcess):
     STROBE_LONG_DELAY = 1
 
     def __init__(self, service: FluxGenerateService):
-        super().__init__(fiber=service.fibers[0])
+        super().__init__(
+            fiber=service.fibers[0],
+            flush_policy=AdaptiveFlushPolicy(service.batch_latency_budget_ms / 1000),
+        )
         self.service = service
         self.ideal_batch_size: int = max(service.model_params.max_batch_size)
         self.num_fibers = len(service.fibers)
@@ -217,8 +246,10 @@ class FluxBatcherProcess(BatcherProcess):
         waiting_count = len(self.pending_requests)
         if waiting_count == 0:
             return
-        if waiting_count < self.ideal_batch_size and self.strobes < 2:
-            logger.info("Waiting a bit longer to fill flight")
+        delay = self.flush_delay()
+        if delay > 0:
+            logger.debug(f"Waiting {delay * 1000:.2f}ms longer to fill flight")
+            self.schedule_strobe(delay)
             return
         self.strobes = 0
         batches = self.sort_batches()
@@ -266,42 +297,59 @@ class InferenceExecutorProcess(sf.Process):
         self.service = service
         self.worker_index = self.service.get_worker_index(fiber)
         self.exec_requests: list[FluxInferenceExecRequest] = []
+        self.denoise_loop = DenoiseLoop()
+        self.progress: dict[DenoiseCohort, tqdm] = {}
 
     @measure(type="exec", task="inference process")
     async def run(self):
-        try:
-            phase = None
-            for req in self.exec_requests:
-                if phase:
-                    if phase != req.phase:
-                        logger.error("Executor process recieved disjoint batch.")
-                phase = req.phase
-            phases = self.exec_requests[0].phases
-            req_count = len(self.exec_requests)
-            device0 = self.fiber.device(0)
-            if phases[InferencePhase.PREPARE]["required"]:
-                await self._prepare(device=device0, requests=self.exec_requests)
-            if phases[InferencePhase.ENCODE]["required"]:
-                await self._clip(device=device0, requests=self.exec_requests)
-                await self._t5xxl(device=device0, requests=self.exec_requests)
-            if phases[InferencePhase.DENOISE]["required"]:
-                await self._denoise(device=device0, requests=self.exec_requests)
-            if phases[InferencePhase.DECODE]["required"]:
-                await self._decode(device=device0, requests=self.exec_requests)
-            if phases[InferencePhase.POSTPROCESS]["required"]:
-                await self._postprocess(device=device0, requests=self.exec_requests)
-            await device0
-            for i in range(req_count):
-                req = self.exec_requests[i]
-                req.done.set_success()
-            if self.service.prog_isolation == sf.ProgramIsolation.PER_FIBER:
-                self.service.idle_fibers.add(self.fiber)
-
-        except Exception:
-            logger.exception("Fatal error in image generation")
-            # TODO: Cancel and set error correctly
-            for req in self.exec_requests:
-                req.done.set_success()
+        await self.denoise_loop.run(
+            self.exec_requests,
+            self._start_cohort,
+            self._denoise_step,
+            self._finish_cohort,
+            release=self._release_cohort,
+        )
+        if self.service.prog_isolation == sf.ProgramIsolation.PER_FIBER:
+            self.service.idle_fibers.add(self.fiber)
+
+    async def _start_cohort(self, requests):
+        phase = None
+        for req in requests:
+            if phase:
+                if phase != req.phase:
+                    logger.error("Executor process recieved disjoint batch.")
+            phase = req.phase
+        phases = requests[0].phases
+        device0 = self.fiber.device(0)
+        if phases[InferencePhase.PREPARE]["required"]:
+            await self._prepare(device=device0, requests=requests)
+        if phases[InferencePhase.ENCODE]["required"]:
+            await self._clip(device=device0, requests=requests)
+            await self._t5xxl(device=device0, requests=requests)
+        if phases[InferencePhase.DENOISE]["required"]:
+            return await self._initialize_denoise(device=device0, requests=requests)
+        return [DenoiseCohort(requests, 0)]
+
+    async def _finish_cohort(self, cohort: DenoiseCohort):
+        requests = cohort.requests
+        phases = requests[0].phases
+        device0 = self.fiber.device(0)
+        if phases[InferencePhase.DENOISE]["required"]:
+            await self._collect_denoised(device=device0, cohort=cohort)
+        if phases[InferencePhase.DECODE]["required"]:
+            await self._decode(device=device0, requests=requests)
+        if phases[InferencePhase.POSTPROCESS]["required"]:
+            await self._postprocess(device=device0, requests=requests)
+        await device0
+        self.service.batcher.flush_policy.record_flight(
+            len(requests), time.monotonic() - cohort.started_at
+        )
+        for req in requests:
+            req.done.set_success()
+
+    def _release_cohort(self, cohort: DenoiseCohort):
+        if cohort in self.progress:
+            self.progress.pop(cohort).close()
 
     async def _prepare(self, device, requests):
         for request in requests:
@@ -371,11 +419,44 @@ class InferenceExecutorProcess(sf.Process):
         return
 
     async def _clip(self, device, requests):
+        keys = [
+            embedding_key(device, "clip", request.clip_input_ids[0].input_ids)
+            for request in requests
+        ]
+        await self._encode_cached(device, requests, keys, "vec", self._invoke_clip)
+
+    async def _encode_cached(self, device, requests, keys, attr: str, invoke):
+        """Sets the `attr` embeddings of requests from the embedding cache.
+
+        Only requests whose embeddings are not cached are encoded by `invoke`.
+        """
+        cache = self.service.embedding_cache
+        if cache is None:
+            await invoke(device, requests)
+            return
+        missing = []
+        for request, key in zip(requests, keys):
+            cached = cache.lookup(key)
+            if cached is None:
+                missing.append((request, key))
+            else:
+                (embeds,) = cached
+                setattr(request, attr, embeds)
+        if missing:
+            await invoke(device, [request for request, _ in missing])
+            inserted = await cache.insert(
+                device, {key: [getattr(request, attr)] for request, key in missing}
+            )
+            for request, key in missing:
+                (embeds,) = inserted[key]
+                setattr(request, attr, embeds)
+
+    async def _invoke_clip(self, device, requests):
         req_bs = len(requests)
         entrypoints = self.service.inference_functions[self.worker_index]["clip"]
         if req_bs not in list(entrypoints.keys()):
             for request in requests:
-                await self._clip(device, [request])
+                await self._invoke_clip(device, [request])
             return
         for bs, fn in entrypoints.items():
             if bs == req_bs:
@@ -422,11 +503,23 @@ class InferenceExecutorProcess(sf.Process):
         return
 
     async def _t5xxl(self, device, requests):
+        keys = [
+            embedding_key(
+                device,
+                "t5xxl",
+                request.cfg_mult,
+                request.t5xxl_input_ids[0].input_ids,
+            )
+            for request in requests
+        ]
+        await self._encode_cached(device, requests, keys, "txt", self._invoke_t5xxl)
+
+    async def _invoke_t5xxl(self, device, requests):
         req_bs = len(requests)
         entrypoints = self.service.inference_functions[self.worker_index]["t5xxl"]
         if req_bs not in list(entrypoints.keys()):
             for request in requests:
-                await self._t5xxl(device, [request])
+                await self._invoke_t5xxl(device, [request])
             return
         for bs, fn in entrypoints.items():
             if bs == req_bs:
@@ -462,18 +555,18 @@ class InferenceExecutorProcess(sf.Process):
 
         return
 
-    async def _denoise(self, device, requests):
+    async def _initialize_denoise(self, device, requests):
         req_bs = len(requests)
         step_count = requests[0].steps
-        print(step_count)
         cfg_mult = requests[0].cfg_mult
 
         # Produce denoised latents
         entrypoints = self.service.inference_functions[self.worker_index]["denoise"]
         if req_bs not in list(entrypoints.keys()):
+            cohorts = []
             for request in requests:
-                await self._denoise(device, [request])
-            return
+                cohorts.extend(await self._initialize_denoise(device, [request]))
+            return cohorts
         for bs, fns in entrypoints.items():
             if bs == req_bs:
                 break
@@ -606,28 +699,40 @@ class InferenceExecutorProcess(sf.Process):
         )
         denoise_inputs["timesteps"].copy_from(ts_host)
         await device
-
-        for i, t in tqdm(
-            enumerate(range(step_count)),
+        cohort = DenoiseCohort(requests, step_count, buffers=denoise_inputs)
+        self.progress[cohort] = tqdm(
+            total=step_count,
             disable=(not self.service.show_progress),
             desc=f"DENOISE (bs{req_bs})",
-        ):
-            s_host = denoise_inputs["step"].for_transfer()
-            with s_host.map(write=True) as m:
-                s_host.items = [i]
-            denoise_inputs["step"].copy_from(s_host)
-
-            logger.info(
-                "INVOKE %r",
-                fns["sampler"],
-            )
-            await device
-            (noise_pred,) = await fns["sampler"](
-                *denoise_inputs.values(), fiber=self.fiber
-            )
-            await device
-            denoise_inputs["img"].copy_from(noise_pred)
+        )
+        return [cohort]
+
+    async def _denoise_step(self, cohort: DenoiseCohort):
+        device = self.fiber.device(0)
+        denoise_inputs = cohort.buffers
+        entrypoints = self.service.inference_functions[self.worker_index]["denoise"]
+        fns = entrypoints[len(cohort.requests)]
 
+        s_host = denoise_inputs["step"].for_transfer()
+        with s_host.map(write=True) as m:
+            s_host.items = [cohort.step]
+        denoise_inputs["step"].copy_from(s_host)
+
+        logger.info(
+            "INVOKE %r",
+            fns["sampler"],
+        )
+        await device
+        (noise_pred,) = await fns["sampler"](*denoise_inputs.values(), fiber=self.fiber)
+        await device
+        denoise_inputs["img"].copy_from(noise_pred)
+        self.progress[cohort].update()
+
+    async def _collect_denoised(self, device, cohort: DenoiseCohort):
+        requests = cohort.requests
+        denoise_inputs = cohort.buffers
+        cfg_mult = requests[0].cfg_mult
+        img_shape = denoise_inputs["img"].shape
         for idx, req in enumerate(requests):
             req.denoised_latents = sfnp.device_array.for_device(
                 device, img_shape, self.service.model_params.vae_dtype
@@ -711,27 +816,17 @@ class InferenceExecutorProcess(sf.Process):
     async def _postprocess(self, device, requests):
         # Process output images
         for req in requests:
-            image_shape = [
-                3,
-                req.height,
-                req.width,
-            ]
-            out_shape = [req.height, req.width, 3]
-            images_planar = sfnp.device_array.for_host(
-                device, image_shape, self.service.model_params.vae_dtype
-            )
-            images_planar.copy_from(req.image_array)
-            await device
+            out_shape = [1, req.height, req.width, 3]
             permuted = sfnp.device_array.for_host(
                 device, out_shape, self.service.model_params.vae_dtype
             )
-            out = sfnp.device_array.for_host(device, out_shape, sfnp.uint8)
-            sfnp.transpose(images_planar, (1, 2, 0), out=permuted)
+            # The decoded image is read in place from the host array it was
+            # transferred into.
+            sfnp.transpose(req.image_array, (0, 2, 3, 1), out=permuted)
             permuted = sfnp.multiply(127.5, (sfnp.add(permuted, 1.0)))
             out = sfnp.round(permuted, dtype=sfnp.uint8)
-            out_bytes = bytes(out.map(read=True))
             processed_image = Image.frombytes(
-                mode="RGB", size=out.shape[:2], data=out_bytes
+                mode="RGB", size=(req.width, req.height), data=out.map(read=True)
             )
             req.response_image = processed_image
         return
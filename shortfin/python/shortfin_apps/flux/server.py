@@ -94,6 +94,11 @@ async def health() -> Response:
     return Response(status_code=200)
 
 
+@app.get("/status")
+async def status() -> dict:
+    return services["flux"].status()
+
+
 async def generate_request(gen_req: GenerateReqInput, request: Request):
     service = services["flux"]
     gen_req.post_init()
@@ -146,6 +151,8 @@ def configure_service(args, sysman, model_config, flagfile, tuning_spec):
         prog_isolation=args.isolation,
         show_progress=args.show_progress,
         trace_execution=args.trace_execution,
+        batch_latency_budget_ms=args.batch_latency_budget_ms,
+        embedding_cache_mb=args.embedding_cache_mb,
     )
     for key, vmfblist in vmfbs.items():
         for vmfb in vmfblist:
@@ -342,6 +349,18 @@ def main(argv, log_config=UVICORN_LOG_CONFIG):
         choices=["per_fiber", "per_call", "none"],
         help="Concurrency control -- How to isolate programs.",
     )
+    parser.add_argument(
+        "--batch_latency_budget_ms",
+        type=float,
+        default=50.0,
+        help="Concurrency control -- longest time in milliseconds a request waits for others to batch with. The batcher flushes earlier when the observed arrival rate and flight latencies predict waiting would not pay off.",
+    )
+    parser.add_argument(
+        "--embedding_cache_mb",
+        type=int,
+        default=0,
+        help="Device memory in MiB for caching the text encoder outputs of recent prompts, evicting the least recently used ones. 0, the default, disables the cache.",
+    )
     parser.add_argument(
         "--show_progress",
         action="store_true",
@@ -9,13 +9,14 @@ Uses shortfin_apps.llm.components.lifecycle to configure a FastAPI application.
 """
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from .routes import application_router, generation_router
+from .routes import application_router, generation_router, metrics_router
 from fastapi import FastAPI
 
 
 def add_routes(app: FastAPI):
     app.include_router(application_router)
     app.include_router(generation_router)
+    app.include_router(metrics_router)
     return app
 
 
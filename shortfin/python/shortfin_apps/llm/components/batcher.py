@@ -4,9 +4,12 @@
 # See https://llvm.org/LICENSE.txt for license information.
 # SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
 
+import itertools
 import logging
+import numpy as np
 import os
-from typing import List, Optional, Tuple, Union
+import time
+from typing import Callable, List, Optional, Tuple, Union
 
 
 import shortfin as sf
@@ -15,7 +18,7 @@ import shortfin.array as sfnp
 from shortfin import Fiber
 
 from .device_array_cache import DeviceArrayCache, WrappedAllocation, Allocation
-from .scheduler import Scheduler
+from .scheduler import LengthBucketBuilder, Scheduler, TokenBudgetWorkloadBuilder
 from ...utils import BatcherProcess
 
 from .config_struct import ModelParams
@@ -23,8 +26,13 @@ from .kvcache.base_attention_cache import (
     BasePagedAttentionCache,
     CacheAllocationFailure,
 )
+from .kvcache.page_pool import PagePool
+from .kvcache.trie_attention_cache import TriePagedAttentionCache
 
-from .messages import LlmInferenceExecRequest
+from .messages import LlmInferenceExecRequest, InferencePhase
+from .metrics import ServiceMetrics
+from .scheduling_policy import SchedulingPolicy
+from .token_selection_strategy.sampler import Sampler
 
 logger = logging.getLogger(__name__)
 
@@ -36,6 +44,67 @@ logger = logging.getLogger(__name__)
 import math
 
 
+def pack_host_array(allocation: Allocation, rows: List, fill: int = 0):
+    """Write int64 arguments into the host buffer of `allocation` in bulk.
+
+    The buffer is mapped once and written through NumPy. It is filled with
+    `fill`, then element `i` of a 1D array, or the leading elements of row `i`
+    of a 2D array, are set from `rows[i]`. Missing rows are left as padding.
+
+    Args:
+        allocation (Allocation): Staging allocation of dtype int64.
+        rows (List): Values (1D) or lists of values (2D), at most one per row.
+        fill (int): Padding value.
+    """
+    assert allocation.dtype == sfnp.int64
+    with allocation.host.map(discard=True) as m:
+        array = np.frombuffer(m, dtype=np.int64).reshape(allocation.shape)
+        array.fill(fill)
+        if array.ndim == 1:
+            array[: len(rows)] = rows
+            return
+        for i, row in enumerate(rows):
+            array[i, : len(row)] = row
+
+
+def extend_continuation(
+    request: LlmInferenceExecRequest,
+) -> Optional[LlmInferenceExecRequest]:
+    """Extend the allocation of a prefill continuing at `start_position`.
+
+    Returns:
+        The request, or None if its pages could not be acquired yet. The
+        batcher then keeps the request pending until pages are freed.
+    """
+    assert request.allocation is not None
+    try:
+        request.allocation.extend_allocation(request.input_token_ids)
+    except CacheAllocationFailure:
+        logger.debug("Cannot extend allocation of %r", request)
+        return None
+    return request
+
+
+def copy_shared_pages(
+    cache: BasePagedAttentionCache,
+    requests: List[LlmInferenceExecRequest],
+    seq_stride: int,
+):
+    """Copy shared pages that the decode requests of a flight will write to.
+
+    Beams forked from the same request share their tail page until they write
+    to it, at which point each gets a private copy. All copies for the flight
+    are issued at once.
+    """
+    writes = [
+        (request.allocation, request.start_position // seq_stride)
+        for request in requests
+        if request.phase == InferencePhase.DECODE
+    ]
+    if writes:
+        cache.copy_on_write(writes)
+
+
 class LlmBatcherProcess(BatcherProcess):
     """This batcher provides a high-level mechanism for dispatching LLM tasks."""
 
@@ -51,6 +120,8 @@ class LlmBatcherProcess(BatcherProcess):
         functions: dict[int, sf.ProgramFunction],
         ideal_batch_size: int,
         program_isolation: str,
+        scheduling_policy: Optional[SchedulingPolicy] = None,
+        metrics: Optional[ServiceMetrics] = None,
     ):
         super().__init__(fiber=fiber)
         self.name = name
@@ -66,9 +137,14 @@ class LlmBatcherProcess(BatcherProcess):
         self.cache: DeviceArrayCache = DeviceArrayCache(fiber.device(0))
 
         self.program_isolation = program_isolation
+        self.scheduling_policy = (
+            SchedulingPolicy() if scheduling_policy is None else scheduling_policy
+        )
+        self.metrics = metrics
 
     def handle_inference_request(self, request):
         """Handle an inference request."""
+        request.enqueued_at = time.monotonic()
         self.pending.add(request)
 
     def shutdown(self):
@@ -78,6 +154,8 @@ class LlmBatcherProcess(BatcherProcess):
 
     async def process_batches(self):
         """Process batches of requests."""
+        # Pages evicted to host memory are held until their copies completed.
+        await self.page_cache.page_pool.fence_transfers()
         await self.board_flights()
 
     def reserve_workitem(self, *, rid, count):
@@ -101,57 +179,91 @@ class LlmBatcherProcess(BatcherProcess):
         if len(pending) == 0:
             return
 
-        # Determine the requested requests these jobs are for
-        rids = set([j.orig_instance_id for j in pending])
-
-        # Group jobs together under their rid
-        rid_map = {rid: [] for rid in rids}
-        for j in pending:
-            rid_map[j.orig_instance_id].append(j)
+        # Group jobs together under their rid, in priority order
+        rid_map = {}
+        for j in self.scheduling_policy.order(self.order_pending(pending)):
+            rid_map.setdefault(j.orig_instance_id, []).append(j)
 
         to_schedule = self.scheduler.should_execute(rid_map, self.strobes)
+        to_schedule = self.form_flights(to_schedule)
 
         cache = self.page_cache
         scheduled = []
+        boarded = []
         for job in to_schedule:
             scheduled = scheduled + job
-            self.board(cache, self.fiber, job)
+            boarded.extend(self.board(cache, self.fiber, job))
             logger.debug("Post boarding cache state: %r", cache)
+        self.scheduling_policy.boarded(boarded)
 
         pending = set(pending) - set(scheduled)
         self.pending = self.pending | pending
 
+    def order_pending(
+        self, pending: set[LlmInferenceExecRequest]
+    ) -> List[LlmInferenceExecRequest]:
+        """Order pending requests by scheduling priority.
+
+        Requests left out of the returned list stay pending for a later flight.
+        """
+        return list(pending)
+
+    def form_flights(
+        self, jobs: List[List[LlmInferenceExecRequest]]
+    ) -> List[List[LlmInferenceExecRequest]]:
+        """Arrange scheduled jobs into the flights that will be launched."""
+        return jobs
+
     def make_process(self, cache: BasePagedAttentionCache, fiber: Fiber):
         ...
 
     def board_request(self, cache, request: LlmInferenceExecRequest):
         ...
 
-    def board(self, cache: BasePagedAttentionCache, fiber: Fiber, to_schedule: set):
+    def board(
+        self, cache: BasePagedAttentionCache, fiber: Fiber, to_schedule: set
+    ) -> List[LlmInferenceExecRequest]:
         """Create and launch an LlmExecutorProcess for the given requests.
 
         Args:
             cache (BasePagedAttentionCache): KVCache to use for this flight.
             fiber (Fiber): Fiber to use for invocation.
             to_schedule (set): Scheduled requests to be invoked in this flight.
+
+        Returns:
+            List[LlmInferenceExecRequest]: The requests that boarded the flight.
+            The others are pending again.
         """
         # Fill prefill flights.
         assert len(to_schedule) > 0
         assert len(to_schedule) <= self.ideal_batch_size
 
         exec_process = self.make_process(cache, fiber)
+        exec_process.metrics = self.metrics
+        exec_process.page_pool = self.page_cache.page_pool
 
         for request in to_schedule:
-            request = self.board_request(cache, request)
+            boarded = self.board_request(cache, request)
 
             # Can flight this request.
-            if request is not None:
-                exec_process.exec_requests.append(request)
+            if boarded is not None:
+                exec_process.exec_requests.append(boarded)
+            else:
+                # Its pages could not be acquired, retry on a later flight.
+                self.pending.add(request)
 
         # We've filled our flight. Remove from the boarding area.
         if exec_process.exec_requests:
+            self.prepare_flight(cache, exec_process.exec_requests)
             # And takeoff.
             exec_process.launch()
+        return exec_process.exec_requests
+
+    def prepare_flight(
+        self, cache: BasePagedAttentionCache, requests: List[LlmInferenceExecRequest]
+    ):
+        """Prepare the cache for the requests of a flight before it launches."""
+        ...
 
 
 class PrefillBatcherProcess(LlmBatcherProcess):
@@ -163,6 +275,10 @@ class PrefillBatcherProcess(LlmBatcherProcess):
     STROBE_SHORT_DELAY = 0.065
     STROBE_LONG_DELAY = 0.065
 
+    # Modeled fixed cost of a prefill invocation, in padded tokens. Flights are
+    # only split into finer length buckets when that saves more padding.
+    FLIGHT_OVERHEAD_TOKENS = 256
+
     def __init__(
         self,
         fiber: Fiber,
@@ -170,6 +286,10 @@ class PrefillBatcherProcess(LlmBatcherProcess):
         model_params: ModelParams,
         prefill_functions: dict[int, sf.ProgramFunction],
         program_isolation: str,
+        chunk_block_size: Optional[int] = None,
+        prefill_final_functions: Optional[dict[int, sf.ProgramFunction]] = None,
+        scheduling_policy: Optional[SchedulingPolicy] = None,
+        metrics: Optional[ServiceMetrics] = None,
     ):
         super().__init__(
             name="prefill",
@@ -179,8 +299,121 @@ class PrefillBatcherProcess(LlmBatcherProcess):
             functions=prefill_functions,
             ideal_batch_size=max(model_params.prefill_batch_sizes),
             program_isolation=program_isolation,
+            scheduling_policy=scheduling_policy,
+            metrics=metrics,
+        )
+        if chunk_block_size is not None:
+            if chunk_block_size <= 0:
+                raise ValueError(
+                    f"`chunk_block_size` must be positive, got {chunk_block_size}"
+                )
+            if not model_params.has_prefill_position:
+                raise ValueError(
+                    "Chunked prefill requires a model exported with `has_prefill_position`"
+                )
+        self.chunk_block_size = chunk_block_size
+        if prefill_final_functions is not None and model_params.has_prefill_position:
+            raise ValueError(
+                "`prefill_final_functions` are not supported with `has_prefill_position`"
+            )
+        self.final_functions = prefill_final_functions
+        self.bucket_builder = LengthBucketBuilder(
+            batch_sizes=model_params.prefill_batch_sizes,
+            seq_stride=self.page_seq_stride,
+            flight_overhead=self.FLIGHT_OVERHEAD_TOKENS,
         )
 
+        # Prefix-cache-aware admission, only useful when pages are shared.
+        self.prefix_aware = isinstance(page_cache, TriePagedAttentionCache)
+        # Uncached prefix -> request scheduled to populate its pages.
+        self.populating: dict[tuple, LlmInferenceExecRequest] = {}
+        # Pending request -> (trie version, token count, match length).
+        self.match_lengths: dict[LlmInferenceExecRequest, tuple[int, int, int]] = {}
+
+    def match_length(self, request: LlmInferenceExecRequest) -> int:
+        """Cached tokens of `request`, recomputed only once the trie changed."""
+        cache = self.page_cache
+        key = (cache.version, len(request.input_token_ids))
+        entry = self.match_lengths.get(request)
+        if entry is None or entry[:2] != key:
+            entry = (*key, cache.match_length(request.input_token_ids))
+            self.match_lengths[request] = entry
+        return entry[2]
+
+    def order_pending(
+        self, pending: set[LlmInferenceExecRequest]
+    ) -> List[LlmInferenceExecRequest]:
+        """Prioritize requests by cache hit and deduplicate shared prefixes.
+
+        Requests with the most cached tokens are scheduled first. Requests
+        whose first uncached page is the same are grouped: only one of them is
+        scheduled, and the rest wait until it has published the shared pages,
+        so the prefix is computed once.
+        """
+        if not self.prefix_aware:
+            return list(pending)
+
+        cache = self.page_cache
+        stride = self.page_seq_stride
+
+        # Drop leaders that were not boarded, or whose pages were published.
+        self.populating = {
+            key: leader
+            for key, leader in self.populating.items()
+            if leader.allocation is not None
+            and cache.match_length(list(key)) < len(key)
+        }
+
+        self.match_lengths = {
+            request: entry
+            for request, entry in self.match_lengths.items()
+            if request in pending
+        }
+        hits = {request: self.match_length(request) for request in pending}
+
+        # Continuations of chunked prefills already hold their pages.
+        ordered = sorted(
+            pending,
+            key=lambda r: (r.start_position == 0, -max(hits[r], r.start_position)),
+        )
+
+        admitted = []
+        for request in ordered:
+            tokens = request.input_token_ids
+            cached = max(hits[request], request.start_position)
+            if cached + stride > len(tokens):
+                # Nothing left to share with other requests.
+                admitted.append(request)
+                continue
+
+            key = tuple(tokens[: cached + stride])
+            leader = self.populating.get(key)
+            if leader is None:
+                self.populating[key] = request
+                admitted.append(request)
+            elif leader is request or request.start_position > 0:
+                admitted.append(request)
+
+        return admitted
+
+    def request_tokens(self, request: LlmInferenceExecRequest) -> int:
+        """Number of tokens `request` prefills in its next flight."""
+        remaining = len(request.input_token_ids) - request.start_position
+        if self.chunk_block_size is None or request.return_all_logits:
+            return remaining
+        return min(remaining, self.chunk_block_size * self.page_seq_stride)
+
+    def form_flights(
+        self, jobs: List[List[LlmInferenceExecRequest]]
+    ) -> List[List[LlmInferenceExecRequest]]:
+        """Bucket scheduled requests by length to reduce padding.
+
+        Every flight is padded to its longest request, so mixing short and long
+        prompts wastes compute on padding. The scheduled requests are regrouped
+        into the flights with the lowest modeled cost.
+        """
+        return self.bucket_builder.build(jobs, self.request_tokens)
+
     def make_process(self, cache: BasePagedAttentionCache, fiber: Fiber):
         return PrefillExecutorProcess(
             fiber,
@@ -189,9 +422,19 @@ class PrefillBatcherProcess(LlmBatcherProcess):
             self.page_seq_stride,
             cache.page_pool.page_tables,
             self.program_isolation,
+            has_prefill_position=self.model_params.has_prefill_position,
+            chunk_block_size=self.chunk_block_size,
+            requeue_callback=self.submit,
+            final_functions=self.final_functions,
         )
 
     def board_request(self, cache, request: LlmInferenceExecRequest):
+        if request.start_position > 0:
+            # Continuation of a chunked prefill, whose pages were acquired
+            # when its first chunk boarded, or verification of speculative
+            # tokens, which may need pages past those already held.
+            return extend_continuation(request)
+
         needed_pages = math.ceil(len(request.input_token_ids) / self.page_seq_stride)
         # allocate kv cache pages
         try:
@@ -210,10 +453,54 @@ class PrefillBatcherProcess(LlmBatcherProcess):
         return request
 
 
+class RecomputeProcess(sf.Process):
+    """Recomputes the KV cache of a preempted decode request.
+
+    The tokens before the request's decode position are prefilled into a new
+    allocation, reusing any of their pages still in the prefix cache, and the
+    request is then resubmitted to its decode batcher.
+    """
+
+    def __init__(
+        self,
+        batcher: "DecodeBatcherProcess",
+        request: LlmInferenceExecRequest,
+        prefill_callback: Callable[[LlmInferenceExecRequest], None],
+    ):
+        super().__init__(fiber=batcher.fiber)
+        self.batcher = batcher
+        self.request = request
+        self.prefill_callback = prefill_callback
+
+    async def run(self):
+        request = self.request
+        prefill_req = LlmInferenceExecRequest(
+            phase=InferencePhase.PREFILL,
+            input_token_ids=request.input_token_ids[: request.start_position],
+            rid=request.rid,
+            scheduling_info=request.scheduling_info,
+        )
+        prefill_req._cache = request._cache
+        self.prefill_callback(prefill_req)
+        await prefill_req.done
+
+        request.allocation = prefill_req.allocation
+        prefill_req.allocation = None
+        self.batcher.submit(request)
+
+
 class DecodeBatcherProcess(LlmBatcherProcess):
     """The batcher is a persistent process responsible for flighting incoming work
     into batches and handling the requisite cache allocations (since every batch needs
     committed cache state).
+
+    When the page pool is exhausted, the newest requests of a flight are
+    preempted so that older ones can extend their allocations. With
+    `preemption_mode="swap"` their pages are copied to host memory and restored
+    once enough pages are free. With `preemption_mode="recompute"` their pages
+    are released, and the tokens before their decode position are prefilled
+    again through `recompute_callback`. Either way the requests resume decoding
+    where they left off.
     """
 
     STROBE_SHORT_DELAY = 0.0006
@@ -226,6 +513,10 @@ class DecodeBatcherProcess(LlmBatcherProcess):
         model_params: ModelParams,
         decode_functions: dict[int, sf.ProgramFunction],
         program_isolation: str,
+        preemption_mode: str = "none",
+        recompute_callback: Optional[Callable[[LlmInferenceExecRequest], None]] = None,
+        scheduling_policy: Optional[SchedulingPolicy] = None,
+        metrics: Optional[ServiceMetrics] = None,
     ):
         super().__init__(
             name="decode",
@@ -235,7 +526,117 @@ class DecodeBatcherProcess(LlmBatcherProcess):
             functions=decode_functions,
             ideal_batch_size=max(model_params.decode_batch_sizes),
             program_isolation=program_isolation,
+            scheduling_policy=scheduling_policy,
+            metrics=metrics,
         )
+        if preemption_mode not in ("none", "swap", "recompute"):
+            raise ValueError(f"Unknown preemption mode: {preemption_mode}")
+        if preemption_mode == "swap" and isinstance(
+            page_cache, TriePagedAttentionCache
+        ):
+            raise ValueError("Swap preemption is not supported with prefix sharing")
+        if preemption_mode == "recompute" and recompute_callback is None:
+            raise ValueError("Recompute preemption requires a `recompute_callback`")
+        self.preemption_mode = preemption_mode
+        self.recompute_callback = recompute_callback
+        # Preempted requests, until they are pending again.
+        self.preempted: set[LlmInferenceExecRequest] = set()
+        # Swapped out requests with their host pages, in preemption order.
+        self.swapped: List[Tuple[LlmInferenceExecRequest, list]] = []
+        self.preemption_count = 0
+
+    def handle_inference_request(self, request):
+        if request in self.preempted:
+            self.preempted.remove(request)
+            self.scheduler.resume(rid=request.orig_instance_id, count=1)
+        super().handle_inference_request(request)
+
+    async def board_flights(self):
+        self.swap_in_requests()
+        await super().board_flights()
+        # Requests preempted while boarding wait to be resumed instead.
+        self.pending -= self.preempted
+
+    def preemption_order(
+        self, requests: List[LlmInferenceExecRequest]
+    ) -> List[LlmInferenceExecRequest]:
+        """Order `requests` from the last to the first to preempt.
+
+        Requests are ordered by the scheduling policy, then oldest first.
+        """
+        requests = sorted(requests, key=lambda r: r.created_at)
+        return self.scheduling_policy.order(requests)
+
+    def preempt(self, request: LlmInferenceExecRequest):
+        """Release the pages of `request` until it can be resumed."""
+        cache = self.page_cache
+        self.preempted.add(request)
+        self.scheduler.suspend(rid=request.orig_instance_id, count=1)
+        self.preemption_count += 1
+        logger.info(
+            "Preempting %s to %s %d pages (%r)",
+            request.instance_id,
+            self.preemption_mode,
+            len(request.allocation.pages),
+            cache.page_pool,
+        )
+
+        if self.preemption_mode == "swap":
+            host_pages = cache.swap_out(request.allocation)
+            request.allocation = None
+            self.swapped.append((request, host_pages))
+            return
+
+        # Pages that are not published would not return to the pool otherwise.
+        allocation = request.allocation
+        allocation.truncate(allocation.cached_token_count)
+        request.free_cache_pages()
+        RecomputeProcess(self, request, self.recompute_callback).launch()
+
+    def swap_in_requests(self):
+        """Resume swapped out requests in `preemption_order` while pages are free."""
+        swapped = dict(self.swapped)
+        self.swapped = [(r, swapped[r]) for r in self.preemption_order(list(swapped))]
+        while self.swapped:
+            request, host_pages = self.swapped[0]
+            try:
+                request.allocation = self.page_cache.swap_in(host_pages)
+            except CacheAllocationFailure:
+                return
+            self.swapped.pop(0)
+            self.handle_inference_request(request)
+
+    def form_flights(
+        self, jobs: List[List[LlmInferenceExecRequest]]
+    ) -> List[List[LlmInferenceExecRequest]]:
+        """Extend the allocations of scheduled requests, preempting if needed.
+
+        Allocations are extended oldest request first. When no page is left,
+        the newest scheduled request not extended yet is preempted, which may
+        be the request being extended itself.
+        """
+        if self.preemption_mode == "none":
+            return jobs
+
+        remaining = self.preemption_order(list(itertools.chain(*jobs)))
+        boarded = set()
+        while remaining:
+            request = remaining.pop(0)
+            while True:
+                try:
+                    request.allocation.extend_allocation(
+                        request.input_token_ids, extra_token_slots=1
+                    )
+                    boarded.add(request)
+                    break
+                except CacheAllocationFailure:
+                    if not remaining:
+                        self.preempt(request)
+                        break
+                    self.preempt(remaining.pop())
+
+        jobs = [[r for r in job if r in boarded] for job in jobs]
+        return [job for job in jobs if job]
 
     def make_process(self, cache: BasePagedAttentionCache, fiber: Fiber):
         return DecodeExecutorProcess(
@@ -253,6 +654,173 @@ class DecodeBatcherProcess(LlmBatcherProcess):
         )
         return request
 
+    def prepare_flight(
+        self, cache: BasePagedAttentionCache, requests: List[LlmInferenceExecRequest]
+    ):
+        copy_shared_pages(cache, requests, self.page_seq_stride)
+
+
+class MixedBatcherProcess(LlmBatcherProcess):
+    """Batcher that packs decode steps and prefill chunks into one invocation.
+
+    Decode requests of a flight each contribute a single token, prefill
+    requests contribute their next chunk. Decode work is boarded first, then
+    prefill chunks fill the remaining `token_budget`. Work that does not fit is
+    left pending for the next flight, which keeps decode step latency bounded
+    while long prompts are prefilled.
+    """
+
+    STROBE_SHORT_DELAY = 0.0006
+    STROBE_LONG_DELAY = 0.0006
+
+    def __init__(
+        self,
+        fiber: Fiber,
+        page_cache: BasePagedAttentionCache,
+        model_params: ModelParams,
+        prefill_functions: dict[int, sf.ProgramFunction],
+        program_isolation: str,
+        token_budget: int,
+        chunk_block_size: Optional[int] = None,
+        scheduling_policy: Optional[SchedulingPolicy] = None,
+        metrics: Optional[ServiceMetrics] = None,
+    ):
+        super().__init__(
+            name="mixed",
+            fiber=fiber,
+            page_cache=page_cache,
+            model_params=model_params,
+            functions=prefill_functions,
+            ideal_batch_size=max(model_params.prefill_batch_sizes),
+            program_isolation=program_isolation,
+            scheduling_policy=scheduling_policy,
+            metrics=metrics,
+        )
+        if not model_params.has_prefill_position:
+            raise ValueError(
+                "Mixed batching requires a model exported with `has_prefill_position`"
+            )
+        if token_budget < self.page_seq_stride:
+            raise ValueError(
+                f"`token_budget` ({token_budget}) must be at least one KV cache block "
+                f"({self.page_seq_stride} tokens)"
+            )
+        self.token_budget = token_budget
+        if chunk_block_size is None:
+            chunk_block_size = token_budget // self.page_seq_stride
+        self.chunk_block_size = chunk_block_size
+        # Decode requests the scheduler released that did not fit a flight.
+        self.deferred: set[LlmInferenceExecRequest] = set()
+
+    def make_process(self, cache: BasePagedAttentionCache, fiber: Fiber):
+        return MixedExecutorProcess(
+            fiber,
+            self.cache,
+            self.functions,
+            self.page_seq_stride,
+            cache.page_pool.page_tables,
+            self.program_isolation,
+            chunk_block_size=self.chunk_block_size,
+            requeue_callback=self.submit,
+        )
+
+    def request_tokens(self, request: LlmInferenceExecRequest) -> int:
+        """Number of tokens `request` contributes to its next flight."""
+        if request.phase == InferencePhase.DECODE:
+            return 1
+        remaining = len(request.input_token_ids) - request.start_position
+        return min(remaining, self.chunk_block_size * self.page_seq_stride)
+
+    async def board_flights(self):
+        """Make, schedule, and launch a single mixed flight of pending requests."""
+        pending = self.pending
+        self.pending = set()
+
+        if len(pending) == 0:
+            return
+
+        policy = self.scheduling_policy
+        decode = policy.order(r for r in pending if r.phase == InferencePhase.DECODE)
+        # Continue prompts that already hold pages before starting new ones.
+        prefill = sorted(
+            [r for r in pending if r.phase != InferencePhase.DECODE],
+            key=lambda r: r.start_position,
+            reverse=True,
+        )
+        prefill = policy.order(prefill)
+
+        # Only a single flight is launched, so decode work the scheduler split
+        # over several jobs goes first on the next flights. Its workgroup is
+        # not complete again until it ran.
+        deferred = [r for r in decode if r in self.deferred]
+        rid_map = {}
+        for r in decode:
+            if r not in self.deferred:
+                rid_map.setdefault(r.orig_instance_id, []).append(r)
+        decode_jobs = [
+            deferred[i : i + self.ideal_batch_size]
+            for i in range(0, len(deferred), self.ideal_batch_size)
+        ]
+        decode_jobs += self.scheduler.should_execute(rid_map, self.strobes)
+
+        workload_builder = TokenBudgetWorkloadBuilder(
+            ideal_batch_size=self.ideal_batch_size, token_budget=self.token_budget
+        )
+        for job in decode_jobs:
+            workload_builder.add_work(job, len(job))
+        self.deferred = set(itertools.chain(*decode_jobs)) - (
+            workload_builder.get_scheduled()
+        )
+        for request in prefill:
+            workload_builder.add_work([request], self.request_tokens(request))
+
+        cache = self.page_cache
+        for job in workload_builder.get_jobs():
+            logger.debug(
+                "Mixed flight: %d requests, %d tokens",
+                len(job),
+                workload_builder.tokens,
+            )
+            policy.boarded(self.board(cache, self.fiber, job))
+            logger.debug("Post boarding cache state: %r", cache)
+
+        self.pending = self.pending | (pending - workload_builder.get_scheduled())
+
+    def board_request(self, cache, request: LlmInferenceExecRequest):
+        if request.phase == InferencePhase.DECODE:
+            # There is no preemption, the request waits for pages to be freed.
+            try:
+                request.allocation.extend_allocation(
+                    request.input_token_ids, extra_token_slots=1
+                )
+            except CacheAllocationFailure:
+                logger.debug("Cannot extend allocation of %r", request)
+                return None
+            return request
+
+        if request.start_position > 0:
+            return extend_continuation(request)
+
+        try:
+            allocation = cache.acquire_pages_for_tokens(
+                request.input_token_ids,
+                extra_token_slots=0,
+            )
+        except CacheAllocationFailure:
+            logger.debug(
+                "Cannot fulfill request for %d tokens", len(request.input_token_ids)
+            )
+            return None
+
+        request.free_cache_pages()
+        request.allocation = allocation
+        return request
+
+    def prepare_flight(
+        self, cache: BasePagedAttentionCache, requests: List[LlmInferenceExecRequest]
+    ):
+        copy_shared_pages(cache, requests, self.page_seq_stride)
+
 
 ########################################################################################
 # Inference Executor
@@ -283,6 +851,18 @@ class LlmExecutorProcess(sf.Process):
         self.device0 = fiber.device(0)
         self.cache = cache
 
+        # Fraction of the invoked tokens that are not padding, set by
+        # `get_args` for flights of more than one token per request.
+        self.padding_efficiency: float | None = None
+        # Set by the batcher to record the shape of the flight.
+        self.metrics: ServiceMetrics | None = None
+        # Set by the batcher to order the flight after host page copies.
+        self.page_pool: PagePool | None = None
+
+    def select_functions(self) -> dict[int, sf.ProgramFunction]:
+        """Entrypoints, by batch size, to invoke this flight with."""
+        return self.functions
+
     async def get_args(self, bs):
         ...
 
@@ -295,6 +875,13 @@ class LlmExecutorProcess(sf.Process):
     ):
         ...
 
+    def publish_pages(self):
+        """Publish the KV cache pages written by this flight."""
+        for r in self.exec_requests:
+            total_tokens = r.start_position + len(r.input_token_ids)
+            number_of_complete_pages = total_tokens // self.seq_stride
+            r.publish_allocated_pages(number_of_complete_pages)
+
     async def _transfer_buffer(
         self,
         req_count: int,
@@ -346,7 +933,6 @@ class LlmExecutorProcess(sf.Process):
             req_count (int): The number of requests in the batch.
             result (Tuple[sfnp.device_array, Optional[sfnp.device_array]]): The results of the run.
         """
-        seq_stride = self.seq_stride
         device0 = self.fiber.device(0)
 
         indices = None
@@ -355,17 +941,17 @@ class LlmExecutorProcess(sf.Process):
             indices = result[1]
 
         # publish cache pages
-        for r in self.exec_requests:
-            total_tokens = r.start_position + len(r.input_token_ids)
-            number_of_complete_pages = total_tokens // seq_stride
-            r.publish_allocated_pages(number_of_complete_pages)
+        self.publish_pages()
+
+        # The invocation is done with its arguments. Hand the staging buffers
+        # back before waiting on the transfer, so the flight being packed
+        # meanwhile reuses them instead of allocating a third set.
+        [arg.release() for arg in args]
 
         logits, indices = await self._transfer_buffer(
             req_count=req_count, device0=device0, buffers=(logits, indices)
         )
 
-        [arg.release() for arg in args]
-
         # Return results.
         await self.get_results(logits, indices, req_count)
 
@@ -379,14 +965,22 @@ class LlmExecutorProcess(sf.Process):
             req_bs = len(self.exec_requests)
 
             # Select an entrypoint for the batch.
-            entrypoints = self.functions
+            entrypoints = self.select_functions()
             for bs, fn in entrypoints.items():
                 if bs >= req_bs:
                     break
             else:
                 raise RuntimeError(f"No available entry point for bs {req_bs}")
 
+            if self.page_pool is not None:
+                # Pages restored from host memory are read by this flight.
+                await self.page_pool.fence_transfers()
+
             args, req_count = await self.get_args(bs)
+            if self.metrics is not None:
+                self.metrics.record_flight(
+                    self.name, req_count, bs, self.padding_efficiency
+                )
 
             logger.debug(
                 "INVOKE %r: %s",
@@ -418,7 +1012,18 @@ class LlmExecutorProcess(sf.Process):
 
 
 class PrefillExecutorProcess(LlmExecutorProcess):
-    """Executes a prefill batch."""
+    """Executes a prefill batch.
+
+    When `chunk_block_size` is set, each request only prefills the next
+    `chunk_block_size * seq_stride` tokens of its prompt, starting at its
+    `start_position`. Requests with tokens left to prefill are handed back to
+    the batcher through `requeue_callback` instead of being completed.
+
+    When `final_functions` are given, flights without `return_all_logits`
+    requests invoke them instead. They gather each row's last position on
+    device, so the host transfer is `[bs, 1, vocab]` instead of
+    `[bs, bsl, vocab]`.
+    """
 
     def __init__(
         self,
@@ -428,6 +1033,10 @@ class PrefillExecutorProcess(LlmExecutorProcess):
         seq_stride: int,
         page_tables,
         program_isolation: sf.ProgramIsolation,
+        has_prefill_position: bool = False,
+        chunk_block_size: Optional[int] = None,
+        requeue_callback: Optional[Callable[[LlmInferenceExecRequest], None]] = None,
+        final_functions: Optional[dict[int, sf.ProgramFunction]] = None,
     ):
         super().__init__(
             name="prefill_process",
@@ -438,6 +1047,59 @@ class PrefillExecutorProcess(LlmExecutorProcess):
             page_tables=page_tables,
             program_isolation=program_isolation,
         )
+        assert chunk_block_size is None or (
+            has_prefill_position and requeue_callback is not None
+        )
+        self.has_prefill_position = has_prefill_position
+        self.chunk_size = (
+            None if chunk_block_size is None else chunk_block_size * seq_stride
+        )
+        self.requeue_callback = requeue_callback
+        # The last-position gather is only exported without `start_positions`.
+        assert final_functions is None or not has_prefill_position
+        self.final_functions = final_functions
+
+    def select_functions(self) -> dict[int, sf.ProgramFunction]:
+        if self.final_functions is None or any(
+            r.return_all_logits for r in self.exec_requests
+        ):
+            return self.functions
+        return self.final_functions
+
+    def chunk_bounds(self, req: LlmInferenceExecRequest) -> Tuple[int, int]:
+        """Get the range of prompt tokens prefilled for `req` in this flight.
+
+        Args:
+            req (LlmInferenceExecRequest): A request in this flight.
+
+        Returns:
+            Tuple[int, int]: Start (inclusive) and end (exclusive) token positions.
+        """
+        start = req.start_position
+        end = len(req.input_token_ids)
+        # Requests for all logits are never chunked, the logits of earlier
+        # chunks would be lost.
+        if self.chunk_size is not None and not req.return_all_logits:
+            end = min(end, start + self.chunk_size)
+        return start, end
+
+    def is_partial(self, req: LlmInferenceExecRequest) -> bool:
+        """Whether `req` has prompt tokens left to prefill after this flight."""
+        _, end = self.chunk_bounds(req)
+        return end < len(req.input_token_ids)
+
+    def publish_pages(self):
+        """Publish the KV cache pages written by this flight."""
+        for r in self.exec_requests:
+            if not self.is_partial(r):
+                r.publish_allocated_pages(len(r.input_token_ids) // self.seq_stride)
+                continue
+
+            # Only pages that have been fully written may be shared.
+            _, end = self.chunk_bounds(r)
+            r.allocation.publish_pages_for_tokens(
+                r.input_token_ids[:end], publish_incomplete_page=False
+            )
 
     async def get_args(
         self, bs
@@ -454,16 +1116,27 @@ class PrefillExecutorProcess(LlmExecutorProcess):
         """
         seq_stride = self.seq_stride
 
-        # Compute block sequence length as maximum sequence length, rounded
+        # Compute block sequence length as maximum chunk length, rounded
         # up to the seq_stride.
-        for r in self.exec_requests:
-            assert r.start_position == 0
+        bounds = [self.chunk_bounds(r) for r in self.exec_requests]
+        for start, _ in bounds:
+            assert start == 0 or self.has_prefill_position
 
-        bsl = max((len(r.input_token_ids)) for r in self.exec_requests)
+        bsl = max(end - start for start, end in bounds)
         bsl = int(math.ceil(bsl / seq_stride) * seq_stride)
-        block_count = bsl // seq_stride
+        # Chunks attend over every page written before them.
+        block_count = max(math.ceil(end / seq_stride) for _, end in bounds)
         req_count = len(self.exec_requests)
-        logger.debug("Prefill bs=%d, bsl=%d", bs, bsl)
+
+        # Fraction of the invoked [bs, bsl] tokens that are not padding.
+        self.padding_efficiency = sum(end - start for start, end in bounds) / (bs * bsl)
+        logger.debug(
+            "Prefill bs=%d, bsl=%d, blocks=%d, padding efficiency=%.3f",
+            bs,
+            bsl,
+            block_count,
+            self.padding_efficiency,
+        )
 
         # Prepare inputs.
         # TODO: Better support in shortfin for h2d. The best way to do it is
@@ -475,23 +1148,27 @@ class PrefillExecutorProcess(LlmExecutorProcess):
         seq_block_ids = cache.allocate([bs, block_count], int_dtype)
 
         # Populate tokens.
-        for i in range(bs):
-            with tokens.host.view(i).map(discard=True) as m:
-                m.fill(0)
-                if i < req_count:
-                    m.items = self.exec_requests[i].input_token_ids
+        pack_host_array(
+            tokens,
+            [
+                r.input_token_ids[start:end]
+                for r, (start, end) in zip(self.exec_requests, bounds)
+            ],
+        )
 
         # Populate seq_lens
-        with seq_lens.host.map(discard=True) as m:
-            m.fill(1)
-            m.items = [len(req.input_token_ids) for req in self.exec_requests]
+        pack_host_array(seq_lens, [end for _, end in bounds], fill=1)
+
+        start_positions = None
+        if self.has_prefill_position:
+            start_positions = cache.allocate([bs], int_dtype)
+            pack_host_array(start_positions, [start for start, _ in bounds])
 
         # Populate cache pages.
-        for i in range(bs):
-            with seq_block_ids.host.view(i).map(discard=True) as m:
-                m.fill(0)
-                if i < req_count:
-                    m.items = self.exec_requests[i].cache_page_indices(block_count)
+        pack_host_array(
+            seq_block_ids,
+            [r.cache_page_indices(block_count) for r in self.exec_requests],
+        )
 
         tokens.transfer_to_device()
         seq_lens.transfer_to_device()
@@ -501,9 +1178,14 @@ class PrefillExecutorProcess(LlmExecutorProcess):
         #  prefill:
         #    tokens: [bs, bsl]
         #    seq_lens: [bs]
+        #    start_positions: [bs] (only if `has_prefill_position`)
         #    seq_block_ids: [bs, blocks]
         #    cache_slabs: ...
-        args = [tokens, seq_lens, seq_block_ids]
+        args = [tokens, seq_lens]
+        if start_positions is not None:
+            start_positions.transfer_to_device()
+            args.append(start_positions)
+        args.append(seq_block_ids)
         for page_table in self.page_tables:
             args.append(WrappedAllocation(sfnp.disable_barrier(page_table)))
 
@@ -517,9 +1199,17 @@ class PrefillExecutorProcess(LlmExecutorProcess):
             indices (sfnp.device_array | None): The indices output from the invocation, if any.
             req_count (int): The number of requests in the batch.
         """
+        partial = []
         for i in range(req_count):
             req = self.exec_requests[i]
-            sl = len(req.input_token_ids)
+            start, end = self.chunk_bounds(req)
+            if self.is_partial(req):
+                # Nothing to return until the final chunk has been prefilled.
+                req.start_position = end
+                partial.append(req)
+                continue
+
+            sl = end - start
 
             if logits.shape[1] == 1:
                 logits_item = logits.view(i)
@@ -532,6 +1222,8 @@ class PrefillExecutorProcess(LlmExecutorProcess):
             if indices is not None:
                 if indices.shape[1] == 1:
                     index_item = indices.view(i)
+                elif req.return_all_logits:
+                    index_item = indices.view(i, slice(0, sl))
                 else:
                     index_item = indices.view(i, sl - 1)
 
@@ -539,7 +1231,10 @@ class PrefillExecutorProcess(LlmExecutorProcess):
             req.result_indices = index_item
 
         for req in self.exec_requests:
-            req.done.set_success()
+            if req in partial:
+                self.requeue_callback(req)
+            else:
+                req.done.set_success()
 
 
 class DecodeExecutorProcess(LlmExecutorProcess):
@@ -563,6 +1258,7 @@ class DecodeExecutorProcess(LlmExecutorProcess):
             page_tables=page_tables,
             program_isolation=program_isolation,
         )
+        self.sampler = Sampler()
 
     async def get_args(
         self, bs
@@ -599,36 +1295,25 @@ class DecodeExecutorProcess(LlmExecutorProcess):
         seq_block_ids = cache.allocate([bs, block_count], int_dtype)
 
         # Populate tokens.
-        with tokens.host.map(discard=True) as m:
-            m.fill(0)
-            vals = []
-            for i in range(bs):
-                if i < req_count:
-                    vals = vals + self.exec_requests[i].input_token_ids[-1:]
-            m.items = vals
+        pack_host_array(tokens, [r.input_token_ids[-1:] for r in self.exec_requests])
 
         # For decode, populate start_positions and seq_lens.
-        with start_positions.host.map(discard=True) as m:
-            m.fill(0)
-            m.items = [req.start_position for req in self.exec_requests]
-
-        with seq_lens.host.map(discard=True) as m:
-            # Pad unused requests.
-            m.fill(
-                1  # Must pad with a nonzero value because a division by 0 during softmax floods clobber page (page 0) in cache with NaN values.
-            )
-            m.items = [req.start_position + 1 for req in self.exec_requests]
+        pack_host_array(
+            start_positions, [req.start_position for req in self.exec_requests]
+        )
+
+        # Pad unused requests.
+        pack_host_array(
+            seq_lens,
+            [req.start_position + 1 for req in self.exec_requests],
+            fill=1,  # Must pad with a nonzero value because a division by 0 during softmax floods clobber page (page 0) in cache with NaN values.
+        )
 
         # Populate cache pages.
-        with seq_block_ids.host.map(discard=True) as m:
-            m.fill(0)
-            block_ids = []
-            for i in range(bs):
-                if i < req_count:
-                    batch_ids = self.exec_requests[i].cache_page_indices(block_count)
-                    block_ids += batch_ids
-                    block_ids += [0] * (block_count - len(batch_ids))
-            m.items = block_ids
+        pack_host_array(
+            seq_block_ids,
+            [r.cache_page_indices(block_count) for r in self.exec_requests],
+        )
 
         # Transfer to device memory:
         tokens.transfer_to_device()
@@ -669,5 +1354,83 @@ class DecodeExecutorProcess(LlmExecutorProcess):
             req.result_logits = logits_item
             req.result_indices = index_item
 
+        self.select_tokens(logits, indices, req_count)
+
         for req in self.exec_requests:
             req.done.set_success()
+
+    def select_tokens(self, logits, indices, req_count):
+        """Select the next token for every request sampling on the batch.
+
+        Requests carrying a `decode_config` are sampled together, in one
+        vectorized pass per logits normalization, instead of one row at a
+        time by their beams.
+
+        Args:
+            logits (sfnp.device_array): Host logits of shape `[bs, 1, n]`.
+            indices (sfnp.device_array | None): Host indices of shape `[bs, 1, n]`, if any.
+            req_count (int): The number of requests in the batch.
+        """
+        groups = {}
+        for i in range(req_count):
+            config = self.exec_requests[i].decode_config
+            if config is not None:
+                groups.setdefault(config.logits_normalization, []).append(i)
+
+        if not groups:
+            return
+
+        logits = np.asarray(logits)[:, 0]
+        if indices is not None:
+            indices = np.asarray(indices)[:, 0]
+
+        for normalization, rows in groups.items():
+            configs = [self.exec_requests[i].decode_config for i in rows]
+            tokens = self.sampler.sample_batch(
+                logits[rows],
+                indices[rows] if indices is not None else None,
+                temperature=np.array([c.temperature for c in configs]),
+                top_k=np.array([c.top_k or 0 for c in configs]),
+                top_p=np.array([1.0 if c.top_p is None else c.top_p for c in configs]),
+                logits_normalization=normalization,
+            )
+            for i, token in zip(rows, tokens.tolist()):
+                self.exec_requests[i].result_token = token
+
+
+class MixedExecutorProcess(PrefillExecutorProcess):
+    """Executes a batch mixing prefill chunks and decode steps.
+
+    Both kinds of requests are run through the `prefill` entry points with
+    ragged per-request start positions. A decode step is a chunk holding only
+    the last token of the request.
+    """
+
+    def __init__(
+        self,
+        fiber: Fiber,
+        cache: DeviceArrayCache,
+        functions: dict[int, sf.ProgramFunction],
+        seq_stride: int,
+        page_tables,
+        program_isolation: sf.ProgramIsolation,
+        chunk_block_size: int,
+        requeue_callback: Callable[[LlmInferenceExecRequest], None],
+    ):
+        super().__init__(
+            fiber=fiber,
+            cache=cache,
+            functions=functions,
+            seq_stride=seq_stride,
+            page_tables=page_tables,
+            program_isolation=program_isolation,
+            has_prefill_position=True,
+            chunk_block_size=chunk_block_size,
+            requeue_callback=requeue_callback,
+        )
+        self.name = "mixed_process"
+
+    def chunk_bounds(self, req: LlmInferenceExecRequest) -> Tuple[int, int]:
+        if req.phase == InferencePhase.DECODE:
+            return req.start_position, req.start_position + 1
+        return super().chunk_bounds(req)
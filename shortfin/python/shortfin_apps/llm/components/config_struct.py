@@ -159,6 +159,16 @@ class ModelParams:
     # Cache parameters.
     paged_kv_cache: PagedKVCacheParams | None = None
 
+    # Whether the exported `prefill` functions accept a `start_positions`
+    # argument, allowing a prompt to be prefilled in multiple invocations
+    # (chunked prefill) on top of already-written KV cache pages.
+    has_prefill_position: bool = False
+
+    # Whether `prefill_final_bs{bs}` functions were exported next to the
+    # `prefill` ones. They gather the logits (or top-k) of each row's last
+    # position on device, so only those are transferred to the host.
+    has_prefill_final_logits: bool = False
+
     def __post_init__(self):
         if self.top_k is None or self.top_k >= 1:
             return
@@ -236,9 +246,59 @@ class ServerParams:
     # KV cache configuration
     prefix_sharing_algorithm: str = "none"  # none or trie
 
+    # Number of KV cache pages evicted from the device that are kept in host
+    # memory, to be restored instead of recomputed. 0 disables the host tier.
+    # Only used with the `trie` prefix sharing algorithm.
+    host_cache_page_count: int = 0
+
+    # Directory holding a snapshot of the prefix cache, restored when the
+    # server starts and written when it shuts down. Snapshots taken with a
+    # different model configuration are ignored.
+    # Only used with the `trie` prefix sharing algorithm.
+    prefix_cache_snapshot: Optional[str] = None
+
+    # Prompts prefilled when the server starts, whose pages are kept in the
+    # prefix cache for the lifetime of the server.
+    # Only used with the `trie` prefix sharing algorithm.
+    pinned_prompts: list[str] = field(default_factory=list)
+
     # Program isolation configuration
     program_isolation: str = "per_call"
 
+    # Number of KV cache blocks (`block_seq_stride` tokens each) prefilled per
+    # invocation. Longer prompts are split into chunks that are scheduled across
+    # multiple batcher ticks. None disables chunked prefill.
+    # Requires a model exported with `has_prefill_position`.
+    chunk_block_size: Optional[int] = None
+
+    # Maximum number of tokens per invocation when mixing prefill and decode.
+    # When set, a single batcher packs decode steps and prefill chunks into
+    # one invocation instead of running separate prefill and decode flights.
+    # Requires a model exported with `has_prefill_position`.
+    mixed_token_budget: Optional[int] = None
+
+    # How decode requests are preempted when the KV cache runs out of pages:
+    # `swap` copies their pages to host memory, `recompute` releases them and
+    # prefills them again, and `none`, the default, fails the request.
+    # Swapping is not supported with the `trie` prefix sharing algorithm.
+    # Not used with `mixed_token_budget`.
+    preemption_mode: str = "none"
+
+    # Seconds a request waits for room in the request queue and KV cache before
+    # it is rejected with a retry-after hint. 0 rejects requests that do not
+    # fit immediately.
+    admission_timeout_s: float = 30.0
+
+    # How batchers order pending work: `default` treats every request equally,
+    # `priority` orders requests by priority class, deadline, and tenant usage.
+    scheduling_policy: str = "default"
+
+    # Seconds a work item of each priority class may wait in a batcher before
+    # it is scheduled ahead of all others. Only used with the `priority` policy.
+    max_queue_wait_s: dict[str, float] = field(
+        default_factory=lambda: {"interactive": 1.0, "standard": 10.0, "batch": 120.0}
+    )
+
     decode_config: DecodeConfig | None = None
 
     # Device configuration
@@ -5,16 +5,27 @@
 # SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
 
 import threading
+from collections import OrderedDict
 
 import shortfin.array as sfnp
 
+# Smallest buffer size, in bytes, handed out by `DeviceArrayCache`.
+MIN_SIZE_CLASS = 256
+
 
 class Allocation:
-    def __init__(self, *, device, host, cache, key):
+    def __init__(self, *, device, host, cache, key, storage=None):
         self._device = device
         self._host = host
         self._cache = cache
         self._key = key
+        # Full (device, host) buffers of the size class, which may be larger
+        # than the arrays.
+        self._storage = storage
+
+    @property
+    def storage(self):
+        return self._storage
 
     @property
     def key(self):
@@ -86,55 +97,93 @@ class WrappedAllocation:
         pass
 
 
-def _shape_matches(a, b):
-    if len(a) != len(b):
-        return False
+def size_class(nbytes: int) -> int:
+    """Round a buffer size up to its size class.
 
-    return all([_a == _b for _a, _b in zip(a, b)])
+    Sizes are rounded up to a multiple of a quarter of the power of two below
+    them, so that buffers are at most 25% larger than requested while shapes of
+    similar size share a class.
+    """
+    if nbytes <= MIN_SIZE_CLASS:
+        return MIN_SIZE_CLASS
+    step = 1 << (nbytes.bit_length() - 3)
+    return -(-nbytes // step) * step
+
+
+def _array_for_storage(storage, size, shape, dtype):
+    """Array of `shape` over the leading bytes of a `storage` of `size` bytes."""
+    nbytes = dtype.compute_dense_nd_size(shape)
+    flat = sfnp.device_array(storage, [size], sfnp.uint8)
+    return sfnp.device_array(flat.view(slice(0, nbytes)).storage, shape, dtype)
 
 
 class DeviceArrayCache:
-    def __init__(self, device, *, max_allocations=100):
+    """Reuses device arrays and their host staging arrays across invocations.
+
+    Arrays are backed by buffers rounded up to a size class (see
+    `size_class`), so a released allocation is reused for any shape and dtype
+    that fits its class. Released allocations are kept in least recently
+    released order until their device buffers exceed `max_bytes`, at which
+    point the oldest ones are dropped.
+
+    Attributes:
+        hits: Number of allocations served from the cache
+        misses: Number of allocations that created new buffers
+        evictions: Number of released allocations dropped from the cache
+        cached_bytes: Device bytes held by released allocations
+    """
+
+    def __init__(self, device, *, max_bytes=64 * 1024 * 1024):
         self._device = device
-        self._max_allocations = max_allocations
+        self._max_bytes = max_bytes
         self._cache_lock = threading.Lock()
 
         self._id = 0
-        self._shape_table = {}
-        self._cache = {}
+        # Released allocations by id, least recently released first.
+        self._cache: OrderedDict[int, Allocation] = OrderedDict()
+        # Ids of released allocations by size class.
+        self._shape_table: dict[int, OrderedDict[int, None]] = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.cached_bytes = 0
 
     def allocate(self, shape, dtype):
         with self._cache_lock:
             key = self.create_key(shape=shape, dtype=dtype)
 
-            # If we already have it allocated find the entry, possibly clear the list and return the allocation:
-            if key in self._shape_table:
-                idx = self._shape_table[key].pop()
-                if len(self._shape_table[key]) == 0:
+            # Reuse the most recently released allocation of the class.
+            ids = self._shape_table.get(key)
+            if ids:
+                idx, _ = ids.popitem()
+                if not ids:
                     del self._shape_table[key]
-                return self._cache.pop(idx)
-
-            # If we are exceeding the recommended cache size use this as an opportunity to clean up:
-            if len(self._cache) > self._max_allocations:
-                # Grab the keys that should be cleaned up:
-                release_count = len(self._cache) - self._max_allocations
-                keys = sorted(self._cache.keys())
-                to_keep = set(keys[release_count:])
-                new_cache = {idx: self._cache[idx] for idx in to_keep}
-                new_table = {}
-                for idx in to_keep:
-                    new_key = self.create_key(allocation=self._cache[idx])
-                    if new_key not in new_table:
-                        new_table[new_key] = []
-                    new_table[new_key].append(idx)
-
-                self._cache = new_cache
-                self._shape_table = new_table
-
-        device = sfnp.device_array.for_device(self._device, shape, dtype)
-        host = device.for_transfer()
-
-        return Allocation(device=device, host=host, cache=self, key=key)
+                allocation = self._cache.pop(idx)
+                self.cached_bytes -= key
+                self.hits += 1
+            else:
+                allocation = None
+                self.misses += 1
+
+        if allocation is not None:
+            if list(allocation.shape) == list(shape) and allocation.dtype == dtype:
+                return allocation
+            storage = allocation.storage
+        else:
+            storage = (
+                sfnp.storage.allocate_device(self._device, key),
+                sfnp.storage.allocate_host(self._device, key),
+            )
+
+        device_storage, host_storage = storage
+        return Allocation(
+            device=_array_for_storage(device_storage, key, shape, dtype),
+            host=_array_for_storage(host_storage, key, shape, dtype),
+            cache=self,
+            key=key,
+            storage=storage,
+        )
 
     def create_key(self, *, allocation=None, shape=None, dtype=None):
         if allocation is not None:
@@ -143,22 +192,38 @@ class DeviceArrayCache:
 
             return allocation.key
 
-        shape = "x".join([str(d) for d in shape])
-        return f"{shape}, {dtype}"
+        return size_class(dtype.compute_dense_nd_size(shape))
 
     def release(self, allocation):
         with self._cache_lock:
             idx = self._id
             key = self.create_key(allocation=allocation)
 
-            if key not in self._shape_table:
-                self._shape_table[key] = []
-
-            self._shape_table[key].append(idx)
+            self._shape_table.setdefault(key, OrderedDict())[idx] = None
             self._cache[idx] = allocation
+            self.cached_bytes += key
             self._id += 1
 
+            # Drop the least recently released allocations beyond the budget.
+            while self.cached_bytes > self._max_bytes:
+                old_idx, old_allocation = self._cache.popitem(last=False)
+                old_key = old_allocation.key
+                ids = self._shape_table[old_key]
+                del ids[old_idx]
+                if not ids:
+                    del self._shape_table[old_key]
+                self.cached_bytes -= old_key
+                self.evictions += 1
+
+    def __repr__(self):
+        return (
+            f"DeviceArrayCache({self.cached_bytes}/{self._max_bytes} bytes cached, "
+            f"hits={self.hits}, misses={self.misses}, evictions={self.evictions})"
+        )
+
     def free(self):
         with self._cache_lock:
             del self._cache
-            self._cache = {}
+            self._cache = OrderedDict()
+            self._shape_table = {}
+            self.cached_bytes = 0
@@ -9,6 +9,7 @@ import dataclasses
 import io
 import json
 import logging
+import time
 
 from copy import deepcopy
 from typing import List, Tuple
@@ -27,17 +28,68 @@ from .io_struct import (
     PromptResponse,
 )
 from .messages import LlmInferenceExecRequest, InferencePhase
+from .metrics import ServiceMetrics
+from .scheduling_policy import SchedulingInfo
 from .service import LlmGenerateService
 from .token_selection_strategy import (
+    SpeculativeProposer,
+    SpeculativeStats,
     TokenSelector,
     TokenSelectionStrategyConfig,
     build_token_selector_config,
     is_multi_response,
 )
-from .tokenizer import Encoding
+from .tokenizer import Encoding, IncrementalDetokenizer, Tokenizer
 
 logger = logging.getLogger(__name__)
 
+# Parts a streaming client may fall behind before new text is coalesced.
+STREAM_MAX_BACKLOG = 4
+
+
+class TokenStreamer:
+    """Streams generated text to a responder as server-sent events.
+
+    Tokens are detokenized incrementally as they are generated. Appending a
+    token never waits on the client: while the client has `max_backlog`
+    unconsumed parts, new text is held back and sent as a single part later,
+    so a slow client cannot stall the decode batch.
+    """
+
+    def __init__(
+        self,
+        responder: AbstractResponder,
+        tokenizer: Tokenizer,
+        rid=None,
+        max_backlog: int = STREAM_MAX_BACKLOG,
+    ):
+        self.responder = responder
+        self.rid = rid
+        self.max_backlog = max_backlog
+        self._detokenizer = IncrementalDetokenizer(tokenizer)
+        self._pending = ""
+
+    def append(self, token: int):
+        self._pending += self._detokenizer.add([token])
+        if self._pending and self.responder.stream_backlog() < self.max_backlog:
+            self._send()
+
+    def finish(self):
+        self._pending += self._detokenizer.flush()
+        if self._pending:
+            self._send()
+
+    def _send(self):
+        self.responder.stream_part(format_stream_event(self._pending, self.rid))
+        self._pending = ""
+
+
+def format_stream_event(text: str, rid=None) -> bytes:
+    """Formats `text` as a server-sent event, one `data` line per line."""
+    prefix = "data: " if rid is None else f"data(rid={rid}): "
+    lines = "".join(f"{prefix}{line}\n" for line in text.split("\n"))
+    return f"{lines}\n".encode()
+
 
 class GenerateItemProcess(sf.Process):
     """Process instantiated for each generation sequence.
@@ -58,9 +110,18 @@ class GenerateItemProcess(sf.Process):
         input_token_ids: list[int],
         decode_config: DecodeConfig,
         fiber: sf.Fiber,
+        streamer: TokenStreamer | None = None,
+        speculative_proposer: SpeculativeProposer | None = None,
+        speculative_stats: SpeculativeStats | None = None,
+        scheduling_info: SchedulingInfo | None = None,
+        metrics: ServiceMetrics | None = None,
     ):
         super().__init__(fiber=fiber)
         self.rid = rid
+        self.scheduling_info = scheduling_info
+        self.metrics = metrics
+        self.streamer = streamer
+        self.speculative_proposer = speculative_proposer
         self.input_text = input_text
         self.input_token_ids = input_token_ids
         self.result_token_ids: list[int] = []
@@ -72,6 +133,9 @@ class GenerateItemProcess(sf.Process):
                 prefill_batcher=prefill_batcher,
                 decode_batcher=decode_batcher,
                 results_callback=self.results_callback,
+                stream_callback=streamer.append if streamer is not None else None,
+                speculative_proposer=speculative_proposer,
+                speculative_stats=speculative_stats,
             )
         )
         self.token_selector: TokenSelector = TokenSelector(
@@ -86,15 +150,28 @@ class GenerateItemProcess(sf.Process):
             phase=InferencePhase.PREFILL,
             input_token_ids=self.input_token_ids,
             rid=self.rid,
+            scheduling_info=self.scheduling_info,
         )
         exec_req._cache = self.cache
         try:
             # Prefill result.
             await self.token_selector.prefill(exec_req)
+            first_token_time = time.monotonic()
             # Decode loop.
             await self.token_selector.decode(exec_req)
+            if self.streamer is not None:
+                self.streamer.finish()
+            if self.metrics is not None:
+                self.metrics.record_sequence(
+                    exec_req.scheduling_info.arrival,
+                    first_token_time,
+                    time.monotonic(),
+                    max((len(r) for r in self.result_token_ids), default=0),
+                )
         finally:
             exec_req.free_cache_pages()
+            if self.speculative_proposer is not None:
+                self.speculative_proposer.release()
 
     def results_callback(self, result: List[List[int]]):
         self.result_token_ids = result
@@ -187,19 +264,40 @@ class ClientGenerateBatchProcess(sf.Process):
     async def run(self):
         logger.debug("Started ClientBatchGenerateProcess: %r", self)
 
+        # Deadlines and waiting bounds count from the arrival of the request.
+        scheduling_info = SchedulingInfo.from_params(self.gen_req.scheduling_params)
         indices = []
         decode_configs = self.get_decode_configs()
 
-        # Try to add request to queue
+        input_ids = self.gen_req.input_ids
+        is_pretokenized = input_ids is not None
+        # TODO: We should send this to an executor and await the results.
+        if is_pretokenized:
+            input_batch = [input_ids] if self.gen_req.is_single else input_ids
+        else:
+            input_batch = [encoding.ids for encoding in self.tokenize()]
+
+        # Wait for room in the queue and the KV cache.
         # TODO(@zphoenixrises): Add load testing and integration tests for this.
-        run_request = self.service.queue_manager.add_to_queue(decode_configs)
+        queue_manager = self.service.queue_manager
+        metrics = self.service.metrics
+        admission_start = time.monotonic()
+        run_request = await queue_manager.wait_for_admission(
+            decode_configs,
+            input_batch,
+            timeout=self.service.server_params.admission_timeout_s,
+        )
+        metrics.admission_wait.observe(time.monotonic() - admission_start)
         if not run_request:
+            metrics.requests.labels("rejected").inc()
             self.responder.send_error(
                 error_message="Server queue is full. Please try again later.",
                 code=ResponderErrorCodes.QUEUE_FULL,
                 extra_fields={
-                    "current_size": self.service.queue_manager.current_queue_size,
+                    "current_size": queue_manager.current_queue_size,
                     "max_size": self.service.max_queue_size,
+                    "waiting": queue_manager.waiting_count,
+                    "retry_after": queue_manager.retry_after(),
                 },
             )
             return
@@ -212,14 +310,6 @@ class ClientGenerateBatchProcess(sf.Process):
 
             # Launch all individual generate processes and wait for them to finish.
             gen_processes = []
-            input_ids = self.gen_req.input_ids
-            is_pretokenized = input_ids is not None
-            # TODO: We should send this to an executor and await the results.
-            if is_pretokenized:
-                input_batch = [input_ids] if self.gen_req.is_single else input_ids
-            else:
-                input_batch = self.tokenize()
-
             for index, input_tokens in enumerate(input_batch):
                 decode_config = decode_configs[index]
 
@@ -233,6 +323,7 @@ class ClientGenerateBatchProcess(sf.Process):
                     exported_topk,
                     requested_topk,
                 ):
+                    metrics.requests.labels("invalid").inc()
                     self.responder.send_error(
                         error_message="Requested top-k larger than exported top-k",
                         code=ResponderErrorCodes.INVALID_REQUEST_ARGS,
@@ -258,7 +349,13 @@ class ClientGenerateBatchProcess(sf.Process):
                     else self.gen_req.rid[idx]
                 )
 
-                input_tokens = input_tokens if is_pretokenized else input_tokens.ids
+                streamer = None
+                if streaming and not is_multi_response(decode_config):
+                    streamer = TokenStreamer(
+                        self.responder,
+                        self.tokenizer,
+                        rid=None if self.gen_req.is_single else rid,
+                    )
 
                 gen_process = GenerateItemProcess(
                     prefill_batcher=self.service.prefill_batcher,
@@ -269,6 +366,13 @@ class ClientGenerateBatchProcess(sf.Process):
                     input_token_ids=input_tokens,
                     decode_config=decode_config,
                     fiber=fiber,
+                    streamer=streamer,
+                    speculative_proposer=self.service.create_speculative_proposer(
+                        decode_config
+                    ),
+                    speculative_stats=self.service.speculative_stats,
+                    scheduling_info=scheduling_info,
+                    metrics=metrics,
                 )
                 gen_processes.append(gen_process)
                 gen_process.launch()
@@ -282,12 +386,14 @@ class ClientGenerateBatchProcess(sf.Process):
 
             await asyncio.gather(*gen_processes)
             if self.cancelled:
+                metrics.requests.labels("cancelled").inc()
                 self.responder.send_error(
                     error_message="Request cancelled",
                     code=ResponderErrorCodes.CANCELLED,
                     extra_fields={},
                 )
             else:
+                metrics.requests.labels("completed").inc()
                 self.generate_response(gen_processes, streaming)
         finally:
             self.service.main_fiber_pool.return_fiber(indices)
@@ -301,6 +407,13 @@ class ClientGenerateBatchProcess(sf.Process):
     ):
         if streaming:
             logger.debug("Responding to streaming batch")
+            # Multi-response generations are only known once complete.
+            for p in gen_processes:
+                if p.streamer is not None:
+                    continue
+                rid = None if self.gen_req.is_single else p.rid
+                for text in self.tokenizer.decode(p.result_token_ids):
+                    self.responder.stream_part(format_stream_event(text, rid))
             self.responder.stream_part(b"data: [DONE]\n\n")
             self.responder.stream_part(None)
             return
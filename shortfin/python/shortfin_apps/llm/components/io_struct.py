@@ -26,6 +26,10 @@ DEFAULT_MAX_COMPLETION_TOKENS = 50
 MAX_TOP_P = 0.99
 MIN_TOP_P = 0.01
 
+# Priority classes from the highest to the lowest.
+PRIORITY_CLASSES = ("interactive", "standard", "batch")
+DEFAULT_PRIORITY = "standard"
+
 """
 This constant is used to indicate that an optional value was not provided in `SamplingParams`.
 The reason for this, instead of using `None`, is to allow for the distinction
@@ -57,6 +61,8 @@ class SamplingParams:
     num_beams: int = NOT_PROVIDED
     # Whether to use beam search during generation
     use_beam_search: bool = NOT_PROVIDED
+    # Number of draft tokens verified per speculative decode step
+    speculative_tokens: int = NOT_PROVIDED
 
     def __post_init__(self):
         # Ensure temperature is within acceptable range
@@ -65,6 +71,22 @@ class SamplingParams:
             self.top_p = min(MAX_TOP_P, max(self.top_p, MIN_TOP_P))
 
 
+@dataclass
+class SchedulingParams:
+    # Priority class of the request, one of `PRIORITY_CLASSES`
+    priority: str = DEFAULT_PRIORITY
+    # Tenant the request is accounted to when sharing the server fairly
+    tenant: Optional[str] = None
+    # Milliseconds after arrival by which the request should be complete
+    deadline_ms: Optional[float] = None
+
+    def __post_init__(self):
+        if self.priority not in PRIORITY_CLASSES:
+            raise ValueError(
+                f"Unknown priority {self.priority}, expected one of {PRIORITY_CLASSES}"
+            )
+
+
 # Adapted from:
 # https://github.com/sgl-project/sglang/blob/main/python/sglang/srt/managers/io_struct.py
 @dataclass
@@ -80,6 +102,8 @@ class GenerateReqInput:
     sampling_params: List[SamplingParams] | SamplingParams = field(
         default_factory=SamplingParams
     )
+    # How the request is scheduled against other requests.
+    scheduling_params: SchedulingParams = field(default_factory=SchedulingParams)
     # The request id.
     rid: Optional[Union[List[str], str]] = None
     # Whether to decode the response before returning it.
@@ -13,7 +13,9 @@ from dataclasses import dataclass
 import logging
 import math
 import threading
-from typing import List, Iterable
+from typing import Dict, List, Iterable, Optional, Tuple
+
+import shortfin.array as sfnp
 
 from .page_pool import PageInfo, PagePool
 
@@ -56,6 +58,18 @@ class PageAllocation(ABC):
         """
         pass
 
+    @abstractmethod
+    def truncate(self, token_count: int) -> None:
+        """
+        Rolls the allocation back to its first `token_count` tokens, releasing pages past them. For details, reference the derived class in trie_attention_cache.py.
+        """
+        pass
+
+    @property
+    def cached_token_count(self) -> int:
+        """Number of leading tokens whose pages are published to the cache."""
+        return 0
+
 
 class BasePagedAttentionCacheAllocation(PageAllocation):
     """Represents a page allocation in the cache."""
@@ -78,9 +92,13 @@ class BasePagedAttentionCacheAllocation(PageAllocation):
         if self._is_released:
             logger.warning("Releasing already-released allocation")
             return
+        self._cache._unshare_pages(self._pages)
         self._cache.free_pages(self._pages)
         self._is_released = True
 
+    def _replace_page(self, index: int, page: PageInfo) -> None:
+        self._pages = self._pages[:index] + (page,) + self._pages[index + 1 :]
+
     def extend_allocation(self, tokens, *, extra_token_slots=0) -> None:
         # assert old tokens are a prefix of incoming tokens
         # if we don't have enough pages to hold the tokens, we need to allocate more pages
@@ -101,6 +119,15 @@ class BasePagedAttentionCacheAllocation(PageAllocation):
 
             self._pages += tuple(new_pages)
 
+    def truncate(self, token_count: int) -> None:
+        pages_needed = math.ceil(token_count / self._cache.tokens_per_page)
+        released = self._pages[pages_needed:]
+        if not released:
+            return
+        self._pages = self._pages[:pages_needed]
+        self._cache._unshare_pages(released)
+        self._cache.free_pages(released)
+
     def __rerp__(self) -> str:
         return f"BasePagedAttentionCacheAllocation(pages={self._pages}, cache={self._cache})"
 
@@ -123,6 +150,11 @@ class BasePagedAttentionCache:
         - Multiple readers allowed in ReadableCaching state
         - Single writer exclusive access in Writing state
         - Reference counting prevents eviction of in-use pages
+
+    Copy-on-write:
+        Forked allocations share the partially filled tail page of their
+        source. Before a flight writes to a shared page, `copy_on_write` gives
+        each writer but the last its own copy of the page.
     """
 
     def __init__(
@@ -145,6 +177,10 @@ class BasePagedAttentionCache:
             None if not use_ref_counts else threading.Lock()
         )
 
+        # Number of allocations sharing each copy-on-write page, by page index.
+        self._shared_pages: Dict[int, int] = {}
+        self._shared_lock = threading.Lock()
+
     def acquire_pages_for_tokens(
         self, tokens: List[int], extra_token_slots: int = 1
     ) -> PageAllocation:
@@ -177,6 +213,13 @@ class BasePagedAttentionCache:
 
         return BasePagedAttentionCacheAllocation(pages, cache=self)
 
+    def match_length(self, tokens: List[int]) -> int:
+        """Number of leading `tokens` whose pages are already cached.
+
+        The base cache does not share pages between requests.
+        """
+        return 0
+
     def increment_pages(self, pages: List[PageInfo]):
         if not self.use_ref_counts:
             raise RuntimeError(
@@ -216,13 +259,129 @@ class BasePagedAttentionCache:
         )
         self.page_pool.free_pages(pages_to_free)
 
+    def _share_page(self, page: PageInfo) -> None:
+        """Mark `page` as shared copy-on-write by one more allocation."""
+        with self._shared_lock:
+            self._shared_pages[page.index] = self._shared_pages.get(page.index, 1) + 1
+
+    def _unshare_pages(self, pages: Iterable[PageInfo]) -> None:
+        """Drop a released allocation from the sharers of its pages."""
+        with self._shared_lock:
+            if not self._shared_pages:
+                return
+            for page in pages:
+                count = self._shared_pages.get(page.index)
+                if count is None:
+                    continue
+                if count <= 2:
+                    del self._shared_pages[page.index]
+                else:
+                    self._shared_pages[page.index] = count - 1
+
+    def _acquire_copy_pages(self, count: int) -> Optional[List[PageInfo]]:
+        """Acquire destination pages for copy-on-write."""
+        return self.page_pool.acquire_free_pages(count)
+
+    def copy_on_write(self, writes: List[Tuple[PageAllocation, int]]) -> int:
+        """Give allocations private copies of the shared pages they will write.
+
+        The last sharer of a page keeps writing to it in place. All copies are
+        issued together through `PagePool.copy_pages`.
+
+        Args:
+            writes: (allocation, index into its pages) of each page to be written
+
+        Returns:
+            Number of pages copied
+
+        Raises:
+            CacheAllocationFailure: If no pages are available for the copies
+        """
+        with self._shared_lock:
+            if not self._shared_pages:
+                return 0
+
+            remaining = {}
+            to_copy = []
+            for allocation, index in writes:
+                page = allocation.pages[index]
+                count = remaining.get(page.index, self._shared_pages.get(page.index))
+                if count is None or count <= 1:
+                    continue
+                remaining[page.index] = count - 1
+                to_copy.append((allocation, index, page))
+
+            if not to_copy:
+                return 0
+
+            new_pages = self._acquire_copy_pages(len(to_copy))
+            if new_pages is None:
+                raise CacheAllocationFailure(
+                    f"Failed to allocate {len(to_copy)} pages for copy-on-write"
+                )
+
+            for page_index, count in remaining.items():
+                if count <= 1:
+                    del self._shared_pages[page_index]
+                else:
+                    self._shared_pages[page_index] = count
+
+        # Pair pages in index order so that consecutive pages copy in one run.
+        to_copy.sort(key=lambda write: write[2].index)
+        new_pages.sort(key=lambda page: page.index)
+        for (allocation, index, _), new_page in zip(to_copy, new_pages):
+            allocation._replace_page(index, new_page)
+        self.page_pool.copy_pages(
+            [(page, new_page) for (_, _, page), new_page in zip(to_copy, new_pages)]
+        )
+
+        if self.use_ref_counts:
+            self.increment_pages(new_pages)
+            self.free_pages([page for _, _, page in to_copy])
+        return len(new_pages)
+
     def fork_pages(self, pages: List[PageInfo]) -> List[PageInfo]:
+        # The tail page is shared until one of the allocations writes to it.
         new_pages = pages.copy()
-        last_page = new_pages.pop(-1)
-        new_page = self.page_pool.copy_page(last_page)
-        if new_page is None:
-            raise CacheAllocationFailure()
-
-        new_pages.append(new_page)
+        self._share_page(new_pages[-1])
         self.increment_pages(new_pages)
         return BasePagedAttentionCacheAllocation(new_pages, cache=self)
+
+    def swap_out(self, allocation: PageAllocation) -> List[List[sfnp.device_array]]:
+        """Copy the pages of `allocation` to host memory and release them.
+
+        The transfers are enqueued before the pages return to the pool. Flights
+        reusing the pages await them with `PagePool.fence_transfers` before
+        writing, so the pages can be reused right away.
+
+        Args:
+            allocation: Allocation to swap out
+
+        Returns:
+            Host arrays holding the contents of each page, one per device
+        """
+        host_pages = [self.page_pool.copy_page_to_host(p) for p in allocation.pages]
+        allocation.release_pages()
+        return host_pages
+
+    def swap_in(self, host_pages: List[List[sfnp.device_array]]) -> PageAllocation:
+        """Restore pages saved by `swap_out` into a new allocation.
+
+        Args:
+            host_pages: Contents of each page, as returned by `swap_out`
+
+        Returns:
+            An allocation holding the restored pages, in the same order
+
+        Raises:
+            CacheAllocationFailure: If not enough pages are available
+        """
+        pages = self.page_pool.acquire_free_pages(len(host_pages))
+        if pages is None:
+            raise CacheAllocationFailure()
+
+        if self.use_ref_counts:
+            self.increment_pages(pages)
+        for page, host_page in zip(pages, host_pages):
+            self.page_pool.copy_page_from_host(page, host_page)
+        return BasePagedAttentionCacheAllocation(pages, cache=self)
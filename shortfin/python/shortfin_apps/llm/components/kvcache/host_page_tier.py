@@ -0,0 +1,106 @@
+# Copyright 2025 Advanced Micro Devices, Inc.
+#
+# Licensed under the Apache License v2.0 with LLVM Exceptions.
+# See https://llvm.org/LICENSE.txt for license information.
+# SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
+
+"""
+Host memory tier for KV cache pages evicted from the device.
+"""
+
+from collections import OrderedDict
+import logging
+from typing import Hashable
+
+from .page_pool import PageInfo, PagePool
+
+logger = logging.getLogger(__name__)
+
+
+class HostPageTier:
+    """Keeps the contents of evicted device pages in host memory.
+
+    Entries are keyed by the chained block hash of the tokens preceding the
+    page together with the page's own tokens, which identifies its prefix, so
+    that a later request with the same prefix can restore the page instead of
+    recomputing it. The tier
+    holds at most `capacity` pages and drops the least recently used ones
+    beyond that.
+
+    Not thread safe: callers are expected to hold the owning cache's lock.
+
+    Attributes:
+        page_pool: Pool whose page tables pages are copied from and to
+        capacity: Maximum number of pages held in host memory
+        stores: Number of pages copied out to the tier
+        restores: Number of pages copied back to the device
+        evictions: Number of pages dropped from the tier
+    """
+
+    def __init__(self, page_pool: PagePool, capacity: int):
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+
+        self.page_pool = page_pool
+        self.capacity = capacity
+        self._entries: OrderedDict[Hashable, list] = OrderedDict()
+
+        self.stores = 0
+        self.restores = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def store(self, key: Hashable, page: PageInfo) -> None:
+        """Copy `page` out to host memory under `key`.
+
+        The copy is not awaited: the caller releases `page` with
+        `PagePool.free_pages_after_transfers` so that it is not reused first.
+
+        Args:
+            key: Key identifying the prefix of the page
+            page: Device page being evicted
+        """
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            return
+
+        self._entries[key] = self.page_pool.copy_page_to_host(page)
+        self.stores += 1
+
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def restore(self, key: Hashable, page: PageInfo) -> bool:
+        """Copy the contents stored under `key` into `page`.
+
+        The entry is removed from the tier, as the page is cached on the
+        device again. Flights fence the copy with `PagePool.fence_transfers`
+        before reading the page.
+
+        Args:
+            key: Key identifying the prefix of the page
+            page: Freshly acquired device page to fill
+
+        Returns:
+            Whether an entry was found and restored
+        """
+        host_pages = self._entries.pop(key, None)
+        if host_pages is None:
+            return False
+
+        self.page_pool.copy_page_from_host(page, host_pages)
+        self.restores += 1
+        return True
+
+    def __repr__(self) -> str:
+        return (
+            f"HostPageTier({len(self._entries)}/{self.capacity} pages, "
+            f"stores={self.stores}, restores={self.restores}, "
+            f"evictions={self.evictions})"
+        )
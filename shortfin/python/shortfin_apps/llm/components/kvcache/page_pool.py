@@ -52,6 +52,62 @@ class PagePoolConfig:
     paged_kv_block_size_elements_per_device: List[int] | None = None
 
 
+class PageTransfers:
+    """Tracks copies between page tables and host memory.
+
+    Invocations take the page tables without barriers, so nothing orders these
+    copies with the flights reading or writing the same pages. Every copy
+    advances an epoch, and `fence` awaits the devices to complete all epochs
+    issued before it. Pages whose contents are still being copied out are
+    held back until the epoch of their copy completed.
+    """
+
+    def __init__(self, devices: Sequence[sf.ScopedDevice]):
+        self._lock = threading.Lock()
+        self.devices = list(devices)
+        self.issued_epoch = 0
+        self.completed_epoch = 0
+        self._held_pages: list[tuple[int, PageInfo]] = []
+
+    @property
+    def pending(self) -> bool:
+        return self.completed_epoch < self.issued_epoch
+
+    @property
+    def held_page_count(self) -> int:
+        return len(self._held_pages)
+
+    def issue(self) -> None:
+        """Record copies just enqueued on the devices."""
+        with self._lock:
+            self.issued_epoch += 1
+
+    def hold(self, pages: list[PageInfo]) -> None:
+        """Hold `pages` until the copies issued so far completed."""
+        with self._lock:
+            self._held_pages.extend((self.issued_epoch, page) for page in pages)
+
+    async def fence(self) -> list[PageInfo]:
+        """Await the copies issued so far.
+
+        Returns:
+            Held pages whose copies completed, to be returned to the pool
+        """
+        with self._lock:
+            epoch = self.issued_epoch
+        if self.completed_epoch >= epoch:
+            return []
+
+        for device in self.devices:
+            await device
+
+        with self._lock:
+            self.completed_epoch = max(self.completed_epoch, epoch)
+            ready = [page for e, page in self._held_pages if e <= epoch]
+            self._held_pages = [(e, page) for e, page in self._held_pages if e > epoch]
+        return ready
+
+
 class PagePool:
     """Page table based attention cache.
 
@@ -91,6 +147,7 @@ class PagePool:
         ]
 
         self.available_pages = list(self.attn_page_entries)
+        self.transfers = PageTransfers(self.devices)
 
         paged_kv_block_size_elements_per_device = (
             self.config.paged_kv_block_size_elements_per_device
@@ -136,6 +193,23 @@ class PagePool:
         with self._lock:
             self.available_pages.extend(pages)
 
+    def free_pages_after_transfers(self, pages: list[PageInfo]):
+        """Return `pages` to the pool once the copies out of them completed.
+
+        Use this instead of `free_pages` for pages passed to
+        `copy_page_to_host`. They become available after `fence_transfers`.
+        """
+        self.transfers.hold(pages)
+
+    async def fence_transfers(self):
+        """Await the host copies issued so far and free the pages held for them.
+
+        Flights must fence before reading pages restored from host memory.
+        """
+        ready = await self.transfers.fence()
+        if ready:
+            self.free_pages(ready)
+
     def copy_page(self, src_page: PageInfo) -> PageInfo:
         """
         Copy a page's contents to a new page.
@@ -165,6 +239,75 @@ class PagePool:
 
         return dst_page
 
+    def copy_pages(self, pairs: list[tuple[PageInfo, PageInfo]]) -> None:
+        """
+        Copy the contents of several pages at once.
+
+        Pairs are sorted and coalesced into runs of consecutive source and
+        destination pages, so that each run is issued as a single copy on every
+        device.
+
+        Args:
+            pairs: (source, destination) pages to copy
+        """
+        runs = []
+        for src_page, dst_page in sorted(pairs, key=lambda pair: pair[0].index):
+            if runs:
+                src_start, dst_start, length = runs[-1]
+                if (
+                    src_page.index == src_start + length
+                    and dst_page.index == dst_start + length
+                ):
+                    runs[-1] = (src_start, dst_start, length + 1)
+                    continue
+            runs.append((src_page.index, dst_page.index, 1))
+
+        for page_table in self.page_tables:
+            for src_start, dst_start, length in runs:
+                src_view = page_table.view(slice(src_start, src_start + length))
+                dst_view = page_table.view(slice(dst_start, dst_start + length))
+                dst_view.copy_from(src_view)
+
+    def copy_page_to_host(self, page: PageInfo) -> list[sfnp.device_array]:
+        """
+        Copy a page's contents out to host memory.
+
+        The transfers are enqueued on each device and are not awaited. The
+        page must be released with `free_pages_after_transfers`, so that it is
+        not reused before its contents were copied out.
+
+        Args:
+            page: Page to copy from
+
+        Returns:
+            Host arrays holding the page's contents, one per device
+        """
+        host_pages = []
+        for page_table in self.page_tables:
+            src_view = page_table.view(page.index)
+            host_page = src_view.for_transfer()
+            host_page.copy_from(src_view)
+            host_pages.append(host_page)
+        self.transfers.issue()
+        return host_pages
+
+    def copy_page_from_host(
+        self, page: PageInfo, host_pages: list[sfnp.device_array]
+    ) -> None:
+        """
+        Copy contents saved by `copy_page_to_host` into a page.
+
+        The transfers are not awaited: flights reading the page must call
+        `fence_transfers` first.
+
+        Args:
+            page: Page to copy to
+            host_pages: Host arrays holding the contents, one per device
+        """
+        for page_table, host_page in zip(self.page_tables, host_pages):
+            page_table.view(page.index).copy_from(host_page)
+        self.transfers.issue()
+
     def __repr__(self):
         # No need to lock for repr (list is internally synchronized).
         free_pages = len(self.available_pages)
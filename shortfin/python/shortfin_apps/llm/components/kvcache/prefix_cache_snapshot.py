@@ -0,0 +1,236 @@
+# Copyright 2025 Advanced Micro Devices, Inc.
+#
+# Licensed under the Apache License v2.0 with LLVM Exceptions.
+# See https://llvm.org/LICENSE.txt for license information.
+# SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
+
+"""Persistence of the trie prefix cache across server restarts.
+
+A snapshot is a directory holding a `metadata.json` file, describing the trie
+as a list of nodes in breadth first order, and one `pages_<device>.npy` file
+per device holding the contents of each node's page as raw bytes. Page files
+are written and read through memory maps, so a snapshot never needs to be held
+in host memory in its entirety.
+"""
+
+import hashlib
+import json
+import logging
+import os
+from collections import deque
+from pathlib import Path
+from typing import List, Tuple
+
+import numpy as np
+
+from .trie_attention_cache import TriePagedAttentionCache, TrieNode
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_VERSION = 1
+METADATA_FILE = "metadata.json"
+
+
+def _pages_file(path: Path, device_index: int) -> Path:
+    return path / f"pages_{device_index}.npy"
+
+
+def config_fingerprint(model_params) -> str:
+    """Fingerprint of the model configuration a snapshot is only valid for.
+
+    Args:
+        model_params: `ModelParams` of the served model
+
+    Returns:
+        Hex digest of the model configuration
+    """
+    config_json = model_params.to_json(sort_keys=True)
+    return hashlib.sha256(config_json.encode()).hexdigest()
+
+
+def _collect_nodes(cache: TriePagedAttentionCache) -> List[Tuple[int, TrieNode]]:
+    """Nodes of the trie in breadth first order, with the index of their parent.
+
+    The parent index is -1 for children of the root.
+    """
+    nodes = []
+    queue = deque((-1, child) for child in cache.root.children.values())
+    while queue:
+        parent_index, node = queue.popleft()
+        index = len(nodes)
+        nodes.append((parent_index, node))
+        queue.extend((index, child) for child in node.children.values())
+    return nodes
+
+
+async def save_prefix_cache(
+    cache: TriePagedAttentionCache, path: Path | str, fingerprint: str
+) -> int:
+    """Write a snapshot of the cache to `path`.
+
+    Must be awaited from a process running on a fiber that includes the devices
+    of the cache's page pool. Nodes are referenced while their pages are copied
+    to the host, so they cannot be evicted and reused in the meantime.
+
+    Args:
+        cache: Cache to snapshot
+        path: Directory to write the snapshot to
+        fingerprint: Model configuration fingerprint, see `config_fingerprint`
+
+    Returns:
+        Number of pages written
+    """
+    path = Path(path)
+    page_pool = cache.page_pool
+    with cache._lock:
+        nodes = _collect_nodes(cache)
+        for _, node in nodes:
+            node.ref_count.increment()
+
+    try:
+        host_pages = [page_pool.copy_page_to_host(node.page) for _, node in nodes]
+        for device in page_pool.devices:
+            await device
+
+        os.makedirs(path, exist_ok=True)
+        page_bytes = []
+        for device_index in range(len(page_pool.page_tables)):
+            pages_file = None
+            for row, pages in enumerate(host_pages):
+                with pages[device_index].map(read=True) as m:
+                    data = np.frombuffer(m, dtype=np.uint8)
+                    if pages_file is None:
+                        pages_file = np.lib.format.open_memmap(
+                            _pages_file(path, device_index),
+                            mode="w+",
+                            dtype=np.uint8,
+                            shape=(len(nodes), data.size),
+                        )
+                    pages_file[row] = data
+            if pages_file is not None:
+                page_bytes.append(pages_file.shape[1])
+                pages_file.flush()
+                del pages_file
+    finally:
+        with cache._lock:
+            for _, node in nodes:
+                cache._release_node(node)
+
+    metadata = {
+        "version": SNAPSHOT_VERSION,
+        "fingerprint": fingerprint,
+        "tokens_per_page": cache.tokens_per_page,
+        "page_bytes": page_bytes,
+        "nodes": [[parent, list(node.tokens)] for parent, node in nodes],
+    }
+    with open(path / METADATA_FILE, "wt") as f:
+        json.dump(metadata, f)
+
+    logger.info("Saved %d prefix cache pages to %s", len(nodes), path)
+    return len(nodes)
+
+
+def load_prefix_cache(
+    cache: TriePagedAttentionCache, path: Path | str, fingerprint: str
+) -> int:
+    """Restore a snapshot written by `save_prefix_cache` into an empty cache.
+
+    Snapshots of a different model configuration or cache geometry are ignored.
+    Only free pages are used, so restoring stops early when the page pool is
+    smaller than the snapshot. Nodes are restored unreferenced and are evicted
+    like any other cached prefix. Page contents are copied without being
+    awaited, like pages restored from the host tier: flights fence the
+    page pool's transfers before reading them.
+
+    Args:
+        cache: Cache to restore into
+        path: Directory holding the snapshot
+        fingerprint: Model configuration fingerprint, see `config_fingerprint`
+
+    Returns:
+        Number of pages restored
+    """
+    path = Path(path)
+    metadata_path = path / METADATA_FILE
+    if not metadata_path.exists():
+        logger.info("No prefix cache snapshot found at %s", path)
+        return 0
+
+    with open(metadata_path, "rt") as f:
+        metadata = json.load(f)
+
+    if metadata.get("version") != SNAPSHOT_VERSION:
+        logger.warning(
+            "Ignoring prefix cache snapshot %s with unsupported version %r",
+            path,
+            metadata.get("version"),
+        )
+        return 0
+    if metadata["fingerprint"] != fingerprint:
+        logger.warning(
+            "Ignoring prefix cache snapshot %s saved for a different model configuration",
+            path,
+        )
+        return 0
+    if metadata["tokens_per_page"] != cache.tokens_per_page:
+        logger.warning(
+            "Ignoring prefix cache snapshot %s with %d tokens per page, expected %d",
+            path,
+            metadata["tokens_per_page"],
+            cache.tokens_per_page,
+        )
+        return 0
+
+    page_pool = cache.page_pool
+    page_bytes = [
+        page_pool.config.dtype.compute_dense_nd_size([page_table.shape[1]])
+        for page_table in page_pool.page_tables
+    ]
+    nodes = metadata["nodes"]
+    if not nodes:
+        return 0
+    if metadata["page_bytes"] != page_bytes:
+        logger.warning(
+            "Ignoring prefix cache snapshot %s with pages of %r bytes, expected %r",
+            path,
+            metadata["page_bytes"],
+            page_bytes,
+        )
+        return 0
+
+    pages_files = [
+        np.load(_pages_file(path, i), mmap_mode="r")
+        for i in range(len(page_pool.page_tables))
+    ]
+
+    restored: List[TrieNode | None] = []
+    with cache._lock:
+        for row, (parent_index, tokens) in enumerate(nodes):
+            parent = cache.root if parent_index < 0 else restored[parent_index]
+            tokens = tuple(tokens)
+            if parent is None or tokens in parent.children:
+                restored.append(None)
+                continue
+
+            pages = page_pool.acquire_free_pages(1)
+            if pages is None:
+                break
+            page = pages[0]
+
+            host_pages = []
+            for page_table, pages_file in zip(page_pool.page_tables, pages_files):
+                host_page = page_table.view(page.index).for_transfer()
+                with host_page.map(discard=True) as m:
+                    np.frombuffer(m, dtype=np.uint8)[:] = pages_file[row]
+                host_pages.append(host_page)
+            page_pool.copy_page_from_host(page, host_pages)
+
+            if parent in cache.leaves:
+                cache.leaves.remove(parent)
+            node = cache._create_child(parent, tokens, page)
+            cache._add_leaf(node)
+            restored.append(node)
+
+    count = sum(node is not None for node in restored)
+    logger.info("Restored %d of %d prefix cache pages from %s", count, len(nodes), path)
+    return count
@@ -4,15 +4,50 @@ from threading import Lock
 import time
 import math
 import heapq
-from copy import deepcopy
 from .page_pool import PagePool, PageInfo
 from .base_attention_cache import (
     BasePagedAttentionCache,
     CacheAllocationFailure,
     PageAllocation,
 )
+from .host_page_tier import HostPageTier
 from .kvcache_utils import RefCount
 
+# Hash of the root of the trie, from which block hashes are chained.
+ROOT_BLOCK_HASH = 0
+
+
+def chain_block_hashes(
+    tokens: List[int],
+    tokens_per_page: int,
+    *,
+    start: int = 0,
+    parent_hash: int = ROOT_BLOCK_HASH,
+) -> Tuple[List[Tuple[int, ...]], List[int]]:
+    """Split the complete pages of `tokens` into blocks and hash them.
+
+    The hash of a block combines the hash of the block before it with its own
+    tokens, so it identifies the whole prefix ending with that block while
+    only hashing `tokens_per_page` tokens.
+
+    Args:
+        tokens: Sequence of tokens to split
+        tokens_per_page: Number of tokens per page
+        start: Index of the first token to split, a multiple of `tokens_per_page`
+        parent_hash: Hash of the block ending at `start`
+
+    Returns:
+        Tuple of (token blocks, block hashes), one entry per complete page
+    """
+    blocks = []
+    hashes = []
+    for i in range(start, len(tokens) - tokens_per_page + 1, tokens_per_page):
+        block = tuple(tokens[i : i + tokens_per_page])
+        parent_hash = hash((parent_hash, block))
+        blocks.append(block)
+        hashes.append(parent_hash)
+    return blocks, hashes
+
 
 @dataclass
 class TrieNode:
@@ -29,6 +64,7 @@ class TrieNode:
         parent: Parent node in the trie (None for root)
         ref_count: Number of active references to this node
         access_time: Last access timestamp for LRU eviction
+        block_hash: Chained hash of the tokens from the root up to this node
     """
 
     tokens: Tuple[int, ...]
@@ -37,6 +73,7 @@ class TrieNode:
     parent: Optional["TrieNode"] = None
     ref_count: RefCount = None
     access_time: float = 0.0
+    block_hash: int = ROOT_BLOCK_HASH
 
     def __post_init__(self) -> None:
         """Initialize children dict and access time if not provided."""
@@ -45,17 +82,27 @@ class TrieNode:
         self.access_time = time.monotonic()
         self.ref_count = RefCount()
 
-    def create_child(self, tokens: Tuple[int, ...], page: PageInfo) -> "TrieNode":
+    def create_child(
+        self,
+        tokens: Tuple[int, ...],
+        page: PageInfo,
+        block_hash: Optional[int] = None,
+    ) -> "TrieNode":
         """Create a new child node with the given tokens and page.
 
         Args:
             tokens: Sequence of tokens for the new node
             page: PageInfo for the new node's cache page
+            block_hash: Chained hash of the new node, computed if not given
 
         Returns:
             The newly created child node
         """
-        new_node = TrieNode(tokens=tokens, page=page, parent=self)
+        if block_hash is None:
+            block_hash = hash((self.block_hash, tokens))
+        new_node = TrieNode(
+            tokens=tokens, page=page, parent=self, block_hash=block_hash
+        )
         self.children[tokens] = new_node
         return new_node
 
@@ -99,18 +146,41 @@ class TriePagedAttentionCacheAllocation(PageAllocation):
         last_cached_node: TrieNode,
         cached_pages: List[PageInfo],
         newly_acquired_pages: List[PageInfo],
+        blocks: Optional[List[Tuple[int, ...]]] = None,
+        block_hashes: Optional[List[int]] = None,
     ):
         self.cache = cache
-        self.tokens = deepcopy(tokens)
+        self.tokens = list(tokens)
         self.last_cached_node = last_cached_node
         self._pages = cached_pages + newly_acquired_pages
         self.number_of_published_pages = len(cached_pages)
         self._is_released = False
+        # Token blocks and chained hashes of the complete pages of `tokens`,
+        # extended as tokens are added.
+        self._blocks = blocks if blocks is not None else []
+        self._block_hashes = block_hashes if block_hashes is not None else []
 
     @property
     def pages(self) -> List[PageInfo]:
         return self._pages
 
+    @property
+    def cached_token_count(self) -> int:
+        return self.number_of_published_pages * self.cache.tokens_per_page
+
+    def _update_block_hashes(self) -> None:
+        """Hash the complete pages of `tokens` that are not hashed yet."""
+        tokens_per_page = self.cache.tokens_per_page
+        parent_hash = self._block_hashes[-1] if self._block_hashes else ROOT_BLOCK_HASH
+        blocks, block_hashes = chain_block_hashes(
+            self.tokens,
+            tokens_per_page,
+            start=len(self._blocks) * tokens_per_page,
+            parent_hash=parent_hash,
+        )
+        self._blocks.extend(blocks)
+        self._block_hashes.extend(block_hashes)
+
     def publish_pages_for_tokens(
         self, tokens, *, publish_incomplete_page=False
     ) -> None:
@@ -132,10 +202,15 @@ class TriePagedAttentionCacheAllocation(PageAllocation):
                 )
 
             if len(tokens) > len(self.tokens):
-                self.tokens = deepcopy(tokens)
+                self.tokens = list(tokens)
+            self._update_block_hashes()
 
             tokens_per_page = self.cache.tokens_per_page
-            matched_node, matched_pages = self.cache._match(tokens)
+            number_of_complete_pages = len(tokens) // tokens_per_page
+            matched_node, matched_pages = self.cache._match_blocks(
+                self._blocks[:number_of_complete_pages],
+                self._block_hashes[:number_of_complete_pages],
+            )
             if len(matched_pages) > self.number_of_published_pages:
                 self.number_of_published_pages = len(matched_pages)
 
@@ -144,13 +219,14 @@ class TriePagedAttentionCacheAllocation(PageAllocation):
                     len(tokens) // -tokens_per_page
                 )  # ceil division
             else:
-                number_of_pages_to_publish = len(tokens) // tokens_per_page
+                number_of_pages_to_publish = number_of_complete_pages
 
-            # Create token blocks for unpublished pages
-            start_token_index = self.number_of_published_pages * tokens_per_page
-            unpublished_tokens = [
-                tuple(self.tokens[i : i + tokens_per_page])
-                for i in range(start_token_index, len(self.tokens), tokens_per_page)
+            # Token blocks and hashes for unpublished pages
+            unpublished_tokens = self._blocks[
+                self.number_of_published_pages : number_of_pages_to_publish
+            ]
+            unpublished_hashes = self._block_hashes[
+                self.number_of_published_pages : number_of_pages_to_publish
             ]
 
             unpublished_pages = self._pages[
@@ -164,8 +240,12 @@ class TriePagedAttentionCacheAllocation(PageAllocation):
                 )
 
             cur_node = matched_node
-            for token_block, page in zip(unpublished_tokens, unpublished_pages):
-                new_node = cur_node.create_child(token_block, page)
+            for token_block, block_hash, page in zip(
+                unpublished_tokens, unpublished_hashes, unpublished_pages
+            ):
+                new_node = self.cache._create_child(
+                    cur_node, token_block, page, block_hash
+                )
 
                 # remove parent node from the leaves.
                 # No need to delete if it was deleted earlier.
@@ -182,7 +262,7 @@ class TriePagedAttentionCacheAllocation(PageAllocation):
             # Update reference counts
             if unpublished_tokens:
                 cur_node.ref_count.increment()
-                self.last_cached_node.ref_count.decrement()
+                self.cache._release_node(self.last_cached_node)
                 self.last_cached_node = cur_node
 
             self.number_of_published_pages = number_of_pages_to_publish
@@ -196,9 +276,14 @@ class TriePagedAttentionCacheAllocation(PageAllocation):
         if self._is_released:
             return
 
-        self.last_cached_node.ref_count.decrement()
+        self.cache._unshare_pages(self._pages[self.number_of_published_pages :])
+        with self.cache._lock:
+            self.cache._release_node(self.last_cached_node)
         self._is_released = True
 
+    def _replace_page(self, index: int, page: PageInfo) -> None:
+        self._pages[index] = page
+
     def extend_allocation(self, tokens: List[int], *, extra_token_slots=0) -> None:
         """Extend the current allocation to accommodate additional tokens.
 
@@ -228,7 +313,7 @@ class TriePagedAttentionCacheAllocation(PageAllocation):
         new_pages_needed = total_pages_needed - current_pages
 
         if new_pages_needed <= 0:
-            self.tokens = deepcopy(tokens)
+            self.tokens = list(tokens)
             return
 
         # Acquire new pages
@@ -236,10 +321,11 @@ class TriePagedAttentionCacheAllocation(PageAllocation):
 
         if new_pages is None:
             # Try eviction if initial allocation fails
-            self.cache._evict_pages(
-                new_pages_needed - len(self.cache.page_pool.available_pages)
-            )
-            new_pages = self.cache.page_pool.acquire_free_pages(new_pages_needed)
+            with self.cache._lock:
+                self.cache._evict_pages(
+                    new_pages_needed - len(self.cache.page_pool.available_pages)
+                )
+                new_pages = self.cache.page_pool.acquire_free_pages(new_pages_needed)
 
             if new_pages is None:
                 raise CacheAllocationFailure(
@@ -250,7 +336,46 @@ class TriePagedAttentionCacheAllocation(PageAllocation):
         self._pages.extend(new_pages)
 
         # Update tokens
-        self.tokens = deepcopy(tokens)
+        self.tokens = list(tokens)
+
+    def truncate(self, token_count: int) -> None:
+        """Roll the allocation back to its first `token_count` tokens.
+
+        Used to discard tokens written speculatively. Unpublished pages past
+        those holding `token_count` tokens are returned to the page pool.
+
+        Args:
+            token_count: Number of tokens to keep
+
+        Raises:
+            ValueError: If published pages hold tokens past `token_count`
+        """
+        tokens_per_page = self.cache.tokens_per_page
+        if token_count < self.number_of_published_pages * tokens_per_page:
+            raise ValueError("Cannot truncate an allocation into its published pages")
+
+        del self.tokens[token_count:]
+        complete_pages = token_count // tokens_per_page
+        del self._blocks[complete_pages:]
+        del self._block_hashes[complete_pages:]
+
+        pages_needed = math.ceil(token_count / tokens_per_page)
+        released = self._pages[pages_needed:]
+        if not released:
+            return
+        del self._pages[pages_needed:]
+
+        # Pages still shared copy-on-write belong to another allocation too.
+        with self.cache._shared_lock:
+            shared = {
+                page.index
+                for page in released
+                if page.index in self.cache._shared_pages
+            }
+        self.cache._unshare_pages(released)
+        self.cache.page_pool.free_pages(
+            [page for page in released if page.index not in shared]
+        )
 
 
 class TriePagedAttentionCache(BasePagedAttentionCache):
@@ -260,19 +385,41 @@ class TriePagedAttentionCache(BasePagedAttentionCache):
     represents a page of tokens. Common prefixes between sequences share
     the same nodes/pages, reducing memory usage.
 
+    Nodes are also indexed by their chained block hash, so matching a
+    sequence costs one dictionary lookup per page once its blocks are hashed.
+
+    Unreferenced leaves are kept in a heap ordered by access time as their
+    last reference is released, so eviction does not need to scan all leaves.
+    Heap entries are invalidated lazily: entries of nodes that were
+    referenced, gained children or were accessed again are skipped or
+    re-queued when popped.
+
     Attributes:
         root: Root node of the trie
         leaves: Set of leaf nodes for efficient eviction
         page_pool: Pool providing page allocations
         tokens_per_page: Number of tokens that fit in each page
+        evicted_pages: Number of pages evicted from the trie
+        eviction_runs: Number of eviction passes
+        eviction_time: Total time spent evicting, in seconds
+        lookup_tokens: Number of tokens allocated through the trie
+        hit_tokens: Number of those tokens whose pages were already cached
+        version: Incremented whenever a node is added to or removed from the
+            trie, so callers can reuse `match_length` results until it changes
     """
 
-    def __init__(self, page_pool: PagePool, tokens_per_page: int):
+    def __init__(
+        self,
+        page_pool: PagePool,
+        tokens_per_page: int,
+        host_tier: Optional[HostPageTier] = None,
+    ):
         """Initialize the trie cache.
 
         Args:
             page_pool: Pool to allocate pages from
             tokens_per_page: Number of tokens per page
+            host_tier: Optional host memory tier receiving evicted pages
 
         Raises:
             ValueError: If tokens_per_page <= 0
@@ -289,8 +436,107 @@ class TriePagedAttentionCache(BasePagedAttentionCache):
         )
         self.root = TrieNode(tokens=tuple(), page=dummy_page)
         self.leaves: Set[TrieNode] = set()
+        # Nodes by block hash. Colliding nodes share a list.
+        self._index: Dict[int, List[TrieNode]] = {}
+        self._eviction_heap: List[Tuple[float, TrieNode]] = []
+        self.host_tier = host_tier
         self._lock: Lock = Lock()
 
+        self.evicted_pages = 0
+        self.eviction_runs = 0
+        self.eviction_time = 0.0
+        self.lookup_tokens = 0
+        self.hit_tokens = 0
+        self.version = 0
+
+    def _push_evictable(self, node: TrieNode) -> None:
+        """Queue an unreferenced leaf for eviction.
+
+        Stale entries accumulate as nodes are referenced and released again,
+        so the heap is rebuilt from the current leaves once it grows past
+        twice their number.
+        """
+        heapq.heappush(self._eviction_heap, (node.access_time, node))
+        if len(self._eviction_heap) > 2 * len(self.leaves) + 64:
+            self._eviction_heap[:] = [
+                (leaf.access_time, leaf)
+                for leaf in self.leaves
+                if leaf.ref_count.is_empty()
+            ]
+            heapq.heapify(self._eviction_heap)
+
+    def _add_leaf(self, node: TrieNode) -> None:
+        """Mark `node` as a leaf, queueing it for eviction if unreferenced."""
+        self.leaves.add(node)
+        if node.ref_count.is_empty():
+            self._push_evictable(node)
+
+    def _release_node(self, node: TrieNode) -> None:
+        """Drop a reference to `node`, queueing it for eviction if it was the last."""
+        node.ref_count.decrement()
+        if node.ref_count.is_empty() and node in self.leaves:
+            self._push_evictable(node)
+
+    def _create_child(
+        self,
+        parent: TrieNode,
+        tokens: Tuple[int, ...],
+        page: PageInfo,
+        block_hash: Optional[int] = None,
+    ) -> TrieNode:
+        """Create a child of `parent` and add it to the block hash index."""
+        node = parent.create_child(tokens, page, block_hash)
+        self._index.setdefault(node.block_hash, []).append(node)
+        self.version += 1
+        return node
+
+    def _unlink(self, node: TrieNode) -> None:
+        """Remove `node` from the trie and from the block hash index."""
+        nodes = self._index.get(node.block_hash)
+        if nodes is not None:
+            nodes[:] = [other for other in nodes if other is not node]
+            if not nodes:
+                del self._index[node.block_hash]
+        node.unlink()
+        self.version += 1
+
+    def _lookup(
+        self, parent: TrieNode, block: Tuple[int, ...], block_hash: int
+    ) -> Optional[TrieNode]:
+        """Child of `parent` holding `block`, found through its hash."""
+        # Verify the match to rule out hash collisions.
+        for node in self._index.get(block_hash, ()):
+            if node.parent is parent and node.tokens == block:
+                return node
+        return None
+
+    def _match_blocks(
+        self, blocks: List[Tuple[int, ...]], block_hashes: List[int]
+    ) -> Tuple[TrieNode, List[PageInfo]]:
+        """
+        Find the longest prefix match in the trie for hashed token blocks.
+
+        Args:
+            blocks: Token blocks of the sequence to match
+            block_hashes: Chained hashes of `blocks`
+
+        Returns:
+            Tuple of (last matched node, list of matched pages)
+        """
+        matched_pages = []
+        cur = self.root
+        access_time = time.monotonic()
+
+        for block, block_hash in zip(blocks, block_hashes):
+            node = self._lookup(cur, block, block_hash)
+            if node is None:
+                break
+            cur = node
+            cur.access_time = access_time
+            matched_pages.append(cur.page)
+
+        return cur, matched_pages
+
     def _match(self, tokens: List[int]) -> Tuple[TrieNode, List[PageInfo]]:
         """
         Find the longest prefix match in the trie.
@@ -304,26 +550,85 @@ class TriePagedAttentionCache(BasePagedAttentionCache):
         Returns:
             Tuple of (last matched node, list of matched pages)
         """
-        tokens = tuple(tokens)
-        matched_pages = []
-        cur = self.root
+        return self._match_blocks(*chain_block_hashes(tokens, self.tokens_per_page))
+
+    def _restore_pages(
+        self,
+        blocks: List[Tuple[int, ...]],
+        cur: TrieNode,
+        matched_pages: List[PageInfo],
+    ) -> TrieNode:
+        """Extend a match with pages restored from the host tier.
+
+        Only free pages are used, so nothing in the trie is evicted to make
+        room for restored pages.
 
-        for i in range(0, len(tokens), self.tokens_per_page):
-            token_block = tokens[i : i + self.tokens_per_page]
+        Args:
+            blocks: Token blocks of the sequence being matched
+            cur: Last matched node
+            matched_pages: Pages matched so far, extended in place
 
-            if token_block not in cur.children:
+        Returns:
+            Last matched node after restoring
+        """
+        for block in blocks[len(matched_pages) :]:
+            key = (cur.block_hash, block)
+            if key not in self.host_tier:
                 break
-            cur = cur.children[token_block]
-            cur.access_time = time.monotonic()
-            matched_pages.append(cur.page)
 
-        return cur, matched_pages
+            pages = self.page_pool.acquire_free_pages(1)
+            if pages is None:
+                break
+
+            self.host_tier.restore(key, pages[0])
+            if cur in self.leaves:
+                self.leaves.remove(cur)
+            cur = self._create_child(cur, block, pages[0])
+            self.leaves.add(cur)
+            matched_pages.append(pages[0])
+
+        return cur
+
+    def match_length(self, tokens: List[int]) -> int:
+        """Number of leading `tokens` whose pages are published in the trie.
+
+        Pages held by the host tier are included, as they are restored on
+        acquisition. Unlike `_match`, this neither takes a reference on the
+        matched node nor refreshes access times, so it can be used to inspect
+        the cache when scheduling.
+
+        Args:
+            tokens: Sequence of tokens to match
+
+        Returns:
+            Number of matched tokens, a multiple of `tokens_per_page`
+        """
+        blocks, block_hashes = chain_block_hashes(tokens, self.tokens_per_page)
+        with self._lock:
+            cur = self.root
+            matched = 0
+            for block, block_hash in zip(blocks, block_hashes):
+                cur = self._lookup(cur, block, block_hash)
+                if cur is None:
+                    break
+                matched += 1
+
+            if self.host_tier is not None:
+                parent_hash = block_hashes[matched - 1] if matched else ROOT_BLOCK_HASH
+                for block, block_hash in zip(blocks[matched:], block_hashes[matched:]):
+                    if (parent_hash, block) not in self.host_tier:
+                        break
+                    parent_hash = block_hash
+                    matched += 1
+
+        return matched * self.tokens_per_page
 
     def fork_pages(self, pages: List[PageInfo], tokens: list[int]) -> List[PageInfo]:
         """Fork a sequence of pages into the trie.
 
-        Share prefixes with existing nodes till N-1 tokens, then create a new node
-        for the last token block. This allows sharing of common prefixes
+        Share prefixes with existing nodes till N-1 tokens. The last, partially
+        filled page is shared copy-on-write with the source allocation, and is
+        only copied once one of them writes to it (see `copy_on_write`).
 
 
         Args:
@@ -347,18 +652,32 @@ class TriePagedAttentionCache(BasePagedAttentionCache):
                     newly_acquired_pages=[],
                 )
 
-            new_page = self.page_pool.copy_page(pages[-1])
-            if new_page is None:
-                self._evict_pages(1)
-                new_page = self.page_pool.copy_page(pages[-1])
+        # Shared outside of the trie lock, which `copy_on_write` takes while
+        # holding the lock of shared pages.
+        self._share_page(pages[-1])
+        return TriePagedAttentionCacheAllocation(
+            cache=self,
+            tokens=list(tokens),
+            last_cached_node=curr,
+            cached_pages=matched_pages,
+            newly_acquired_pages=[pages[-1]],
+        )
 
-            return TriePagedAttentionCacheAllocation(
-                cache=self,
-                tokens=list(tokens),
-                last_cached_node=curr,
-                cached_pages=matched_pages,
-                newly_acquired_pages=[new_page],
-            )
+    def _acquire_copy_pages(self, count: int) -> Optional[List[PageInfo]]:
+        with self._lock:
+            pages = self.page_pool.acquire_free_pages(count)
+            if pages is None:
+                self._evict_pages(self._pages_short(count))
+                pages = self.page_pool.acquire_free_pages(count)
+        return pages
+
+    def swap_out(self, allocation):
+        # Published pages are shared through the trie, preempted requests
+        # release them and recompute what was evicted instead.
+        raise NotImplementedError("Swapping is not supported with prefix sharing")
+
+    def swap_in(self, host_pages):
+        raise NotImplementedError("Swapping is not supported with prefix sharing")
 
     def acquire_pages_for_tokens(
         self,
@@ -380,9 +699,11 @@ class TriePagedAttentionCache(BasePagedAttentionCache):
         Raises:
             CacheAllocationFailure: If unable to allocate required pages
         """
+        blocks, block_hashes = chain_block_hashes(tokens, self.tokens_per_page)
         with self._lock:
-            tokens = tuple(tokens)
-            cur_node, matched_pages = self._match(tokens)
+            cur_node, matched_pages = self._match_blocks(blocks, block_hashes)
+            if self.host_tier is not None:
+                cur_node = self._restore_pages(blocks, cur_node, matched_pages)
             cur_node.ref_count.increment()
 
             n_cached_tokens = len(matched_pages) * self.tokens_per_page
@@ -391,37 +712,49 @@ class TriePagedAttentionCache(BasePagedAttentionCache):
 
             new_pages = self.page_pool.acquire_free_pages(n_empty_pages)
 
-            if new_pages is not None:
-                return TriePagedAttentionCacheAllocation(
-                    cache=self,
-                    tokens=list(tokens),
-                    last_cached_node=cur_node,
-                    cached_pages=matched_pages,
-                    newly_acquired_pages=new_pages,
-                )
-
-            # Try eviction
-            self._evict_pages(n_empty_pages - len(self.page_pool.available_pages))
-            new_pages = self.page_pool.acquire_free_pages(n_empty_pages)
+            if new_pages is None:
+                # Try eviction
+                self._evict_pages(self._pages_short(n_empty_pages))
+                new_pages = self.page_pool.acquire_free_pages(n_empty_pages)
 
             if new_pages is None:
+                # Pages evicted to the host tier only return to the pool once
+                # they were copied out, the caller retries after that.
+                self._release_node(cur_node)
                 raise CacheAllocationFailure(
                     "Failed to acquire pages even after attempting eviction from LRU leaves"
                 )
 
+            self.lookup_tokens += len(tokens)
+            self.hit_tokens += min(n_cached_tokens, len(tokens))
             return TriePagedAttentionCacheAllocation(
                 cache=self,
                 tokens=list(tokens),
                 last_cached_node=cur_node,
                 cached_pages=matched_pages,
                 newly_acquired_pages=new_pages,
+                blocks=blocks,
+                block_hashes=block_hashes,
             )
 
+    def _pages_short(self, count: int) -> int:
+        """Number of pages to evict so that `count` pages become free.
+
+        Pages already evicted but still being copied out to the host tier are
+        counted as free.
+        """
+        return (
+            count
+            - len(self.page_pool.available_pages)
+            - self.page_pool.transfers.held_page_count
+        )
+
     def _evict_pages(self, max_pages: int) -> int:
         """Evict up to max_pages pages using LRU strategy.
 
         Evicts from unreferenced leaf nodes first, working up the trie
-        as nodes become childless.
+        as nodes become childless. Evicted pages are copied out to the host
+        tier, if any, and only return to the pool after `fence_transfers`.
 
         Args:
             max_pages: Maximum number of pages to evict
@@ -429,23 +762,27 @@ class TriePagedAttentionCache(BasePagedAttentionCache):
         Returns:
             Number of pages actually evicted
         """
+        start = time.perf_counter()
         pages_to_evict = []
-
-        # Initialize heap with unreferenced leaves
-        unused_leaf_heap = [
-            (leaf.access_time, leaf)
-            for leaf in self.leaves
-            if leaf.ref_count.is_empty()
-        ]
-        heapq.heapify(unused_leaf_heap)
+        heap = self._eviction_heap
 
         # Evict least recently used nodes
-        while unused_leaf_heap and len(pages_to_evict) < max_pages:
-            _, leaf = heapq.heappop(unused_leaf_heap)
+        while heap and len(pages_to_evict) < max_pages:
+            access_time, leaf = heapq.heappop(heap)
+            if leaf not in self.leaves or not leaf.ref_count.is_empty():
+                continue
+            if access_time != leaf.access_time:
+                # Accessed since it was queued, requeue it in order.
+                heapq.heappush(heap, (leaf.access_time, leaf))
+                continue
+
             pages_to_evict.append(leaf.page)
             parent = leaf.parent
 
-            leaf.unlink()
+            if self.host_tier is not None:
+                self.host_tier.store((parent.block_hash, leaf.tokens), leaf.page)
+
+            self._unlink(leaf)
             self.leaves.remove(leaf)
 
             # If parent becomes childless, it becomes a leaf
@@ -454,11 +791,15 @@ class TriePagedAttentionCache(BasePagedAttentionCache):
                 and not parent.children
                 and parent not in self.leaves
             ):
-                self.leaves.add(parent)
-                if parent.ref_count.is_empty():
-                    heapq.heappush(unused_leaf_heap, (parent.access_time, parent))
+                self._add_leaf(parent)
 
-        if pages_to_evict:
+        if pages_to_evict and self.host_tier is not None:
+            # The pages are reused once their copies to the host completed.
+            self.page_pool.free_pages_after_transfers(pages_to_evict)
+        elif pages_to_evict:
             self.page_pool.free_pages(pages_to_evict)
 
+        self.evicted_pages += len(pages_to_evict)
+        self.eviction_runs += 1
+        self.eviction_time += time.perf_counter() - start
         return len(pages_to_evict)
@@ -24,6 +24,7 @@ from fastapi import FastAPI
 
 
 from contextlib import asynccontextmanager
+import dataclasses
 import logging
 
 
@@ -60,6 +61,7 @@ class ShortfinLlmLifecycleManager:
                 num_beams=args.num_beams,
                 use_beam_search=args.use_beam_search,
                 logits_normalization=model_params.logits_normalization,
+                speculative_tokens=getattr(args, "speculative_tokens", 0),
             )
             server_params.decode_config = decode_config
 
@@ -91,6 +93,31 @@ class ShortfinLlmLifecycleManager:
         self.sysman = sysman
         self.services = {"default": service}
 
+        if getattr(args, "draft_vmfb", None) is not None:
+            # The draft model only proposes tokens, startup prompts and cache
+            # snapshots are the target's.
+            draft_server_params = dataclasses.replace(
+                server_params,
+                prefix_cache_snapshot=None,
+                pinned_prompts=[],
+                chunk_block_size=None,
+                mixed_token_budget=None,
+            )
+            draft_service = LlmGenerateService(
+                name="draft",
+                sysman=sysman,
+                tokenizer=tokenizer,
+                model_params=ModelParams.load_json(args.draft_model_config),
+                server_params=draft_server_params,
+                program_isolation=server_params.program_isolation,
+            )
+            draft_service.load_inference_module(args.draft_vmfb)
+            draft_service.load_inference_parameters(
+                *args.draft_parameters, parameter_scope="model"
+            )
+            service.draft_service = draft_service
+            self.services["draft"] = draft_service
+
     def __enter__(self):
         self.sysman.start()
         for service_name, service in self.services.items():
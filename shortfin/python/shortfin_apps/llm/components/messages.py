@@ -5,6 +5,7 @@
 # SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
 
 from enum import Enum
+import time
 from uuid import uuid4
 
 import shortfin as sf
@@ -13,6 +14,7 @@ from shortfin.interop.fastapi import RequestStatusTracker
 
 from .kvcache.base_attention_cache import BasePagedAttentionCache, PageAllocation
 from .kvcache.trie_attention_cache import TriePagedAttentionCache
+from .scheduling_policy import SchedulingInfo
 from ...utils import InferenceExecRequest
 
 
@@ -31,6 +33,7 @@ class LlmInferenceExecRequest(InferenceExecRequest):
         rid=None,
         orig_instance_id=None,
         status_tracker: RequestStatusTracker | None = None,
+        scheduling_info: SchedulingInfo | None = None,
     ):
         super().__init__()
         self.phase = phase
@@ -48,6 +51,19 @@ class LlmInferenceExecRequest(InferenceExecRequest):
             self.instance_id if orig_instance_id is None else orig_instance_id
         )
 
+        # Creation time, copies keep the time of the request they were copied
+        # from. Older requests are preempted last.
+        self.created_at = time.monotonic()
+
+        # Priority, deadline, and tenant of the request, shared between copies.
+        self.scheduling_info = (
+            SchedulingInfo(arrival=self.created_at)
+            if scheduling_info is None
+            else scheduling_info
+        )
+        # Time the request was last submitted to a batcher.
+        self.enqueued_at = self.created_at
+
         # Response control.
         # If True, return all sequence position logits. If False, return only
         # the last.
@@ -62,6 +78,16 @@ class LlmInferenceExecRequest(InferenceExecRequest):
         self.result_logits: sfnp.device_array | None = None
         self.result_indices: sfnp.device_array | None = None
 
+        # If set, the decode executor selects the next token for this request
+        # with the rest of its batch and stores it in `result_token`.
+        self.decode_config = None
+        self.result_token: int | None = None
+
+        # Number of trailing `input_token_ids` that are speculative. Their KV
+        # cache entries are written but may be rolled back, so their pages are
+        # not published.
+        self.draft_token_count: int = 0
+
         # Cache pages that have been locked for this request.
         self._cache: BasePagedAttentionCache | None = None
         self.allocation: PageAllocation | None = None
@@ -76,10 +102,13 @@ class LlmInferenceExecRequest(InferenceExecRequest):
             exec_req.input_token_ids.copy(),
             rid=exec_req.rid,
             orig_instance_id=exec_req.orig_instance_id,
+            scheduling_info=exec_req.scheduling_info,
         )
 
         new_exec_req.start_position = exec_req.start_position
+        new_exec_req.created_at = exec_req.created_at
         new_exec_req.prompt_length = exec_req.prompt_length
+        new_exec_req.decode_config = exec_req.decode_config
         new_exec_req._cache = exec_req._cache
 
         # check if the cache is instance of TriePagedAttentionCache then
@@ -101,6 +130,8 @@ class LlmInferenceExecRequest(InferenceExecRequest):
         self.return_all_logits = False
         self.return_host_array = True
         self.result_logits = None
+        self.result_token = None
+        self.draft_token_count = 0
 
     def cache_page_indices(self, max_len: int) -> list[int]:
         if not self.allocation:
@@ -110,9 +141,10 @@ class LlmInferenceExecRequest(InferenceExecRequest):
 
     def publish_allocated_pages(self, up_to_page_index: int):
         assert self.allocation
-        self.allocation.publish_pages_for_tokens(
-            self.input_token_ids, publish_incomplete_page=False
-        )
+        tokens = self.input_token_ids
+        if self.draft_token_count:
+            tokens = tokens[: -self.draft_token_count]
+        self.allocation.publish_pages_for_tokens(tokens, publish_incomplete_page=False)
 
     def free_cache_pages(self):
         if self.allocation:
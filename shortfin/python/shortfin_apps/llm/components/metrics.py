@@ -0,0 +1,478 @@
+# Copyright 2025 Advanced Micro Devices, Inc.
+#
+# Licensed under the Apache License v2.0 with LLVM Exceptions.
+# See https://llvm.org/LICENSE.txt for license information.
+# SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
+
+"""Serving metrics exposed in the Prometheus text format.
+
+Counters and histograms are recorded on the hot path of the batchers and
+generate processes, so recording never takes a lock: each thread updates its
+own cells, which are only summed when the metrics are collected. State that
+components already track, such as the page pool or the prefix cache
+counters, is read when the metrics are collected instead of being recorded.
+"""
+
+import bisect
+import math
+import threading
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, List, Sequence, Tuple
+
+from .kvcache.trie_attention_cache import TriePagedAttentionCache
+
+if TYPE_CHECKING:
+    from .service import LlmGenerateService
+
+# Content type of the Prometheus text exposition format.
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+
+TOKEN_LATENCY_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.02,
+    0.04,
+    0.06,
+    0.08,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+)
+
+RATIO_BUCKETS = (0.125, 0.25, 0.375, 0.5, 0.625, 0.75, 0.875, 1.0)
+
+LabelValues = Tuple[str, ...]
+
+
+class _ThreadCells:
+    """Per-thread cells of a metric, summed when the metric is collected.
+
+    A thread only takes the lock the first time it records, to register its
+    cells.
+    """
+
+    def __init__(self, size: int):
+        self._size = size
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._cells: List[List[float]] = []
+
+    def get(self) -> List[float]:
+        cells = getattr(self._local, "cells", None)
+        if cells is None:
+            cells = [0] * self._size
+            with self._lock:
+                self._cells.append(cells)
+            self._local.cells = cells
+        return cells
+
+    def totals(self) -> List[float]:
+        with self._lock:
+            cells = list(self._cells)
+        totals = [0] * self._size
+        for thread_cells in cells:
+            for i, value in enumerate(thread_cells):
+                totals[i] += value
+        return totals
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra="") -> str:
+    labels = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        labels.append(extra)
+    if not labels:
+        return ""
+    return "{" + ",".join(labels) + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[LabelValues, object] = {}
+
+    def labels(self, *values):
+        """The child of this metric recording for the given label values."""
+        values = tuple(str(v) for v in values)
+        child = self._children.get(values)
+        if child is None:
+            assert len(values) == len(self.labelnames)
+            # `setdefault` is atomic, racing threads share the same child.
+            child = self._children.setdefault(values, self._make_child())
+        return child
+
+    def _make_child(self):
+        ...
+
+    def samples(self) -> Iterable[Tuple[str, str, float]]:
+        """Yield the `(suffix, labels, value)` of each sample."""
+        ...
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.help}",
+            f"# TYPE {self.name} {self.type}",
+        ]
+        for suffix, labels, value in self.samples():
+            lines.append(f"{self.name}{suffix}{labels} {_format_value(value)}")
+        return lines
+
+
+class _CounterChild:
+    __slots__ = ["_cells"]
+
+    def __init__(self):
+        self._cells = _ThreadCells(1)
+
+    def inc(self, amount: float = 1):
+        self._cells.get()[0] += amount
+
+    @property
+    def value(self) -> float:
+        return self._cells.totals()[0]
+
+
+class Counter(_Metric):
+    """Monotonic count, optionally partitioned by labels."""
+
+    type = "counter"
+
+    def _make_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1):
+        self.labels().inc(amount)
+
+    def samples(self):
+        for values, child in list(self._children.items()):
+            yield "_total", _format_labels(self.labelnames, values), child.value
+
+
+class _HistogramChild:
+    __slots__ = ["_buckets", "_cells"]
+
+    def __init__(self, buckets: Sequence[float]):
+        self._buckets = buckets
+        # A count per bucket, the count above the last bucket, and the sum.
+        self._cells = _ThreadCells(len(buckets) + 2)
+
+    def observe(self, value: float):
+        cells = self._cells.get()
+        cells[bisect.bisect_left(self._buckets, value)] += 1
+        cells[-1] += value
+
+    def totals(self) -> Tuple[List[float], float, float]:
+        """Cumulative bucket counts, total count, and sum of observations."""
+        totals = self._cells.totals()
+        cumulative = []
+        count = 0
+        for bucket_count in totals[:-1]:
+            count += bucket_count
+            cumulative.append(count)
+        return cumulative, count, totals[-1]
+
+
+class Histogram(_Metric):
+    """Distribution of observations over fixed buckets."""
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        buckets: Sequence[float],
+        labelnames: Sequence[str] = (),
+    ):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _make_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def samples(self):
+        for values, child in list(self._children.items()):
+            cumulative, count, total = child.totals()
+            bounds = self.buckets + (math.inf,)
+            for bound, bucket_count in zip(bounds, cumulative):
+                le = f'le="{_format_value(float(bound))}"'
+                labels = _format_labels(self.labelnames, values, le)
+                yield "_bucket", labels, bucket_count
+            labels = _format_labels(self.labelnames, values)
+            yield "_count", labels, count
+            yield "_sum", labels, total
+
+
+class CollectedMetric(_Metric):
+    """Metric read from the state of a component when collected.
+
+    `collect` returns the value of each label set, keyed by label values.
+    Summaries are given as `(count, sum)` pairs.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        type: str,
+        collect: Callable[[], Dict[LabelValues, object]],
+        labelnames: Sequence[str] = (),
+    ):
+        super().__init__(name, help, labelnames)
+        self.type = type
+        self._collect = collect
+
+    def samples(self):
+        for values, value in self._collect().items():
+            labels = _format_labels(self.labelnames, values)
+            if self.type == "summary":
+                count, total = value
+                yield "_count", labels, count
+                yield "_sum", labels, total
+            elif self.type == "counter":
+                yield "_total", labels, value
+            else:
+                yield "", labels, value
+
+
+class MetricsRegistry:
+    """Set of metrics rendered together."""
+
+    def __init__(self):
+        self.metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labelnames=()) -> Counter:
+        counter = self.register(Counter(name, help, labelnames))
+        if not labelnames:
+            # Report a 0 before anything is recorded.
+            counter.labels()
+        return counter
+
+    def histogram(self, name, help, buckets, labelnames=()) -> Histogram:
+        histogram = self.register(Histogram(name, help, buckets, labelnames))
+        if not labelnames:
+            histogram.labels()
+        return histogram
+
+    def collected(self, name, help, type, collect, labelnames=()) -> CollectedMetric:
+        return self.register(CollectedMetric(name, help, type, collect, labelnames))
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class ServiceMetrics:
+    """Serving metrics of an `LlmGenerateService`.
+
+    Request latencies and flight shapes are recorded as they happen. Queue
+    sizes, KV cache usage, prefix cache hits and evictions, preemptions, and
+    per-class batcher queue times are read from the service when collected.
+    """
+
+    def __init__(self, service: "LlmGenerateService"):
+        self.service = service
+        registry = self.registry = MetricsRegistry()
+
+        self.requests = registry.counter(
+            "shortfin_llm_requests",
+            "Generate requests by outcome.",
+            ["status"],
+        )
+        self.time_to_first_token = registry.histogram(
+            "shortfin_llm_time_to_first_token_seconds",
+            "Time from the arrival of a sequence to its first generated token.",
+            LATENCY_BUCKETS,
+        )
+        self.time_per_output_token = registry.histogram(
+            "shortfin_llm_time_per_output_token_seconds",
+            "Mean time between the generated tokens of a sequence after the first.",
+            TOKEN_LATENCY_BUCKETS,
+        )
+        self.admission_wait = registry.histogram(
+            "shortfin_llm_admission_wait_seconds",
+            "Time a request waited for room in the request queue and KV cache.",
+            LATENCY_BUCKETS,
+        )
+        registry.collected(
+            "shortfin_llm_queue_wait_seconds",
+            "Time work items waited in a batcher before being scheduled.",
+            "summary",
+            self._collect_queue_waits,
+            ["batcher", "priority"],
+        )
+        self.batch_occupancy = registry.histogram(
+            "shortfin_llm_batch_occupancy_ratio",
+            "Fraction of the batch size of an invocation holding requests.",
+            RATIO_BUCKETS,
+            ["process"],
+        )
+        self.padding = registry.histogram(
+            "shortfin_llm_padding_ratio",
+            "Fraction of the tokens of an invocation that are padding.",
+            RATIO_BUCKETS,
+            ["process"],
+        )
+        registry.collected(
+            "shortfin_llm_request_queue_size",
+            "Sequences admitted to the request queue, and requests waiting for admission.",
+            "gauge",
+            self._collect_queue_sizes,
+            ["state"],
+        )
+        registry.collected(
+            "shortfin_llm_kv_cache_pages",
+            "KV cache pages of the page pool.",
+            "gauge",
+            self._collect_kv_pages,
+            ["state"],
+        )
+        registry.collected(
+            "shortfin_llm_kv_cache_utilization_ratio",
+            "Fraction of the KV cache pages in use.",
+            "gauge",
+            self._collect_kv_utilization,
+        )
+        registry.collected(
+            "shortfin_llm_prefix_cache_tokens",
+            "Prompt tokens looked up in the prefix cache, and those found.",
+            "counter",
+            self._collect_prefix_cache_tokens,
+            ["result"],
+        )
+        registry.collected(
+            "shortfin_llm_prefix_cache_evicted_pages",
+            "Pages evicted from the prefix cache.",
+            "counter",
+            self._collect_evicted_pages,
+        )
+        registry.collected(
+            "shortfin_llm_preemptions",
+            "Decode requests preempted to free KV cache pages.",
+            "counter",
+            self._collect_preemptions,
+        )
+
+    def render(self) -> str:
+        return self.registry.render()
+
+    def record_flight(
+        self, process: str, req_count: int, batch_size: int, padding_efficiency
+    ):
+        """Record the shape of an invocation of `batch_size` with `req_count` requests."""
+        occupancy = req_count / batch_size
+        self.batch_occupancy.labels(process).observe(occupancy)
+        if padding_efficiency is None:
+            # Every row holds a single token.
+            padding_efficiency = occupancy
+        self.padding.labels(process).observe(1.0 - padding_efficiency)
+
+    def record_sequence(self, arrival: float, first_token: float, end: float, tokens):
+        """Record the latencies of a sequence that generated `tokens` tokens."""
+        self.time_to_first_token.observe(first_token - arrival)
+        if tokens > 1:
+            self.time_per_output_token.observe((end - first_token) / (tokens - 1))
+
+    def _batchers(self):
+        service = self.service
+        # The mixed batcher serves both phases.
+        return dict.fromkeys(
+            b
+            for b in (
+                getattr(service, "prefill_batcher", None),
+                getattr(service, "decode_batcher", None),
+            )
+            if b is not None
+        )
+
+    def _collect_queue_waits(self):
+        waits = {}
+        for batcher in self._batchers():
+            queue_times = batcher.scheduling_policy.queue_times
+            for priority, stats in list(queue_times.items()):
+                waits[(batcher.name, priority)] = (stats.count, stats.total_s)
+        return waits
+
+    def _collect_queue_sizes(self):
+        queue_manager = self.service.queue_manager
+        return {
+            ("admitted",): queue_manager.current_queue_size,
+            ("waiting",): queue_manager.waiting_count,
+        }
+
+    def _collect_kv_pages(self):
+        page_pool = self.service.page_cache.page_pool
+        total = len(page_pool.attn_page_entries)
+        free = len(page_pool.available_pages)
+        return {("used",): total - free, ("free",): free}
+
+    def _collect_kv_utilization(self):
+        page_pool = self.service.page_cache.page_pool
+        total = len(page_pool.attn_page_entries)
+        free = len(page_pool.available_pages)
+        return {(): (total - free) / total if total else 0.0}
+
+    def _collect_prefix_cache_tokens(self):
+        cache = self.service.page_cache
+        if not isinstance(cache, TriePagedAttentionCache):
+            return {}
+        return {
+            ("lookup",): cache.lookup_tokens,
+            ("hit",): cache.hit_tokens,
+        }
+
+    def _collect_evicted_pages(self):
+        cache = self.service.page_cache
+        if not isinstance(cache, TriePagedAttentionCache):
+            return {}
+        return {(): cache.evicted_pages}
+
+    def _collect_preemptions(self):
+        batcher = getattr(self.service, "decode_batcher", None)
+        count = getattr(batcher, "preemption_count", None)
+        if count is None:
+            return {}
+        return {(): count}
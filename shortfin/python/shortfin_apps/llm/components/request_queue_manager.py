@@ -4,65 +4,256 @@
 # See https://llvm.org/LICENSE.txt for license information.
 # SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
 
+import asyncio
+import math
 import threading
 import logging
-from typing import Optional
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Optional
 
 logger = logging.getLogger(__name__)
 
 from .token_selection_strategy.config import DecodeConfig
 
+if TYPE_CHECKING:
+    from .kvcache.base_attention_cache import BasePagedAttentionCache
+
+# Weight of the latest request in the running mean of request durations.
+DURATION_SMOOTHING = 0.1
+
+
+@dataclass
+class _Waiter:
+    request_size: int
+    page_demand: int
+    loop: asyncio.AbstractEventLoop
+    future: asyncio.Future
+    id: Optional[int] = None
+
 
 class RequestQueueManager:
     """
     Manages a thread-safe request queue with a maximum size determined by model parameters.
+
+    When constructed with a page cache, requests are also admitted against the
+    KV cache pages they are projected to need: the pages of their prompt not
+    already cached, plus the pages of `max_completion_tokens` for every beam.
+    Requests that do not fit can wait for admission in arrival order. A request
+    is always admitted when nothing else is, so oversized requests still run.
     """
 
-    def __init__(self, max_queue_size: int):
+    def __init__(
+        self,
+        max_queue_size: int,
+        *,
+        page_cache: Optional["BasePagedAttentionCache"] = None,
+    ):
         self._max_queue_size = max_queue_size
+        self._page_cache = page_cache
+        self._page_capacity = (
+            page_cache.page_pool.config.alloc_page_count
+            if page_cache is not None
+            else 0
+        )
         self._lock = threading.Lock()
         self._current_queue_size = 0
+        self._current_pages = 0
         self._current_id = 0
         self._current_tasks = {}
+        self._waiters: deque[_Waiter] = deque()
+        self._mean_duration = None
+
+    @property
+    def current_queue_size(self) -> int:
+        return self._current_queue_size
+
+    @property
+    def current_pages(self) -> int:
+        """KV cache pages projected for the admitted requests."""
+        return self._current_pages
+
+    @property
+    def waiting_count(self) -> int:
+        return len(self._waiters)
 
     def current_tasks(self):
         with self._lock:
             return self._current_tasks.keys()
 
-    def add_to_queue(self, decode_configs: list[DecodeConfig]) -> bool:
+    def pin_pages(self, count: int) -> None:
+        """Exclude `count` pages held for the lifetime of the server."""
+        with self._lock:
+            self._page_capacity = max(0, self._page_capacity - count)
+
+    def page_demand(
+        self,
+        decode_configs: list[DecodeConfig],
+        input_token_ids: Optional[list[list[int]]],
+    ) -> int:
+        """Projected number of KV cache pages needed by a request.
+
+        Args:
+            decode_configs: The configurations of each sequence of the request
+            input_token_ids: The prompt of each sequence, if known
+
+        Returns:
+            Number of pages, 0 without a page cache or prompts.
+        """
+        cache = self._page_cache
+        if cache is None or input_token_ids is None:
+            return 0
+
+        tokens_per_page = cache.tokens_per_page
+        demand = 0
+        for config, tokens in zip(decode_configs, input_token_ids):
+            cached_pages = cache.match_length(tokens) // tokens_per_page
+            prompt_pages = math.ceil(len(tokens) / tokens_per_page) - cached_pages
+            completion_pages = math.ceil(config.max_completion_tokens / tokens_per_page)
+            demand += prompt_pages + config.num_beams * completion_pages
+        return demand
+
+    def _fits(self, request_size: int, page_demand: int) -> bool:
+        if self._current_queue_size + request_size > self._max_queue_size:
+            return False
+        if not self._current_tasks:
+            return True
+        return self._current_pages + page_demand <= self._page_capacity
+
+    def _admit(self, request_size: int, page_demand: int) -> int:
+        self._current_id += 1
+        self._current_queue_size += request_size
+        self._current_pages += page_demand
+        assert self._current_id not in self._current_tasks
+        self._current_tasks[self._current_id] = (
+            request_size,
+            page_demand,
+            time.monotonic(),
+        )
+        logger.debug(
+            f"Added to queue: new queue size {self._current_queue_size}, "
+            f"projected pages {self._current_pages}"
+        )
+        return self._current_id
+
+    def add_to_queue(
+        self,
+        decode_configs: list[DecodeConfig],
+        input_token_ids: Optional[list[list[int]]] = None,
+    ) -> Optional[int]:
         """
         Attempt to add a request to the queue.
 
         Args:
             decode_configs: The configurations being asked to add to workload
+            input_token_ids: The prompt of each sequence, used to project its KV cache pages
 
         Returns:
-            True if the request was added successfully, False if the queue is full.
+            The id of the request if it was added successfully, None if the
+            queue or the KV cache is full, or if requests are waiting.
         """
         request_size = sum(config.num_beams for config in decode_configs)
+        page_demand = self.page_demand(decode_configs, input_token_ids)
 
         with self._lock:
-            if self._current_queue_size + request_size > self._max_queue_size:
+            if self._waiters or not self._fits(request_size, page_demand):
                 logger.debug(
-                    f"Add failed: queue size {self._current_queue_size}, request size {request_size}"
+                    f"Add failed: queue size {self._current_queue_size}, request size {request_size}, "
+                    f"projected pages {self._current_pages}, page demand {page_demand}"
                 )
                 return None
-            self._current_id += 1
-            self._current_queue_size += request_size
-            assert self._current_id not in self._current_tasks
-            self._current_tasks[self._current_id] = request_size
-            logger.debug(f"Added to queue: new queue size {self._current_queue_size}")
-            return self._current_id
+            return self._admit(request_size, page_demand)
+
+    async def wait_for_admission(
+        self,
+        decode_configs: list[DecodeConfig],
+        input_token_ids: Optional[list[list[int]]] = None,
+        *,
+        timeout: float,
+    ) -> Optional[int]:
+        """
+        Add a request to the queue, waiting up to `timeout` seconds for room.
+
+        Waiting requests are admitted in arrival order as earlier requests are
+        removed.
+
+        Args:
+            decode_configs: The configurations being asked to add to workload
+            input_token_ids: The prompt of each sequence, used to project its KV cache pages
+            timeout: Seconds to wait, 0 to fail immediately
+
+        Returns:
+            The id of the request if it was added, None if it timed out.
+        """
+        request_size = sum(config.num_beams for config in decode_configs)
+        page_demand = self.page_demand(decode_configs, input_token_ids)
+
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if not self._waiters and self._fits(request_size, page_demand):
+                return self._admit(request_size, page_demand)
+            if timeout <= 0:
+                return None
+            waiter = _Waiter(
+                request_size=request_size,
+                page_demand=page_demand,
+                loop=loop,
+                future=loop.create_future(),
+            )
+            self._waiters.append(waiter)
+            logger.debug(f"Waiting for admission: {len(self._waiters)} waiting")
+
+        try:
+            await asyncio.wait_for(waiter.future, timeout)
+        except asyncio.TimeoutError:
+            pass
+        except asyncio.CancelledError:
+            id = self._withdraw(waiter)
+            if id is not None:
+                self.remove_from_queue(id)
+            raise
+        return self._withdraw(waiter)
+
+    def _withdraw(self, waiter: _Waiter) -> Optional[int]:
+        """Stop waiting, returning the id of the request if it was admitted."""
+        with self._lock:
+            if waiter.id is None:
+                self._waiters.remove(waiter)
+                # The head of the queue may have been blocking others.
+                self._admit_waiters()
+            return waiter.id
+
+    def _admit_waiters(self) -> None:
+        while self._waiters:
+            waiter = self._waiters[0]
+            if not self._fits(waiter.request_size, waiter.page_demand):
+                return
+            self._waiters.popleft()
+            waiter.id = self._admit(waiter.request_size, waiter.page_demand)
+            waiter.loop.call_soon_threadsafe(_wake, waiter.future)
+
+    def retry_after(self) -> int:
+        """Seconds a rejected request should wait before it is retried.
+
+        Estimated from the mean duration of recent requests and the number of
+        requests already waiting, each batch of `max_queue_size` of which takes
+        about one mean duration to drain.
+        """
+        with self._lock:
+            duration = self._mean_duration or 1.0
+            batches = 1 + len(self._waiters) / max(1, self._max_queue_size)
+            return max(1, math.ceil(duration * batches))
 
     def remove_from_queue(self, id: Optional[int]) -> None:
         """
         Remove a request from the queue.
 
         Args:
-            request_size: The configurations being removed to workload
+            id: The id returned when the request was added
 
         Raises:
-            RuntimeError: If the queue does not have enough items to remove.
+            RuntimeError: If the request is not in the queue.
         """
 
         with self._lock:
@@ -74,9 +265,24 @@ class RequestQueueManager:
                 logger.debug(error_msg)
                 raise RuntimeError(error_msg)
 
-            request_size = self._current_tasks[id]
-            del self._current_tasks[id]
+            request_size, page_demand, start = self._current_tasks.pop(id)
             self._current_queue_size -= request_size
+            self._current_pages -= page_demand
+
+            duration = time.monotonic() - start
+            if self._mean_duration is None:
+                self._mean_duration = duration
+            else:
+                self._mean_duration += DURATION_SMOOTHING * (
+                    duration - self._mean_duration
+                )
+
             logger.debug(
                 f"Removed from queue: new queue size {self._current_queue_size}"
             )
+            self._admit_waiters()
+
+
+def _wake(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
@@ -5,6 +5,7 @@
 # SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
 
 import itertools
+import math
 import logging
 import shortfin as sf
 import threading
@@ -30,6 +31,8 @@ class Workgroup:
     def __init__(self, *, wid: int, max_size: int):
         self._wid = wid
         self._members = {}
+        # Members that are preempted and not expected to be pending.
+        self._suspended = {}
         self._size = 0
         self._max_size = max_size
         self._strobe = None
@@ -78,13 +81,28 @@ class Workgroup:
         new_count = self._members[rid] - count
         if new_count == 0:
             self._members.pop(rid)
+            self._suspended.pop(rid, None)
         else:
             self._members[rid] = new_count
+            if self._suspended.get(rid, 0) > new_count:
+                self._suspended[rid] = new_count
+
+    def suspend(self, *, rid, count):
+        suspended = min(self._suspended.get(rid, 0) + count, self._members[rid])
+        self._suspended[rid] = suspended
+
+    def resume(self, *, rid, count):
+        suspended = self._suspended.get(rid, 0) - count
+        if suspended > 0:
+            self._suspended[rid] = suspended
+        else:
+            self._suspended.pop(rid, None)
 
     def schedule(self, *, pending, strobe: int):
         pending = [pending[rid] for rid in pending if rid in self._members]
         pending = list(itertools.chain(*pending))
         target_size = sum(self._members[rid] for rid in self._members)
+        target_size -= sum(self._suspended.values())
 
         # Not all workgroup items are ready.
         if len(pending) < target_size:
@@ -134,6 +152,116 @@ class WorkloadBuilder:
         return len(self._queues) * self._ideal_batch_size - self._occupancy
 
 
+class TokenBudgetWorkloadBuilder:
+    """Packs jobs into a single flight bounded by batch size and token count.
+
+    Unlike `WorkloadBuilder`, jobs are never split. A job either fits into the
+    remaining slots and tokens of the flight or is left for a later one. The
+    first job is accepted even if it exceeds the token budget, so that large
+    prefill chunks still make progress. Jobs with more requests than
+    `ideal_batch_size` cannot be invoked at once and are always rejected;
+    callers split them, as `Scheduler.should_execute` does.
+    """
+
+    def __init__(self, *, ideal_batch_size, token_budget):
+        self._ideal_batch_size = ideal_batch_size
+        self._token_budget = token_budget
+        self._queue = []
+        self._tokens = 0
+
+    def add_work(self, job, tokens) -> bool:
+        if self._queue:
+            if len(self._queue) + len(job) > self._ideal_batch_size:
+                return False
+            if self._tokens + tokens > self._token_budget:
+                return False
+        elif len(job) > self._ideal_batch_size:
+            return False
+
+        self._queue.extend(job)
+        self._tokens += tokens
+        return True
+
+    def get_scheduled(self):
+        return set(self._queue)
+
+    def get_jobs(self):
+        return [self._queue] if self._queue else []
+
+    @property
+    def tokens(self):
+        return self._tokens
+
+
+class LengthBucketBuilder:
+    """Regroups scheduled work into flights of similar sequence length.
+
+    A flight is padded to the exported batch size and to its longest
+    sequence, so its cost is modeled as `padded_batch_size * padded_length`
+    plus a fixed `flight_overhead` (in tokens) for every invocation. Jobs are
+    sorted by length and split into contiguous flights minimizing the total
+    cost.
+    """
+
+    def __init__(self, *, batch_sizes, seq_stride, flight_overhead):
+        self._batch_sizes = sorted(batch_sizes)
+        self._seq_stride = seq_stride
+        self._flight_overhead = flight_overhead
+
+    def padded_length(self, length):
+        return math.ceil(length / self._seq_stride) * self._seq_stride
+
+    def padded_batch_size(self, count):
+        for bs in self._batch_sizes:
+            if bs >= count:
+                return bs
+        return None
+
+    def flight_cost(self, count, length):
+        """Modeled cost of a flight of `count` sequences of at most `length`."""
+        bs = self.padded_batch_size(count)
+        return bs * self.padded_length(length) + self._flight_overhead
+
+    def build(self, jobs, length):
+        """Partition `jobs` into flights.
+
+        Args:
+            jobs: Lists of work items as returned by `Scheduler.should_execute`.
+            length: Callable returning the sequence length of a work item.
+
+        Returns:
+            List of flights, each a list of work items.
+        """
+        items = sorted(itertools.chain(*jobs), key=length)
+        if not items:
+            return []
+
+        lengths = [self.padded_length(length(item)) for item in items]
+        max_bs = self._batch_sizes[-1]
+
+        # cost[i] is the cheapest partition of items[:i], split[i] the start of
+        # its last flight.
+        cost = [0] + [math.inf] * len(items)
+        split = [0] * (len(items) + 1)
+        for end in range(1, len(items) + 1):
+            for start in range(max(0, end - max_bs), end):
+                # Items are sorted, so the last one sets the flight length.
+                flight_cost = self.flight_cost(end - start, lengths[end - 1])
+                candidate = cost[start] + flight_cost
+                if candidate < cost[end]:
+                    cost[end] = candidate
+                    split[end] = start
+
+        flights = []
+        end = len(items)
+        while end > 0:
+            start = split[end]
+            flights.append(items[start:end])
+            end = start
+        flights.reverse()
+        return flights
+
+
 class Scheduler:
     def __init__(self, *, ideal_batch_size):
         self._ideal_batch_size = ideal_batch_size
@@ -165,8 +293,12 @@ class Scheduler:
             )
         )
 
-        # Schedule all jobs known to the reservation system
-        for workgroup_id in self._workgroups.keys():
+        # Schedule all jobs known to the reservation system, in the order of
+        # their first pending work
+        workgroup_ids = dict.fromkeys(
+            self._workgroup_placement[rid] for rid in reserved
+        )
+        for workgroup_id in workgroup_ids:
             workgroup = self._workgroups[workgroup_id]
             to_schedule = workgroup.schedule(pending=reserved, strobe=strobe)
             if to_schedule is not None:
@@ -264,6 +396,22 @@ class Scheduler:
         if remove:
             self._workgroup_placement.pop(rid)
 
+    def suspend(self, *, rid, count):
+        """Stop waiting for `count` preempted work items of `rid`.
+
+        The rest of its workgroup is scheduled without them until they are
+        resumed.
+        """
+        if rid in self._workgroup_placement:
+            wid = self._workgroup_placement[rid]
+            self._workgroups[wid].suspend(rid=rid, count=count)
+
+    def resume(self, *, rid, count):
+        """Wait for `count` work items of `rid` suspended by `suspend` again."""
+        if rid in self._workgroup_placement:
+            wid = self._workgroup_placement[rid]
+            self._workgroups[wid].resume(rid=rid, count=count)
+
     def handle_scheduler(self, msg):
         if isinstance(msg, NewWorkItem):
             self._schedule(rid=msg.rid, count=msg.count)
@@ -0,0 +1,160 @@
+# Copyright 2025 Advanced Micro Devices, Inc.
+#
+# Licensed under the Apache License v2.0 with LLVM Exceptions.
+# See https://llvm.org/LICENSE.txt for license information.
+# SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
+
+"""Policies ordering the pending work of the LLM batchers."""
+
+import math
+import time
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional
+
+from .io_struct import DEFAULT_PRIORITY, PRIORITY_CLASSES, SchedulingParams
+
+if TYPE_CHECKING:
+    from .config_struct import ServerParams
+    from .messages import LlmInferenceExecRequest
+
+# Factor applied to the usage of every tenant each time work is boarded, so
+# fair share follows recent usage.
+FAIR_SHARE_DECAY = 0.99
+
+# Usage below which a tenant is forgotten.
+FAIR_SHARE_MIN_USAGE = 1e-3
+
+
+@dataclass
+class SchedulingInfo:
+    """Scheduling attributes of a request, shared by all of its executions."""
+
+    priority: str = DEFAULT_PRIORITY
+    tenant: Optional[str] = None
+    # `time.monotonic()` at which the request should be complete, if any.
+    deadline: Optional[float] = None
+    # `time.monotonic()` at which the request was received.
+    arrival: float = field(default_factory=time.monotonic)
+
+    @staticmethod
+    def from_params(
+        params: SchedulingParams, arrival: Optional[float] = None
+    ) -> "SchedulingInfo":
+        arrival = time.monotonic() if arrival is None else arrival
+        deadline = None
+        if params.deadline_ms is not None:
+            deadline = arrival + params.deadline_ms / 1000.0
+        return SchedulingInfo(
+            priority=params.priority,
+            tenant=params.tenant,
+            deadline=deadline,
+            arrival=arrival,
+        )
+
+
+@dataclass
+class QueueTimeStats:
+    """Time work items of a priority class waited in a batcher."""
+
+    count: int = 0
+    total_s: float = 0.0
+    max_s: float = 0.0
+
+    def record(self, seconds: float):
+        self.count += 1
+        self.total_s += seconds
+        self.max_s = max(self.max_s, seconds)
+
+    @property
+    def mean_s(self) -> float:
+        if self.count == 0:
+            return 0.0
+        return self.total_s / self.count
+
+
+class SchedulingPolicy:
+    """Orders the pending work of a batcher before it is scheduled.
+
+    The base policy treats every request equally and keeps the order chosen by
+    the batcher. Queue times are recorded per priority class for all policies.
+    """
+
+    def __init__(self):
+        self.queue_times: Dict[str, QueueTimeStats] = {
+            priority: QueueTimeStats() for priority in PRIORITY_CLASSES
+        }
+
+    def order(
+        self, requests: Iterable["LlmInferenceExecRequest"]
+    ) -> List["LlmInferenceExecRequest"]:
+        """Order `requests` from the first to the last to schedule."""
+        return list(requests)
+
+    def boarded(self, requests: Iterable["LlmInferenceExecRequest"]):
+        """Account for `requests` being scheduled into flights."""
+        now = time.monotonic()
+        for request in requests:
+            stats = self.queue_times.setdefault(
+                request.scheduling_info.priority, QueueTimeStats()
+            )
+            stats.record(now - request.enqueued_at)
+
+
+class PriorityPolicy(SchedulingPolicy):
+    """Orders requests by priority class, deadline, and tenant fair share.
+
+    Higher priority classes always go first, except that a request waiting in
+    the batcher for longer than the `max_queue_wait_s` of its class is
+    scheduled ahead of all others. Within a class, requests with the earliest
+    deadline go first, then those of the tenants with the least recent usage.
+    Requests that compare equal keep the order chosen by the batcher.
+    """
+
+    def __init__(self, max_queue_wait_s: Optional[Dict[str, float]] = None):
+        super().__init__()
+        self.max_queue_wait_s = max_queue_wait_s or {}
+        # Work items boarded per tenant, decayed by `FAIR_SHARE_DECAY`.
+        self.usage: Dict[Optional[str], float] = {}
+
+    def sort_key(self, request: "LlmInferenceExecRequest", now: float) -> tuple:
+        info = request.scheduling_info
+        max_wait = self.max_queue_wait_s.get(info.priority)
+        if max_wait is not None and now - request.enqueued_at > max_wait:
+            return (-1, info.arrival, 0.0)
+
+        rank = PRIORITY_CLASSES.index(info.priority)
+        deadline = info.deadline if info.deadline is not None else math.inf
+        return (rank, deadline, self.usage.get(info.tenant, 0.0))
+
+    def order(
+        self, requests: Iterable["LlmInferenceExecRequest"]
+    ) -> List["LlmInferenceExecRequest"]:
+        now = time.monotonic()
+        return sorted(requests, key=lambda r: self.sort_key(r, now))
+
+    def boarded(self, requests: Iterable["LlmInferenceExecRequest"]):
+        requests = list(requests)
+        super().boarded(requests)
+        if not requests:
+            return
+
+        self.usage = {
+            tenant: usage * FAIR_SHARE_DECAY
+            for tenant, usage in self.usage.items()
+            if usage * FAIR_SHARE_DECAY >= FAIR_SHARE_MIN_USAGE
+        }
+        for request in requests:
+            tenant = request.scheduling_info.tenant
+            self.usage[tenant] = self.usage.get(tenant, 0.0) + 1.0
+
+
+def make_scheduling_policy(server_params: "ServerParams") -> SchedulingPolicy:
+    """Create the scheduling policy of a batcher from the server parameters."""
+    if server_params.scheduling_policy == "default":
+        return SchedulingPolicy()
+    if server_params.scheduling_policy == "priority":
+        return PriorityPolicy(server_params.max_queue_wait_s)
+    raise ValueError(
+        f"Unknown scheduling policy {server_params.scheduling_policy}. "
+        "Currently only supporting 'default' and 'priority'."
+    )
@@ -8,34 +8,106 @@ import logging
 
 from dataclasses import dataclass
 from typing import List
-from threading import Lock
+from threading import Event, Lock
 import shortfin as sf
 
 
-from .batcher import PrefillBatcherProcess, DecodeBatcherProcess
-from .config_struct import ModelParams, ServerParams
+from .batcher import PrefillBatcherProcess, DecodeBatcherProcess, MixedBatcherProcess
+from .config_struct import DecodeConfig, ModelParams, ServerParams
 from .kvcache.base_attention_cache import (
     BasePagedAttentionCache,
 )
+from .kvcache.host_page_tier import HostPageTier
+from .kvcache.prefix_cache_snapshot import (
+    config_fingerprint,
+    load_prefix_cache,
+    save_prefix_cache,
+)
 from .kvcache.trie_attention_cache import TriePagedAttentionCache
 from .kvcache.page_pool import PagePoolConfig, PagePool
 from .manager import LlmSystemManager
+from .messages import InferencePhase, LlmInferenceExecRequest
+from .metrics import ServiceMetrics
 from .service_debug_dumper import SERVICE_DEBUG_DUMPER
 from .tokenizer import Tokenizer
-from .token_selection_strategy import is_multi_response
+from .token_selection_strategy import (
+    DraftModelProposer,
+    PromptLookupProposer,
+    SpeculativeProposer,
+    SpeculativeStats,
+    is_multi_response,
+    supports_speculation,
+)
 from .request_queue_manager import RequestQueueManager
+from .scheduling_policy import make_scheduling_policy
 
 from ...utils import GenerateService
 from .fiber_pool import FiberPool
 
 logger = logging.getLogger(__name__)
 
+# Seconds to wait for the prefix cache snapshot to be written at shutdown.
+PREFIX_CACHE_SAVE_TIMEOUT = 600
+
+
+class PrefixCacheSaveProcess(sf.Process):
+    """Writes a snapshot of the prefix cache from a fiber owning its devices."""
+
+    def __init__(self, service: "LlmGenerateService", done: Event):
+        super().__init__(fiber=service.prefill_fiber)
+        self.service = service
+        self.done = done
+        self.saved = False
+
+    async def run(self):
+        try:
+            await save_prefix_cache(
+                self.service.page_cache,
+                self.service.server_params.prefix_cache_snapshot,
+                config_fingerprint(self.service.model_params),
+            )
+            self.saved = True
+        except Exception:
+            logger.exception("Failed to save the prefix cache snapshot")
+        finally:
+            self.done.set()
+
+
+class PinPromptsProcess(sf.Process):
+    """Prefills the pinned prompts, keeping their pages in the prefix cache.
+
+    The allocation of each prompt is held by the service and never released, so
+    its pages cannot be evicted.
+    """
+
+    def __init__(self, service: "LlmGenerateService", prompts: List[str]):
+        super().__init__(fiber=service.main_fiber)
+        self.service = service
+        self.prompts = prompts
+
+    async def run(self):
+        encodings = self.service.tokenizer.encode(self.prompts)
+        for encoding in encodings:
+            exec_req = LlmInferenceExecRequest(
+                phase=InferencePhase.PREFILL,
+                input_token_ids=encoding.ids,
+                rid="pinned",
+            )
+            exec_req._cache = self.service.page_cache
+            self.service.prefill_batcher.submit(exec_req)
+            await exec_req.done
+            self.service.pinned_requests.append(exec_req)
+            self.service.queue_manager.pin_pages(len(exec_req.allocation.pages))
+
+        logger.info("Pinned %d prompts in the prefix cache", len(encodings))
+
 
 class LlmGenerateService(GenerateService):
     """Top level service interface for generating text against a model."""
 
     inference_program: sf.Program
     prefill_functions: dict[int, sf.ProgramFunction]
+    prefill_final_functions: dict[int, sf.ProgramFunction] | None
     decode_functions: dict[int, sf.ProgramFunction]
 
     def __init__(
@@ -61,8 +133,16 @@ class LlmGenerateService(GenerateService):
 
         self.set_isolation(program_isolation)
         self._initialize_worker_and_fiber()
-        self.queue_manager = RequestQueueManager(self.max_queue_size)
+        self.pinned_requests: List[LlmInferenceExecRequest] = []
         self._initialize_page_cache()
+        self.queue_manager = RequestQueueManager(
+            self.max_queue_size, page_cache=self.page_cache
+        )
+
+        # Service of a smaller model proposing tokens for speculative decode.
+        self.draft_service: "LlmGenerateService | None" = None
+        self.speculative_stats = SpeculativeStats()
+        self.metrics = ServiceMetrics(self)
 
     def _initialize_max_queue_size(self):
         """Initialize request and response queues"""
@@ -97,10 +177,22 @@ class LlmGenerateService(GenerateService):
         page_pool = PagePool(devices=self.devices, config=page_pool_config)
 
         if self.server_params.prefix_sharing_algorithm == "trie":
+            host_tier = None
+            if self.server_params.host_cache_page_count > 0:
+                host_tier = HostPageTier(
+                    page_pool, capacity=self.server_params.host_cache_page_count
+                )
             self.page_cache = TriePagedAttentionCache(
                 page_pool=page_pool,
                 tokens_per_page=self.model_params.paged_kv_cache.block_seq_stride,
+                host_tier=host_tier,
             )
+            if self.server_params.prefix_cache_snapshot is not None:
+                load_prefix_cache(
+                    self.page_cache,
+                    self.server_params.prefix_cache_snapshot,
+                    config_fingerprint(self.model_params),
+                )
         elif self.server_params.prefix_sharing_algorithm == "none":
             self.page_cache = BasePagedAttentionCache(
                 page_pool=page_pool,
@@ -118,12 +210,34 @@ class LlmGenerateService(GenerateService):
         )
         self.initialize_function_references()
 
+        if self.server_params.mixed_token_budget is not None:
+            # One batcher serves both phases, packing them into shared flights.
+            self.prefill_batcher = MixedBatcherProcess(
+                self.prefill_fiber,
+                self.page_cache,
+                self.model_params,
+                self.prefill_functions,
+                self.prog_isolation,
+                token_budget=self.server_params.mixed_token_budget,
+                chunk_block_size=self.server_params.chunk_block_size,
+                scheduling_policy=make_scheduling_policy(self.server_params),
+                metrics=self.metrics,
+            )
+            self.decode_batcher = self.prefill_batcher
+            self.prefill_batcher.launch()
+            self._pin_prompts()
+            return
+
         self.prefill_batcher = PrefillBatcherProcess(
             self.prefill_fiber,
             self.page_cache,
             self.model_params,
             self.prefill_functions,
             self.prog_isolation,
+            chunk_block_size=self.server_params.chunk_block_size,
+            prefill_final_functions=self.prefill_final_functions,
+            scheduling_policy=make_scheduling_policy(self.server_params),
+            metrics=self.metrics,
         )
 
         self.decode_batcher = DecodeBatcherProcess(
@@ -132,10 +246,93 @@ class LlmGenerateService(GenerateService):
             self.model_params,
             self.decode_functions,
             self.prog_isolation,
+            preemption_mode=self.server_params.preemption_mode,
+            recompute_callback=self.prefill_batcher.submit,
+            scheduling_policy=make_scheduling_policy(self.server_params),
+            metrics=self.metrics,
         )
 
         self.prefill_batcher.launch()
         self.decode_batcher.launch()
+        self._pin_prompts()
+
+    def _pin_prompts(self):
+        if not self.server_params.pinned_prompts:
+            return
+        if not isinstance(self.page_cache, TriePagedAttentionCache):
+            logger.warning("Pinned prompts require the `trie` prefix sharing algorithm")
+            return
+        PinPromptsProcess(self, self.server_params.pinned_prompts).launch()
+
+    def save_prefix_cache(self, timeout: float = PREFIX_CACHE_SAVE_TIMEOUT) -> bool:
+        """Write a snapshot of the prefix cache to `prefix_cache_snapshot`.
+
+        Blocks until the snapshot is written, so it must not be called from a
+        worker of the service.
+
+        Args:
+            timeout: Seconds to wait for the snapshot
+
+        Returns:
+            True if the snapshot was written in time
+        """
+        if self.server_params.prefix_cache_snapshot is None or not isinstance(
+            self.page_cache, TriePagedAttentionCache
+        ):
+            return False
+
+        done = Event()
+        process = PrefixCacheSaveProcess(self, done)
+        process.launch()
+        if not done.wait(timeout):
+            logger.warning("Timed out saving the prefix cache snapshot")
+            return False
+        return process.saved
+
+    def create_speculative_proposer(
+        self, decode_config: DecodeConfig
+    ) -> SpeculativeProposer | None:
+        """Proposer for a generation with `decode_config`, if it is speculative.
+
+        Drafts come from the draft model if one is loaded, and from earlier
+        occurrences of the sequence's last tokens otherwise. Verification runs
+        as a prefill chunk at the decode position, so it requires a model
+        exported with `has_prefill_position`.
+        """
+        if not supports_speculation(decode_config):
+            return None
+        if not self.model_params.has_prefill_position:
+            logger.warning(
+                "Speculative decoding requires a model exported with `has_prefill_position`"
+            )
+            return None
+        if self.draft_service is None:
+            return PromptLookupProposer()
+        return DraftModelProposer(
+            prefill_batcher=self.draft_service.prefill_batcher,
+            decode_batcher=self.draft_service.decode_batcher,
+            page_cache=self.draft_service.page_cache,
+        )
+
+    def shutdown(self):
+        self.save_prefix_cache()
+        if self.speculative_stats.steps:
+            logger.info("Speculative decoding: %r", self.speculative_stats)
+        self._log_queue_times()
+        super().shutdown()
+
+    def _log_queue_times(self):
+        # The mixed batcher serves both phases.
+        batchers = dict.fromkeys([self.prefill_batcher, self.decode_batcher])
+        for batcher in batchers:
+            for priority, stats in batcher.scheduling_policy.queue_times.items():
+                if stats.count:
+                    logger.info(
+                        "%s queue time of %s requests: %r",
+                        batcher.name,
+                        priority,
+                        stats,
+                    )
 
     def initialize_function_references(self):
         self.prefill_functions = {}
@@ -143,6 +340,14 @@ class LlmGenerateService(GenerateService):
             self.prefill_functions[bs] = self.inference_program[
                 f"{self.model_params.module_name}.prefill_bs{bs}"
             ]
+        # Resolve prefill entrypoints returning only the last position.
+        self.prefill_final_functions = None
+        if self.model_params.has_prefill_final_logits:
+            self.prefill_final_functions = {}
+            for bs in self.model_params.prefill_batch_sizes:
+                self.prefill_final_functions[bs] = self.inference_program[
+                    f"{self.model_params.module_name}.prefill_final_bs{bs}"
+                ]
         # Resolve decode entrypoints.
         self.decode_functions = {}
         for bs in self.model_params.decode_batch_sizes:
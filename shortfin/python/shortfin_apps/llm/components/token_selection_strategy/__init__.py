@@ -4,7 +4,7 @@
 # See https://llvm.org/LICENSE.txt for license information.
 # SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
 
-from typing import Callable, List, Union
+from typing import Callable, List, Optional, Union
 
 from .base_token_selection_strategy import (
     BaseTokenSelectionStrategy,
@@ -17,6 +17,13 @@ from .config import (
     TokenSelectionStrategyConfig,
 )
 from .scorer import BeamSearchScorer, DefaultScorer
+from .speculative import (
+    DraftModelProposer,
+    PromptLookupProposer,
+    SpeculativeProposer,
+    SpeculativeStats,
+    supports_speculation,
+)
 from .token_selector import TokenSelector
 from .sampler import Sampler
 
@@ -26,6 +33,9 @@ def build_token_selector_config(
     prefill_batcher,
     decode_batcher,
     results_callback: Callable[[Union[int, List[int]]], None],
+    stream_callback: Optional[Callable[[int], None]] = None,
+    speculative_proposer: Optional[SpeculativeProposer] = None,
+    speculative_stats: Optional[SpeculativeStats] = None,
 ) -> TokenSelectionStrategyConfig:
     """Build a configuration class for a given token selection strategy.
 
@@ -34,6 +44,9 @@ def build_token_selector_config(
         prefill_callback (Callable[[LlmInferenceExecRequest], None]): Callback for invoking prefill. Typically a batcher function.
         decode_callback (Callable[[LlmInferenceExecRequest], None]): Callback for invoking decode. Typically a batcher function.
         results_callback (Callable[[Union[int, List[int]]], None]): Callback for during or after tokens are generated, depending on the strategy.
+        stream_callback (Optional[Callable[[int], None]]): Callback receiving each generated token. Only supported for a single response.
+        speculative_proposer (Optional[SpeculativeProposer]): Source of draft tokens for speculative decode.
+        speculative_stats (Optional[SpeculativeStats]): Acceptance metrics to update during speculative decode.
         eos_token_id (int): Token to stop generation on.
         max_completion_tokens (int): Max tokens to generate.
 
@@ -43,6 +56,9 @@ def build_token_selector_config(
     Returns:
         TokenSelectionStrategyConfig: Instantiated config for token selector.
     """
+    # A batcher serving both phases schedules prefill work without
+    # reservations, which would otherwise hold back its decode workgroups.
+    shared_batcher = prefill_batcher is decode_batcher
     return TokenSelectionStrategyConfig(
         decode_config,
         prefill_callback=prefill_batcher.submit,
@@ -50,6 +66,15 @@ def build_token_selector_config(
         decode_begin_callback=decode_batcher.reserve_workitem,
         decode_end_callback=decode_batcher.complete_workitem,
         results_callback=results_callback,
+        stream_callback=stream_callback,
+        prefill_begin_callback=(
+            None if shared_batcher else prefill_batcher.reserve_workitem
+        ),
+        prefill_end_callback=(
+            None if shared_batcher else prefill_batcher.complete_workitem
+        ),
+        speculative_proposer=speculative_proposer,
+        speculative_stats=speculative_stats,
     )
 
 
@@ -65,9 +90,14 @@ __all__ = [
     "BaseTokenSelectionStrategy",
     "BeamSearchScorer",
     "DefaultScorer",
+    "DraftModelProposer",
     "get_strategy_from_str",
     "is_multi_response",
+    "PromptLookupProposer",
     "Sampler",
+    "SpeculativeProposer",
+    "SpeculativeStats",
+    "supports_speculation",
     "TokenSelectionStrategyConfig",
     "TokenSelectionStrategy",
     "TokenSelector",
@@ -81,6 +81,9 @@ class BaseTokenSelectionStrategy(ABC):
         exec_req.input_token_ids.append(token_int)
         exec_req.start_position = len(exec_req.input_token_ids) - 1
 
+        if token_selection_strategy_config.stream_callback is not None:
+            token_selection_strategy_config.stream_callback(token_int)
+
     @abstractmethod
     async def decode(self, exec_req: LlmInferenceExecRequest) -> List[int]:
         """Abstract method for generating completion tokens in a decode loop.
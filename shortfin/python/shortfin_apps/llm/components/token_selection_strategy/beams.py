@@ -8,13 +8,11 @@ from abc import ABC, abstractmethod
 from dataclasses import dataclass, field
 
 from .config import DecodeConfig, LogitsNormalization
-from .sampler import Sampler
+from .sampler import Sampler, TOP_P_DEFAULT_SELECTION
 from ..messages import LlmInferenceExecRequest
 
 logger = logging.getLogger(__name__)
 
-TOP_P_DEFAULT_SELECTION = 32
-
 
 @dataclass
 class BaseBeam(ABC):
@@ -220,6 +218,18 @@ class BaseBeam(ABC):
         values: np.ndarray,
         logits_normalization: LogitsNormalization,
     ) -> np.ndarray:
+        """Convert the values of sampling candidates to probabilities.
+
+        The `temperature` is applied in log space and the candidates are
+        renormalized, as `Sampler.sample_batch` does for decode batches.
+        """
+        temperature = self.decode_config.temperature
+        if temperature != 1.0:
+            if logits_normalization == LogitsNormalization.SOFTMAX:
+                with np.errstate(divide="ignore"):
+                    values = np.log(values)
+            return self._softmax(np.divide(values, temperature))
+
         return self._convert_logits_normalization(
             logits_normalization,
             LogitsNormalization.SOFTMAX,
@@ -375,6 +385,13 @@ class BeamSearchBeam(BaseBeam):
 
 
 class DefaultBeam(BaseBeam):
+    def sample_logits(self, num_completed_beams: int) -> int:
+        """Return the token selected on the decode batch, if any."""
+        if self.exec_req.result_token is not None:
+            return self.exec_req.result_token
+
+        return super().sample_logits(num_completed_beams)
+
     def sample_default(self, logits, indices, _):
         if indices is not None:
             return indices.items[0]
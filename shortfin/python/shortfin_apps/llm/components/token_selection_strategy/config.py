@@ -5,7 +5,7 @@
 # SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
 
 from dataclasses import dataclass, fields
-from typing import Callable, List, Union
+from typing import TYPE_CHECKING, Callable, List, Optional, Union
 from dataclasses_json import dataclass_json, Undefined
 from enum import Enum, auto
 
@@ -13,6 +13,9 @@ from enum import Enum, auto
 from ..io_struct import DEFAULT_MAX_COMPLETION_TOKENS, DEFAULT_TEMPERATURE, NOT_PROVIDED
 from ..messages import LlmInferenceExecRequest
 
+if TYPE_CHECKING:
+    from .speculative import SpeculativeProposer, SpeculativeStats
+
 
 class LogitsNormalization(Enum):
     """Supported token selection strategies."""
@@ -82,6 +85,10 @@ class DecodeConfig:
     # Use `top_p` sampling strategy in decode loop
     top_p: int | None = None
 
+    # Number of draft tokens verified per speculative decode step. 0 disables
+    # speculative decoding. Only used for greedy decoding of a single beam.
+    speculative_tokens: int = 0
+
     def update_from_sampling_params(self, sampling_params):
         for field in fields(sampling_params):
             if getattr(sampling_params, field.name) == NOT_PROVIDED:
@@ -102,3 +109,13 @@ class TokenSelectionStrategyConfig:
     decode_begin_callback: Callable[[int], None]
     decode_end_callback: Callable[[int], None]
     results_callback: Callable[[Union[int, List[int]]], None]
+    # Callback receiving each token as it is generated, for streaming
+    stream_callback: Optional[Callable[[int], None]] = None
+    # Callbacks to reserve and release prefill batcher slots, used for the
+    # multi-token verification steps of speculative decoding
+    prefill_begin_callback: Optional[Callable[[int], None]] = None
+    prefill_end_callback: Optional[Callable[[int], None]] = None
+    # Source of draft tokens. If set, decode is speculative.
+    speculative_proposer: Optional["SpeculativeProposer"] = None
+    # Acceptance metrics updated by speculative decode
+    speculative_stats: Optional["SpeculativeStats"] = None
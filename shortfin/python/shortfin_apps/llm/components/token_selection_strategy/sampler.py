@@ -8,13 +8,17 @@ import logging
 import numpy as np
 
 from dataclasses import dataclass
-from typing import Tuple, Union
+from typing import Optional, Tuple, Union
 
 import shortfin.array as sfnp
 
+from .config import LogitsNormalization
+
 
 logger = logging.getLogger(__name__)
 
+TOP_P_DEFAULT_SELECTION = 32
+
 
 @dataclass
 class Sampler:
@@ -95,3 +99,80 @@ class Sampler:
         """
         token = np.argmax(logits).item()
         return token
+
+    def sample_batch(
+        self,
+        logits: np.ndarray,
+        indices: Optional[np.ndarray],
+        temperature: np.ndarray,
+        top_k: np.ndarray,
+        top_p: np.ndarray,
+        logits_normalization: LogitsNormalization = LogitsNormalization.NONE,
+    ) -> np.ndarray:
+        """Select one token per row of a batch of logits in a single pass.
+
+        Rows with neither `top_k` nor `top_p` set are selected greedily. The
+        others are sampled from their `top_k` candidates (or the top
+        `TOP_P_DEFAULT_SELECTION` when only `top_p` is set), after applying
+        the row's temperature and restricting to its `top_p` nucleus.
+
+        Args:
+            logits (np.ndarray): Logits of shape `[bs, n]`.
+            indices (np.ndarray | None): Token ids of shape `[bs, n]` if the
+                model already selected the top `n` tokens.
+            temperature (np.ndarray): Per-row temperature of shape `[bs]`.
+            top_k (np.ndarray): Per-row `top_k`, `0` if unset.
+            top_p (np.ndarray): Per-row `top_p`, `1.0` if unset.
+            logits_normalization (LogitsNormalization): Normalization of `logits`.
+
+        Returns:
+            np.ndarray: Selected token for each row, of shape `[bs]`.
+        """
+        bs, n = logits.shape
+        logits = logits.astype(np.float32, copy=False)
+        rows = np.arange(bs)
+
+        # Greedy rows only need the maximum.
+        best = np.argmax(logits, axis=-1)
+        tokens = indices[rows, best] if indices is not None else best
+
+        sampled = (top_k > 0) | (top_p < 1.0)
+        if not sampled.any():
+            return tokens
+
+        rows = rows[sampled]
+        logits = logits[sampled]
+        k = np.where(top_k[sampled] > 0, top_k[sampled], TOP_P_DEFAULT_SELECTION)
+        k = np.minimum(k, n)
+        max_k = int(k.max())
+
+        # Gather the `max_k` best candidates of every row, sorted descending.
+        if max_k < n:
+            candidates = np.argpartition(-logits, max_k - 1, axis=-1)[:, :max_k]
+        else:
+            candidates = np.broadcast_to(np.arange(n), logits.shape)
+        values = np.take_along_axis(logits, candidates, axis=-1)
+        order = np.argsort(-values, axis=-1, kind="stable")
+        candidates = np.take_along_axis(candidates, order, axis=-1)
+        values = np.take_along_axis(values, order, axis=-1)
+
+        if logits_normalization == LogitsNormalization.SOFTMAX:
+            with np.errstate(divide="ignore"):
+                values = np.log(values)
+        values = values / temperature[sampled, None]
+        values[np.arange(max_k)[None, :] >= k[:, None]] = -np.inf
+
+        probs = np.exp(values - values[:, :1])
+        probs /= probs.sum(axis=-1, keepdims=True)
+
+        # Keep the smallest prefix whose cumulative probability reaches `top_p`.
+        cum = np.cumsum(probs, axis=-1)
+        probs[(cum - probs) >= top_p[sampled, None]] = 0.0
+        cum = np.cumsum(probs, axis=-1)
+
+        u = np.random.random(len(rows)) * cum[:, -1]
+        choice = np.minimum((cum < u[:, None]).sum(axis=-1), max_k - 1)
+        choice = candidates[np.arange(len(rows)), choice]
+        tokens[rows] = indices[rows, choice] if indices is not None else choice
+
+        return tokens
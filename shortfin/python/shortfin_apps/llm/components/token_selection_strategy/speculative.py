@@ -0,0 +1,277 @@
+# Copyright 2025 Advanced Micro Devices, Inc.
+#
+# Licensed under the Apache License v2.0 with LLVM Exceptions.
+# See https://llvm.org/LICENSE.txt for license information.
+# SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
+
+"""Speculative decoding.
+
+A proposer guesses the next few tokens of a sequence cheaply, either with a
+smaller draft model or by looking up earlier occurrences of the sequence's
+last tokens. The target model
+then verifies all of them in a single multi-token invocation, a prefill chunk
+starting at the sequence's decode position that returns the logits of every
+position. Drafts are accepted while they match the target's greedy choice,
+and the target's own token at the first mismatch is appended as well, so every
+verification produces at least one token.
+"""
+
+import logging
+import threading
+from abc import ABC, abstractmethod
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from .config import DecodeConfig
+from ..messages import LlmInferenceExecRequest, InferencePhase
+
+logger = logging.getLogger(__name__)
+
+
+def supports_speculation(decode_config: DecodeConfig) -> bool:
+    """Whether `decode_config` asks for speculative decoding it is valid for.
+
+    Verification compares drafts against the target's greedy choice, so only
+    greedy decoding of a single sequence can be sped up without changing its
+    output.
+    """
+    return (
+        decode_config.speculative_tokens > 0
+        and decode_config.num_beams == 1
+        and not decode_config.use_beam_search
+        and decode_config.top_k is None
+        and decode_config.top_p is None
+    )
+
+
+def greedy_tokens(exec_req: LlmInferenceExecRequest) -> List[int]:
+    """Greedy choice at each position returned for `exec_req`.
+
+    Args:
+        exec_req (LlmInferenceExecRequest): Request with host result logits,
+            and indices if the model was exported with `top_k`.
+
+    Returns:
+        List[int]: One token per returned position.
+    """
+    logits = np.array(exec_req.result_logits)
+    logits = logits.reshape(-1, logits.shape[-1])
+    choices = np.argmax(logits, axis=-1)
+    if exec_req.result_indices is not None:
+        indices = np.array(exec_req.result_indices).reshape(logits.shape)
+        choices = indices[np.arange(len(choices)), choices]
+    return [int(token) for token in choices]
+
+
+def accept_draft_tokens(drafts: List[int], targets: List[int]) -> List[int]:
+    """Tokens produced by a verification step.
+
+    Args:
+        drafts (List[int]): Proposed tokens.
+        targets (List[int]): Target's greedy choice after the last verified
+            token and after each draft, `len(drafts) + 1` tokens.
+
+    Returns:
+        List[int]: The longest matching prefix of `drafts`, followed by the
+            target's choice at the first mismatch, or after the last draft.
+    """
+    accepted = []
+    for draft, target in zip(drafts, targets):
+        if draft != target:
+            break
+        accepted.append(draft)
+    accepted.append(targets[len(accepted)])
+    return accepted
+
+
+class SpeculativeStats:
+    """Acceptance metrics of speculative decoding, shared by all requests."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.steps = 0
+        self.proposed_tokens = 0
+        self.accepted_tokens = 0
+
+    def record(self, proposed: int, accepted: int):
+        with self._lock:
+            self.steps += 1
+            self.proposed_tokens += proposed
+            self.accepted_tokens += accepted
+
+    @property
+    def acceptance_rate(self) -> float:
+        """Fraction of proposed tokens that were accepted."""
+        if self.proposed_tokens == 0:
+            return 0.0
+        return self.accepted_tokens / self.proposed_tokens
+
+    @property
+    def tokens_per_step(self) -> float:
+        """Average number of tokens produced by a verification step."""
+        if self.steps == 0:
+            return 0.0
+        return (self.accepted_tokens + self.steps) / self.steps
+
+    def __repr__(self):
+        return (
+            f"SpeculativeStats(steps={self.steps}, "
+            f"proposed_tokens={self.proposed_tokens}, "
+            f"accepted_tokens={self.accepted_tokens}, "
+            f"acceptance_rate={self.acceptance_rate:.3f})"
+        )
+
+
+class SpeculativeProposer(ABC):
+    """Proposes draft tokens for one sequence."""
+
+    @abstractmethod
+    async def propose(self, tokens: List[int], count: int) -> List[int]:
+        """Propose up to `count` tokens following `tokens`.
+
+        `tokens` holds every token of the sequence so far. Between calls it
+        only grows by the tokens accepted from the previous proposal and the
+        token the target chose after them.
+
+        Args:
+            tokens (List[int]): Tokens of the sequence so far.
+            count (int): Maximum number of tokens to propose.
+
+        Returns:
+            List[int]: Proposed tokens, possibly none.
+        """
+
+    def release(self):
+        """Release any resources held for the sequence."""
+
+
+class DraftModelProposer(SpeculativeProposer):
+    """Proposes the greedy continuation of a smaller draft model.
+
+    The draft model is served by its own batchers and KV cache. Its sequence is
+    prefilled on the first proposal and then decoded one token at a time. KV
+    cache entries of proposals that were rejected are rolled back, and tokens
+    the target chose instead are fed to the draft before it proposes again.
+    """
+
+    def __init__(self, *, prefill_batcher, decode_batcher, page_cache):
+        self._prefill_batcher = prefill_batcher
+        self._decode_batcher = decode_batcher
+        self._page_cache = page_cache
+        self._exec_req: LlmInferenceExecRequest | None = None
+        # Number of leading tokens of the draft's sequence with KV cache entries.
+        self._written = 0
+
+    async def _run(self, submit, exec_req: LlmInferenceExecRequest) -> int:
+        submit(exec_req)
+        await exec_req.done
+        if exec_req.result_logits is None:
+            raise RuntimeError("Draft model invocation failed")
+        return greedy_tokens(exec_req)[-1]
+
+    async def _prefill(self, tokens: List[int]) -> int:
+        exec_req = LlmInferenceExecRequest(
+            phase=InferencePhase.PREFILL, input_token_ids=list(tokens)
+        )
+        exec_req._cache = self._page_cache
+        self._exec_req = exec_req
+        self._decode_batcher.reserve_workitem(rid=exec_req.orig_instance_id, count=1)
+        token = await self._run(self._prefill_batcher.submit, exec_req)
+        self._written = len(tokens)
+        return token
+
+    async def _decode(self, tokens: List[int], verified: int) -> int:
+        """Write the KV cache entry of the last of `tokens` and return the next.
+
+        Only the first `verified` tokens are published to the draft's cache,
+        the rest may still be rolled back.
+        """
+        exec_req = self._exec_req
+        exec_req.reset(InferencePhase.DECODE)
+        exec_req.input_token_ids = list(tokens)
+        exec_req.start_position = len(tokens) - 1
+        exec_req.draft_token_count = max(0, len(tokens) - verified)
+        token = await self._run(self._decode_batcher.submit, exec_req)
+        self._written = len(tokens)
+        return token
+
+    async def propose(self, tokens: List[int], count: int) -> List[int]:
+        if count <= 0:
+            return []
+
+        exec_req = self._exec_req
+        if exec_req is None:
+            proposal = await self._prefill(tokens)
+        else:
+            # Written entries are still valid as far as the draft's sequence
+            # agrees with `tokens`. The last token is always fed to the draft
+            # again, its output is the first proposal.
+            previous = exec_req.input_token_ids[: self._written]
+            valid = 0
+            while valid < len(previous) and previous[valid] == tokens[valid]:
+                valid += 1
+            valid = min(valid, len(tokens) - 1)
+            exec_req.allocation.truncate(valid)
+            for position in range(valid, len(tokens)):
+                proposal = await self._decode(tokens[: position + 1], len(tokens))
+
+        proposals = [proposal]
+        while len(proposals) < count:
+            proposals.append(await self._decode(tokens + proposals, len(tokens)))
+        return proposals
+
+    def release(self):
+        exec_req = self._exec_req
+        if exec_req is None:
+            return
+        self._decode_batcher.complete_workitem(rid=exec_req.orig_instance_id, count=1)
+        exec_req.free_cache_pages()
+        self._exec_req = None
+
+
+class PromptLookupProposer(SpeculativeProposer):
+    """Proposes the continuation of an earlier occurrence of the last n-gram.
+
+    Outputs that copy spans of their prompt, such as summaries and code edits,
+    are proposed without a draft model. Every n-gram of the sequence is
+    indexed in a hash map from its tokens to the position following its most
+    recent occurrence, so a lookup costs one probe per n-gram size. The
+    longest n-gram with an earlier occurrence wins.
+    """
+
+    def __init__(self, *, max_ngram: int = 3, min_ngram: int = 1):
+        if not 0 < min_ngram <= max_ngram:
+            raise ValueError(
+                f"Invalid n-gram sizes: min_ngram={min_ngram}, max_ngram={max_ngram}"
+            )
+        self._max_ngram = max_ngram
+        self._min_ngram = min_ngram
+        self._index: Dict[Tuple[int, ...], int] = {}
+        # Number of leading positions of the sequence whose n-grams are indexed.
+        self._indexed = 0
+
+    def _extend_index(self, tokens: List[int]):
+        # Only n-grams followed by at least one token can be continued, the
+        # sequence's own last n-grams are indexed on the next call.
+        for end in range(max(self._indexed, self._min_ngram), len(tokens)):
+            for n in range(self._min_ngram, min(self._max_ngram, end) + 1):
+                self._index[tuple(tokens[end - n : end])] = end
+        self._indexed = len(tokens)
+
+    async def propose(self, tokens: List[int], count: int) -> List[int]:
+        if count <= 0:
+            return []
+        if len(tokens) < self._indexed:
+            self.release()
+        self._extend_index(tokens)
+
+        for n in range(min(self._max_ngram, len(tokens)), self._min_ngram - 1, -1):
+            start = self._index.get(tuple(tokens[-n:]))
+            if start is not None:
+                return tokens[start : start + count]
+        return []
+
+    def release(self):
+        self._index.clear()
+        self._indexed = 0
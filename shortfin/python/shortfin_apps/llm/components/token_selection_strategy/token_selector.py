@@ -14,6 +14,7 @@ from .beam_group import BeamGroup
 from .base_token_selection_strategy import (
     BaseTokenSelectionStrategy,
 )
+from .speculative import accept_draft_tokens, greedy_tokens
 
 from ..messages import LlmInferenceExecRequest, InferencePhase
 
@@ -37,6 +38,9 @@ class TokenSelector(BaseTokenSelectionStrategy):
         self._log_sampling_method()
 
         config = self.token_selection_strategy_config
+        if config.speculative_proposer is not None:
+            await self._speculative_decode(exec_req)
+            return
 
         exec_req.reset(InferencePhase.DECODE)
 
@@ -69,11 +73,19 @@ class TokenSelector(BaseTokenSelectionStrategy):
             for beam in beam_group.active_beams:
                 req = beam.exec_req
                 req.reset(InferencePhase.DECODE)
+                if not config.decode_config.use_beam_search:
+                    # Independent beams are sampled on the whole decode batch.
+                    req.decode_config = config.decode_config
                 config.decode_callback(req)
 
+            beams = beam_group.active_beams
             await beam_group.wait()
             beam_group.process_beams()
 
+            if config.stream_callback is not None:
+                for beam in beams:
+                    config.stream_callback(beam.last_token)
+
             if not beam_group.active_beams:
                 break
 
@@ -82,3 +94,122 @@ class TokenSelector(BaseTokenSelectionStrategy):
 
         results = beam_group.get_results()
         config.results_callback(results)
+
+    async def _verify(
+        self, exec_req: LlmInferenceExecRequest, drafts: List[int]
+    ) -> List[int]:
+        """Run the target on the last verified token and `drafts` at once.
+
+        Returns:
+            List[int]: The target's greedy choice after each of them.
+        """
+        config = self.token_selection_strategy_config
+        rid = exec_req.orig_instance_id
+        tokens = exec_req.input_token_ids
+        exec_req.reset(InferencePhase.PREFILL)
+        exec_req.input_token_ids = tokens + drafts
+        exec_req.draft_token_count = len(drafts)
+        exec_req.return_all_logits = True
+        if config.prefill_begin_callback is not None:
+            config.prefill_begin_callback(rid=rid, count=1)
+        try:
+            config.prefill_callback(exec_req)
+            await exec_req.done
+        finally:
+            if config.prefill_end_callback is not None:
+                config.prefill_end_callback(rid=rid, count=1)
+
+        exec_req.input_token_ids = tokens
+        exec_req.draft_token_count = 0
+        assert (
+            exec_req.result_logits is not None
+        ), f"{exec_req.instance_id}'s result_logits are None during verification."
+        return greedy_tokens(exec_req)
+
+    async def _decode_step(self, exec_req: LlmInferenceExecRequest) -> List[int]:
+        """Run a regular decode step on the last verified token.
+
+        Returns:
+            List[int]: The target's greedy choice after it.
+        """
+        config = self.token_selection_strategy_config
+        rid = exec_req.orig_instance_id
+        exec_req.reset(InferencePhase.DECODE)
+        config.decode_begin_callback(rid=rid, count=1)
+        try:
+            config.decode_callback(exec_req)
+            await exec_req.done
+        finally:
+            config.decode_end_callback(rid=rid, count=1)
+
+        assert (
+            exec_req.result_logits is not None
+        ), f"{exec_req.instance_id}'s result_logits are None during decode."
+        return greedy_tokens(exec_req)[-1:]
+
+    async def _speculative_decode(self, exec_req: LlmInferenceExecRequest):
+        """Decode loop verifying proposed tokens with one invocation per step.
+
+        Each step is a prefill chunk starting at the decode position, which
+        requires a model exported with `has_prefill_position`. Rejected
+        drafts are rolled back from the request's page allocation. Steps the
+        proposer has no drafts for are batched with regular decode requests.
+
+        Batcher slots are reserved for a single step at a time. A workgroup
+        is only scheduled once all of its reserved members are pending, so
+        holding slots of the batcher the request is not currently waiting on
+        would stall every other request of that workgroup.
+
+        Args:
+            exec_req (LlmInferenceExecRequest): Initial inference request, post prefill.
+        """
+        config = self.token_selection_strategy_config
+        decode_config = config.decode_config
+        proposer = config.speculative_proposer
+        stats = config.speculative_stats
+        rid = exec_req.orig_instance_id
+        tokens = exec_req.input_token_ids
+
+        remaining = decode_config.max_completion_tokens
+        proposed = accepted = 0
+        try:
+            while remaining > 0 and not self.cancelled:
+                # The last token of the step is always the target's own.
+                drafts = await proposer.propose(
+                    tokens, min(decode_config.speculative_tokens, remaining - 1)
+                )
+                if drafts:
+                    targets = await self._verify(exec_req, drafts)
+                else:
+                    targets = await self._decode_step(exec_req)
+                new_tokens = accept_draft_tokens(drafts, targets)
+
+                proposed += len(drafts)
+                accepted += len(new_tokens) - 1
+                if stats is not None and drafts:
+                    stats.record(len(drafts), len(new_tokens) - 1)
+
+                exec_req.allocation.truncate(len(tokens) + len(new_tokens) - 1)
+                finished = False
+                for token in new_tokens:
+                    tokens.append(token)
+                    remaining -= 1
+                    if config.stream_callback is not None:
+                        config.stream_callback(token)
+                    if token == decode_config.eos_token_id or remaining == 0:
+                        finished = True
+                        break
+                exec_req.start_position = len(tokens) - 1
+
+                if finished:
+                    break
+        finally:
+            proposer.release()
+
+        logger.debug(
+            "Speculative decode of %s accepted %d of %d proposed tokens",
+            rid,
+            accepted,
+            proposed,
+        )
+        config.results_callback([tokens[exec_req.prompt_length :]])
@@ -90,3 +90,42 @@ class Tokenizer:
         for i, enc in enumerate(encs):
             ary.view(i).items = enc.attention_mask
         return ary
+
+
+class IncrementalDetokenizer:
+    """Detokenizes a growing token sequence, returning only the new text.
+
+    Each step decodes a small window of trailing tokens instead of the whole
+    sequence. The window starts at the tokens already emitted before the last
+    step, so that tokenizers that depend on the previous token (e.g. leading
+    spaces) still decode correctly. Text ending in an incomplete UTF-8
+    sequence is held back until the following token completes it.
+    """
+
+    def __init__(self, tokenizer: Tokenizer):
+        self._tokenizer = tokenizer
+        self._ids: list[int] = []
+        self._prefix_offset = 0
+        self._read_offset = 0
+
+    def _decode(self, ids: list[int]) -> str:
+        return self._tokenizer.decode([ids])[0]
+
+    def add(self, token_ids: list[int]) -> str:
+        """Appends `token_ids` and returns the newly completed text."""
+        self._ids.extend(token_ids)
+        prefix = self._decode(self._ids[self._prefix_offset : self._read_offset])
+        text = self._decode(self._ids[self._prefix_offset :])
+        if len(text) <= len(prefix) or text.endswith("\ufffd"):
+            return ""
+
+        self._prefix_offset = self._read_offset
+        self._read_offset = len(self._ids)
+        return text[len(prefix) :]
+
+    def flush(self) -> str:
+        """Returns any held back text, once the sequence is complete."""
+        prefix = self._decode(self._ids[self._prefix_offset : self._read_offset])
+        text = self._decode(self._ids[self._prefix_offset :])
+        self._prefix_offset = self._read_offset = len(self._ids)
+        return text[len(prefix) :]
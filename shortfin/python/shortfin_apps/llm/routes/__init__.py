@@ -6,5 +6,6 @@
 
 from .application import application_router
 from .generate import generation_router
+from .metrics import metrics_router
 
-__all__ = ["application_router", "generation_router"]
+__all__ = ["application_router", "generation_router", "metrics_router"]
@@ -0,0 +1,19 @@
+# Copyright 2025 Advanced Micro Devices, Inc.
+#
+# Licensed under the Apache License v2.0 with LLVM Exceptions.
+# See https://llvm.org/LICENSE.txt for license information.
+# SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
+
+from fastapi import APIRouter, Request, Response
+
+from ..components.metrics import CONTENT_TYPE
+
+metrics_router = APIRouter()
+
+
+@metrics_router.get("/metrics")
+async def metrics(request: Request) -> Response:
+    # app.state.services is populated by the ShortfinLlmLifecycleManager
+    # see shortfin/python/shortfin_apps/llm/components/lifecycle.py
+    service = request.app.state.services["default"]
+    return Response(content=service.metrics.render(), media_type=CONTENT_TYPE)
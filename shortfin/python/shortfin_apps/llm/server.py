@@ -103,6 +103,83 @@ def add_service_args(parser: argparse.ArgumentParser):
         choices=["none", "trie"],
         help="Algorithm to use for prefix sharing in KV cache",
     )
+    parser.add_argument(
+        "--host_cache_page_count",
+        type=int,
+        default=None,
+        help="Number of KV cache pages evicted from the device to keep in host memory and restore on a prefix match. Requires `--prefix_sharing_algorithm=trie`.",
+    )
+    parser.add_argument(
+        "--prefix_cache_snapshot",
+        type=str,
+        default=None,
+        help="Directory to restore the prefix cache from at startup and to save it to at shutdown. Requires `--prefix_sharing_algorithm=trie`.",
+    )
+    parser.add_argument(
+        "--pinned_prompts",
+        type=str,
+        nargs="*",
+        default=None,
+        help="Prompts to prefill at startup and keep in the prefix cache. Requires `--prefix_sharing_algorithm=trie`.",
+    )
+    parser.add_argument(
+        "--chunk_block_size",
+        type=int,
+        default=None,
+        help="Number of KV cache blocks to prefill per invocation. Longer prompts are prefilled in chunks. Requires a model exported with prefill start positions.",
+    )
+    parser.add_argument(
+        "--mixed_token_budget",
+        type=int,
+        default=None,
+        help="Serve prefill and decode from a single batcher that packs decode steps and prefill chunks into one invocation of at most this many tokens. Requires a model exported with prefill start positions.",
+    )
+    parser.add_argument(
+        "--preemption_mode",
+        type=str,
+        choices=["none", "swap", "recompute"],
+        default=None,
+        help="How to preempt decoding requests when the KV cache runs out of pages. `swap` copies their pages to host memory and is not supported with `--prefix_sharing_algorithm=trie`, `recompute` prefills them again. Defaults to `none`, which does not preempt requests.",
+    )
+    parser.add_argument(
+        "--scheduling_policy",
+        type=str,
+        choices=["default", "priority"],
+        default=None,
+        help="How batchers order pending work. `priority` schedules requests by the priority class, deadline, and tenant of their `scheduling_params`. Defaults to `default`, treating every request equally.",
+    )
+    parser.add_argument(
+        "--admission_timeout_s",
+        type=float,
+        default=None,
+        help="Seconds a request waits for room in the request queue and KV cache before it is rejected with a `Retry-After` hint. Defaults to `30`.",
+    )
+    parser.add_argument(
+        "--draft_model_config",
+        type=Path,
+        default=None,
+        help="Path to the model config file of a draft model for speculative decoding. Requires a target model exported with prefill start positions.",
+    )
+    parser.add_argument(
+        "--draft_vmfb",
+        type=Path,
+        default=None,
+        help="Draft model VMFB to load",
+    )
+    parser.add_argument(
+        "--draft_parameters",
+        type=Path,
+        nargs="*",
+        default=[],
+        help="Parameter archives of the draft model to load (supports: gguf, irpa, safetensors).",
+        metavar="FILE",
+    )
+    parser.add_argument(
+        "--speculative_tokens",
+        type=int,
+        default=0,
+        help="Number of draft tokens to verify per decode step. Drafts come from `--draft_vmfb` if given, and from n-gram lookup in the sequence otherwise. Requests can override it. Defaults to `0`, disabling speculative decoding.",
+    )
     parser.add_argument(
         "--num_beams",
         type=int,
@@ -144,6 +221,8 @@ def run_server(argv, log_config=uvicorn.config.LOGGING_CONFIG, port: int | None
             args.tokenizer_json.stem + "_config.json"
         )
         args.tokenizer_config_json = inferred_tokenizer_config_path
+    if args.draft_vmfb is not None and args.draft_model_config is None:
+        raise ValueError("`--draft_vmfb` requires `--draft_model_config`")
 
     lifecycle_manager = ShortfinLlmLifecycleManager(args)
 
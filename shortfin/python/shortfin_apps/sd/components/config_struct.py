@@ -83,6 +83,28 @@ class ModelParams:
         union = set.union(*[set(list) for list in bs_lists])
         return union
 
+    @property
+    def flight_batch_sizes(self) -> list[int]:
+        """Batch sizes for which the text encoder and all denoise programs are compiled."""
+        submodels = ["clip", "unet", "scheduled_unet", "scheduler"]
+        bs_sets = [
+            set(self.batch_sizes[submodel])
+            for submodel in submodels
+            if submodel in self.batch_sizes
+        ]
+        return sorted(set.intersection(*bs_sets))
+
+    def flight_batch_size(self, rows: int) -> int:
+        """Smallest flight batch size that holds `rows` images.
+
+        Rows beyond the requested ones are padding. If no compiled batch size is
+        large enough, `rows` is returned as is.
+        """
+        for bs in self.flight_batch_sizes:
+            if bs >= rows:
+                return bs
+        return rows
+
     @staticmethod
     def load_json(path):
         with open(path, "rt") as f:
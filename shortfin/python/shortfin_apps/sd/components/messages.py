@@ -64,7 +64,6 @@ class SDXLInferenceExecRequest(InferenceExecRequest):
         image_array: sfnp.device_array | None = None,
     ):
         super().__init__()
-        self.command_buffer = None
         self.print_debug = True
         self.batch_size = 1
         self.phases = {}
@@ -83,6 +82,9 @@ class SDXLInferenceExecRequest(InferenceExecRequest):
         # Encode phase.
         # This is a list of sequenced positive and negative token ids and pooler token ids (tokenizer outputs)
         self.input_ids = input_ids
+        # Host copies of the token ids written to the command buffer for each image,
+        # in the order of input_ids. Set when inputs are written or prompts tokenized.
+        self.token_ids: list[list] | None = None
 
         # Denoise phase.
         self.sample = sample
@@ -103,54 +105,38 @@ class SDXLInferenceExecRequest(InferenceExecRequest):
 
         self.post_init()
 
-    def set_command_buffer(self, cb):
+    def write_inputs(self, cb, offset: int = 0):
+        """Writes the inputs provided with this request to the rows of `cb` starting at `offset`.
+
+        Inputs that are not provided are produced by the PREPARE phase instead.
+        """
+        rows = slice(offset, offset + self.batch_size)
         # Input IDs for CLIP if they are used as inputs instead of prompts.
         if self.input_ids is not None:
             # Take a batch of sets of input ids as ndarrays and fill cb.input_ids
-            host_arrs = [None] * len(cb.input_ids)
             for idx, arr in enumerate(cb.input_ids):
-                host_arrs[idx] = arr.for_transfer()
-                with host_arrs[idx].map(write=True, discard=True) as m:
+                host_arr = arr.for_transfer()
+                for i in range(self.batch_size):
+                    with host_arr.view(offset + i).map(write=True, discard=True) as m:
 
-                    # TODO: fix this attr redundancy
-                    np_arr = self.input_ids[0][idx]
+                        # TODO: fix this attr redundancy
+                        np_arr = self.input_ids[i][idx]
 
-                    m.fill(np_arr)
-                cb.input_ids[idx].copy_from(host_arrs[idx])
+                        m.fill(np_arr)
+                arr.view(rows).copy_from(host_arr.view(rows))
+            self.token_ids = self.input_ids
 
         # Same for noisy latents if they are explicitly provided as a numpy array.
-        if isinstance(self.sample, list):
-            sample_host = cb.sample.for_transfer()
-            for idx, i in enumerate(self.sample):
-                with sample_host.view(idx).map(discard=True) as m:
-                    m.fill(i.tobytes())
-            cb.sample.copy_from(sample_host)
-        elif self.sample is not None:
+        if self.sample is not None:
             sample_host = cb.sample.for_transfer()
-            with sample_host.map(discard=True) as m:
-                m.fill(self.sample.tobytes())
-            cb.sample.copy_from(sample_host)
-
-        # Copy other inference parameters for denoise to device arrays.
-        steps_arr = list(range(0, self.steps))
-        steps_host = cb.steps_arr.for_transfer()
-        steps_host.items = steps_arr
-        cb.steps_arr.copy_from(steps_host)
-
-        num_step_host = cb.num_steps.for_transfer()
-        num_step_host.items = [self.steps]
-        cb.num_steps.copy_from(num_step_host)
-
-        guidance_host = cb.guidance_scale.for_transfer()
-        with guidance_host.map(discard=True) as m:
-            # TODO: do this without numpy
-            np_arr = np.asarray(self.guidance_scale, dtype="float16")
-
-            m.fill(np_arr)
-        cb.guidance_scale.copy_from(guidance_host)
-        cb.images_host.fill(np.array(0, dtype="float16"))
-        self.command_buffer = cb
-        return
+            if isinstance(self.sample, list):
+                for i, sample in enumerate(self.sample):
+                    with sample_host.view(offset + i).map(discard=True) as m:
+                        m.fill(sample.tobytes())
+            else:
+                with sample_host.view(rows).map(discard=True) as m:
+                    m.fill(self.sample.tobytes())
+            cb.sample.view(rows).copy_from(sample_host.view(rows))
 
     def post_init(self):
         """Determines necessary inference phases and tags them with static program parameters."""
@@ -183,7 +169,8 @@ class SDXLInferenceExecRequest(InferenceExecRequest):
                 return required, meta
             case InferencePhase.DENOISE:
                 required = True
-                meta = [self.width, self.height, self.steps]
+                # The denoise programs take a single guidance scale per batch.
+                meta = [self.width, self.height, self.steps, self.guidance_scale]
                 return required, meta
             case InferencePhase.ENCODE:
                 required = True
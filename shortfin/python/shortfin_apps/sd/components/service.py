@@ -19,7 +19,16 @@ import gc
 import shortfin as sf
 import shortfin.array as sfnp
 
-from ...utils import GenerateService, BatcherProcess
+from ...utils import (
+    AdaptiveFlushPolicy,
+    GenerateService,
+    BatcherProcess,
+    DenoiseCohort,
+    DenoiseLoop,
+    EmbeddingCache,
+    embedding_key,
+    host_array_view,
+)
 
 from .config_struct import ModelParams
 from .manager import SDXLSystemManager
@@ -47,6 +56,8 @@ class SDXLGenerateService(GenerateService):
         trace_execution: bool = False,
         use_batcher: bool = True,
         splat: bool = False,
+        batch_latency_budget_ms: float = 50.0,
+        embedding_cache_mb: int = 0,
     ):
         super().__init__(sysman, fibers_per_device, workers_per_device)
         self.name = name
@@ -59,6 +70,14 @@ class SDXLGenerateService(GenerateService):
         self.trace_execution = trace_execution
         self.show_progress = show_progress
         self.splat_weights = splat
+        # Longest time a request waits in the batcher for others to fly with.
+        self.batch_latency_budget_ms = batch_latency_budget_ms
+        # Text embeddings of recent prompts, shared by all devices. 0 disables it.
+        self.embedding_cache = (
+            EmbeddingCache(embedding_cache_mb * 2**20)
+            if embedding_cache_mb > 0
+            else None
+        )
 
         # Finish initialization
         self.set_isolation(prog_isolation)
@@ -143,6 +162,13 @@ class SDXLGenerateService(GenerateService):
             self.inference_parameters[component] = []
         self.inference_parameters[component].append(p)
 
+    def status(self) -> dict:
+        """Returns the counters of the embedding cache, or None if it is disabled."""
+        cache = self.embedding_cache
+        if cache is None:
+            return {"embedding_cache": None}
+        return {"embedding_cache": {**cache.counters(), "hit_rate": cache.hit_rate}}
+
     def start(self):
         # Initialize programs.
         for component in self.inference_modules.keys():
@@ -214,13 +240,16 @@ class SDXLBatcherProcess(BatcherProcess):
     STROBE_LONG_DELAY = 1
 
     def __init__(self, service: SDXLGenerateService):
-        super().__init__(fiber=service.meta_fibers[0].fiber)
+        super().__init__(
+            fiber=service.meta_fibers[0].fiber,
+            flush_policy=AdaptiveFlushPolicy(service.batch_latency_budget_ms / 1000),
+        )
         self.service = service
         self.batcher_infeed = self.system.create_queue()
         self.pending_requests: set[InferenceExecRequest] = set()
         self.strobe_enabled = True
         self.strobes: int = 0
-        self.ideal_batch_size: int = max(service.model_params.batch_sizes["clip"])
+        self.ideal_batch_size: int = max(service.model_params.flight_batch_sizes)
         self.num_fibers = len(service.meta_fibers)
 
     def handle_inference_request(self, request):
@@ -233,38 +262,63 @@ class SDXLBatcherProcess(BatcherProcess):
         waiting_count = len(self.pending_requests)
         if waiting_count == 0:
             return
-        if waiting_count < self.ideal_batch_size and self.strobes < 2:
-            logger.info("Waiting a bit longer to fill flight")
+        delay = self.flush_delay()
+        if delay > 0:
+            logger.debug(f"Waiting {delay * 1000:.2f}ms longer to fill flight")
+            self.schedule_strobe(delay)
             return
         self.strobes = 0
         batches = self.sort_batches()
         for batch in batches.values():
-            # Assign the batch to the next idle fiber.
-            if len(self.service.idle_meta_fibers) == 0:
-                logger.debug("Waiting for an idle fiber...")
-                return
-            meta_fiber = self.service.idle_meta_fibers.pop(0)
-            logger.debug(
-                f"Sending batch to fiber {meta_fiber.idx} (worker {meta_fiber.worker_idx})"
-            )
-            await self.board(batch["reqs"][0], meta_fiber=meta_fiber)
-            if self.service.prog_isolation != sf.ProgramIsolation.PER_FIBER:
-                self.service.idle_meta_fibers.append(meta_fiber)
+            for flight in form_flights(batch["reqs"], self.ideal_batch_size):
+                # Assign the flight to the next idle fiber.
+                if len(self.service.idle_meta_fibers) == 0:
+                    logger.debug("Waiting for an idle fiber...")
+                    return
+                meta_fiber = self.service.idle_meta_fibers.pop(0)
+                logger.debug(
+                    f"Sending flight of {len(flight)} requests to fiber {meta_fiber.idx} (worker {meta_fiber.worker_idx})"
+                )
+                await self.board(flight, meta_fiber=meta_fiber)
+                if self.service.prog_isolation != sf.ProgramIsolation.PER_FIBER:
+                    self.service.idle_meta_fibers.append(meta_fiber)
 
-    async def board(self, request, meta_fiber):
+    async def board(self, requests, meta_fiber):
         exec_process = InferenceExecutorProcess(self.service, meta_fiber)
-        exec_process.exec_request = request
-        self.pending_requests.remove(request)
+        exec_process.exec_requests = requests
+        for request in requests:
+            self.pending_requests.remove(request)
         exec_process.launch()
 
 
+def form_flights(requests, max_rows: int):
+    """Splits requests with matching metadata into flights of at most `max_rows` images.
+
+    A request with more images than `max_rows` is flown on its own.
+    """
+    flights = []
+    rows = 0
+    for request in requests:
+        if flights and rows + request.batch_size <= max_rows:
+            flights[-1].append(request)
+            rows += request.batch_size
+        else:
+            flights.append([request])
+            rows = request.batch_size
+    return flights
+
+
 ########################################################################################
 # Inference Executors
 ########################################################################################
 
 
 class InferenceExecutorProcess(sf.Process):
-    """Executes a stable diffusion inference batch"""
+    """Executes a stable diffusion inference batch
+
+    The images of a flight are laid out as consecutive rows of one command
+    buffer, padded up to its batch size with copies of the last row.
+    """
 
     def __init__(
         self,
@@ -275,128 +329,244 @@ class InferenceExecutorProcess(sf.Process):
         self.service = service
         self.meta_fiber = meta_fiber
         self.worker_index = meta_fiber.worker_idx
-        self.exec_request: SDXLInferenceExecRequest = None
+        self.exec_requests: list[SDXLInferenceExecRequest] = []
+        self.denoise_loop = DenoiseLoop()
+        self.progress: dict[DenoiseCohort, tqdm] = {}
 
-    def assign_command_buffer(self, request: SDXLInferenceExecRequest):
+    def assign_command_buffer(self, requests: list[SDXLInferenceExecRequest]):
+        batch_size = self.service.model_params.flight_batch_size(flight_rows(requests))
         for cb in self.meta_fiber.command_buffers:
-            if cb.batch_size == self.exec_request.batch_size:
-                self.exec_request.set_command_buffer(cb)
+            if cb.batch_size == batch_size:
                 self.meta_fiber.command_buffers.remove(cb)
-                return
-        cb = initialize_command_buffer(
-            self.fiber, self.service.model_params, request.batch_size
-        )
-        self.exec_request.set_command_buffer(cb)
-        return
+                break
+        else:
+            cb = initialize_command_buffer(
+                self.fiber, self.service.model_params, batch_size
+            )
+
+        for request, offset in request_offsets(requests):
+            request.write_inputs(cb, offset)
+
+        # Copy other inference parameters for denoise to device arrays. These are
+        # shared by the flight, as the batcher only flights requests that agree on them.
+        request = requests[0]
+        steps_arr = list(range(0, request.steps))
+        steps_host = cb.steps_arr.for_transfer()
+        steps_host.items = steps_arr
+        cb.steps_arr.copy_from(steps_host)
+
+        num_step_host = cb.num_steps.for_transfer()
+        num_step_host.items = [request.steps]
+        cb.num_steps.copy_from(num_step_host)
+
+        guidance_host = cb.guidance_scale.for_transfer()
+        with guidance_host.map(discard=True) as m:
+            # TODO: do this without numpy
+            np_arr = np.asarray(request.guidance_scale, dtype="float16")
+
+            m.fill(np_arr)
+        cb.guidance_scale.copy_from(guidance_host)
+        return cb
+
+    def pad_inputs(self, cohort: DenoiseCohort):
+        """Fills the padding rows of the command buffer with the last requested row."""
+        cb = cohort.buffers
+        rows = flight_rows(cohort.requests)
+        for row in range(rows, cb.batch_size):
+            for arr in [*cb.input_ids, cb.sample]:
+                arr.view(row).copy_from(arr.view(rows - 1))
 
     @measure(type="exec", task="inference process")
     async def run(self):
-        try:
-            device = self.fiber.device(0)
-            if not self.exec_request.command_buffer:
-                self.assign_command_buffer(self.exec_request)
-                await device
-
-            phases = self.exec_request.phases
-            if phases[InferencePhase.PREPARE]["required"]:
-                await self._prepare(device=device)
-            if phases[InferencePhase.ENCODE]["required"]:
-                await self._encode(device=device)
-            if phases[InferencePhase.DENOISE]["required"]:
-                await self._denoise(device=device)
-            if phases[InferencePhase.DECODE]["required"]:
-                await self._decode(device=device)
-            if phases[InferencePhase.POSTPROCESS]["required"]:
-                await self._postprocess(device=device)
-            self.exec_request.done.set_success()
+        await self.denoise_loop.run(
+            self.exec_requests,
+            self._start_cohort,
+            self._denoise_step,
+            self._finish_cohort,
+            release=self._release_cohort,
+        )
+        if self.service.prog_isolation == sf.ProgramIsolation.PER_FIBER:
+            self.service.idle_meta_fibers.append(self.meta_fiber)
 
+    async def _start_cohort(self, requests: list[SDXLInferenceExecRequest]):
+        device = self.fiber.device(0)
+        cb = self.assign_command_buffer(requests)
+        cohort = DenoiseCohort(requests, requests[0].steps, buffers=cb)
+        try:
+            await device
+            if phase_required(requests, InferencePhase.PREPARE):
+                await self._prepare(device, cohort)
+            self.pad_inputs(cohort)
+            if phase_required(requests, InferencePhase.ENCODE):
+                await self._encode(device, cohort)
+            if phase_required(requests, InferencePhase.DENOISE):
+                await self._initialize_denoise(device, cohort)
+            else:
+                cohort.steps = 0
         except Exception:
-            logger.exception("Fatal error in image generation")
-            # TODO: Cancel and set error correctly
-            self.exec_request.done.set_success()
+            self._release_cohort(cohort)
+            raise
+        return [cohort]
+
+    async def _finish_cohort(self, cohort: DenoiseCohort):
+        device = self.fiber.device(0)
+        if phase_required(cohort.requests, InferencePhase.DECODE):
+            await self._decode(device, cohort)
+        if phase_required(cohort.requests, InferencePhase.POSTPROCESS):
+            await self._postprocess(device, cohort)
+        self.service.batcher.flush_policy.record_flight(
+            len(cohort.requests), time.monotonic() - cohort.started_at
+        )
+        for request in cohort.requests:
+            request.done.set_success()
 
-        self.meta_fiber.command_buffers.append(self.exec_request.command_buffer)
-        self.exec_request.command_buffer = None
-        if self.service.prog_isolation == sf.ProgramIsolation.PER_FIBER:
-            self.service.idle_meta_fibers.append(self.meta_fiber)
+    def _release_cohort(self, cohort: DenoiseCohort):
+        if cohort in self.progress:
+            self.progress.pop(cohort).close()
+        self.meta_fiber.command_buffers.append(cohort.buffers)
 
-    async def _prepare(self, device):
+    async def _prepare(self, device, cohort: DenoiseCohort):
         # Tokenize prompts and negative prompts. We tokenize in bs1 for now and join later.
-        # Tokenize the prompts if the request does not hold input_ids.
-        batch_ids_lists = []
-        cb = self.exec_request.command_buffer
-        if isinstance(self.exec_request.prompt, str):
-            self.exec_request.prompt = [self.exec_request.prompt]
-        if isinstance(self.exec_request.neg_prompt, str):
-            self.exec_request.neg_prompt = [self.exec_request.neg_prompt]
-        for i in range(self.exec_request.batch_size):
-            input_ids_list = []
-            neg_ids_list = []
-            for tokenizer in self.service.tokenizers:
-                input_ids = tokenizer.encode(self.exec_request.prompt[i]).input_ids
-                input_ids_list.append(input_ids)
-                neg_ids = tokenizer.encode(self.exec_request.neg_prompt[i]).input_ids
-                neg_ids_list.append(neg_ids)
-            ids_list = [*input_ids_list, *neg_ids_list]
-            batch_ids_lists.append(ids_list)
-
-        # Prepare tokenized input ids for CLIP inference
-        host_arrs = [None] * len(cb.input_ids)
-        for idx, arr in enumerate(cb.input_ids):
-            host_arrs[idx] = arr.for_transfer()
-            for i in range(self.exec_request.batch_size):
-                with host_arrs[idx].view(i).map(write=True, discard=True) as m:
-
-                    # TODO: fix this attr redundancy
-                    np_arr = batch_ids_lists[i][idx]
-
-                    m.fill(np_arr)
-            cb.input_ids[idx].copy_from(host_arrs[idx])
-
-        # Generate random sample latents.
-        seed = self.exec_request.seed
-
-        # Create and populate sample device array.
-        generator = sfnp.RandomGenerator(seed)
-
+        # Only requests that do not hold input_ids or sample latents are prepared here.
+        cb = cohort.buffers
+        host_arrs = [arr.for_transfer() for arr in cb.input_ids]
         sample_host = cb.sample.for_transfer()
-        with sample_host.map(discard=True) as m:
-            m.fill(bytes(1))
-
-        sfnp.fill_randn(sample_host, generator=generator)
-
-        cb.sample.copy_from(sample_host)
+        for request, offset in request_offsets(cohort.requests):
+            rows = slice(offset, offset + request.batch_size)
+            if request.input_ids is None:
+                if isinstance(request.prompt, str):
+                    request.prompt = [request.prompt]
+                if isinstance(request.neg_prompt, str):
+                    request.neg_prompt = [request.neg_prompt]
+                request.token_ids = []
+                for i in range(request.batch_size):
+                    input_ids_list = []
+                    neg_ids_list = []
+                    for tokenizer in self.service.tokenizers:
+                        input_ids = tokenizer.encode(request.prompt[i]).input_ids
+                        input_ids_list.append(input_ids)
+                        neg_ids = tokenizer.encode(request.neg_prompt[i]).input_ids
+                        neg_ids_list.append(neg_ids)
+                    ids_list = [*input_ids_list, *neg_ids_list]
+                    request.token_ids.append(ids_list)
+
+                    # Prepare tokenized input ids for CLIP inference
+                    for idx, host_arr in enumerate(host_arrs):
+                        with host_arr.view(offset + i).map(
+                            write=True, discard=True
+                        ) as m:
+                            m.fill(ids_list[idx])
+                for idx, arr in enumerate(cb.input_ids):
+                    arr.view(rows).copy_from(host_arrs[idx].view(rows))
+
+            if request.sample is None:
+                # Generate random sample latents.
+                generator = sfnp.RandomGenerator(request.seed)
+
+                # Create and populate sample device array.
+                request_host = sample_host.view(rows)
+                with request_host.map(discard=True) as m:
+                    m.fill(bytes(1))
+
+                sfnp.fill_randn(request_host, generator=generator)
+                cb.sample.view(rows).copy_from(request_host)
         return
 
-    async def _encode(self, device):
-        req_bs = self.exec_request.batch_size
+    async def _encode(self, device, cohort: DenoiseCohort):
+        cb = cohort.buffers
+        cache = self.service.embedding_cache
+        if cache is None:
+            cb.prompt_embeds, cb.text_embeds = await self._invoke_encode(cb.input_ids)
+            return
+
+        # Key the embeddings of each prompt by the host token ids of its rows, with
+        # padding rows repeating the last requested row. Embedding rows hold the
+        # negative prompts of all images, followed by their prompts.
+        bs = cb.batch_size
+        ids = [
+            [np.ravel(part).tolist() for part in image_ids]
+            for request in cohort.requests
+            for image_ids in request.token_ids
+        ]
+        ids += [ids[-1]] * (bs - len(ids))
+        keys = [embedding_key(device, *image_ids[2:]) for image_ids in ids]
+        keys += [embedding_key(device, *image_ids[:2]) for image_ids in ids]
+        cached = {key: cache.lookup(key) for key in dict.fromkeys(keys)}
+        spliced = True
+
+        # Encode each distinct pair of prompts with a missing embedding once, in
+        # the smallest compiled batch that holds them.
+        missing = {}
+        for row in range(bs):
+            if cached[keys[row]] is None or cached[keys[bs + row]] is None:
+                missing.setdefault((keys[row], keys[bs + row]), row)
+        if missing:
+            rows = list(missing.values())
+            encode_bs = min(
+                b
+                for b in self.service.inference_functions[self.worker_index]["encode"]
+                if b >= len(rows)
+            )
+            if encode_bs == bs:
+                rows = list(range(bs))
+                input_ids = cb.input_ids
+            else:
+                input_ids = []
+                for arr in cb.input_ids:
+                    gathered = sfnp.device_array.for_device(
+                        device, [encode_bs, *arr.shape[1:]], arr.dtype
+                    )
+                    for idx in range(encode_bs):
+                        gathered.view(idx).copy_from(
+                            arr.view(rows[min(idx, len(rows) - 1)])
+                        )
+                    input_ids.append(gathered)
+            prompt_embeds, text_embeds = await self._invoke_encode(input_ids)
+            entries = {}
+            for idx, row in enumerate(rows):
+                for out_row, key in [
+                    (idx, keys[row]),
+                    (encode_bs + idx, keys[bs + row]),
+                ]:
+                    if cached[key] is None and key not in entries:
+                        entries[key] = [
+                            prompt_embeds.view(out_row),
+                            text_embeds.view(out_row),
+                        ]
+            cached.update(await cache.insert(device, entries))
+            if encode_bs == bs:
+                cb.prompt_embeds, cb.text_embeds = prompt_embeds, text_embeds
+                spliced = False
+
+        if spliced:
+            # Splice the cached embeddings into the batch.
+            for row, key in enumerate(keys):
+                cached_prompt_embeds, cached_text_embeds = cached[key]
+                cb.prompt_embeds.view(row).copy_from(cached_prompt_embeds)
+                cb.text_embeds.view(row).copy_from(cached_text_embeds)
+
+    async def _invoke_encode(self, input_ids: list[sfnp.device_array]):
+        bs = input_ids[0].shape[0]
         entrypoints = self.service.inference_functions[self.worker_index]["encode"]
-        assert req_bs in list(entrypoints.keys())
-        for bs, fns in entrypoints.items():
-            if bs == req_bs:
-                break
-        cb = self.exec_request.command_buffer
+        assert bs in list(entrypoints.keys())
+        fns = entrypoints[bs]
         # Encode tokenized inputs.
         logger.debug(
             "INVOKE %r: %s",
             fns["encode_prompts"],
-            "".join([f"\n  {i}: {ary.shape}" for i, ary in enumerate(cb.input_ids)]),
+            "".join([f"\n  {i}: {ary.shape}" for i, ary in enumerate(input_ids)]),
         )
-        cb.prompt_embeds, cb.text_embeds = await fns["encode_prompts"](
-            *cb.input_ids, fiber=self.fiber
-        )
-        return
+        return await fns["encode_prompts"](*input_ids, fiber=self.fiber)
 
-    async def _denoise(self, device):
-        req_bs = self.exec_request.batch_size
+    async def _initialize_denoise(self, device, cohort: DenoiseCohort):
+        cb = cohort.buffers
+        req_bs = cb.batch_size
         entrypoints = self.service.inference_functions[self.worker_index]["denoise"]
         assert req_bs in list(entrypoints.keys())
         for bs, fns in entrypoints.items():
             if bs == req_bs:
                 break
 
-        cb = self.exec_request.command_buffer
-
         logger.debug(
             "INVOKE %r",
             fns["run_initialize"],
@@ -404,74 +574,80 @@ class InferenceExecutorProcess(sf.Process):
         (cb.latents, cb.time_ids, cb.timesteps, cb.sigmas,) = await fns[
             "run_initialize"
         ](cb.sample, cb.num_steps, fiber=self.fiber)
-
-        for i, t in tqdm(
-            enumerate(range(self.exec_request.steps)),
+        self.progress[cohort] = tqdm(
+            total=cohort.steps,
             disable=(not self.service.show_progress),
             desc=f"DENOISE (bs{req_bs})",
-        ):
-            start = time.time()
-            step = cb.steps_arr.view(i)
-            if self.service.model_params.use_scheduled_unet:
-                logger.debug(
-                    "INVOKE %r",
-                    fns["run_forward"],
-                )
-                (cb.latents,) = await fns["run_forward"](
-                    cb.latents,
-                    cb.prompt_embeds,
-                    cb.text_embeds,
-                    cb.time_ids,
-                    cb.guidance_scale,
-                    step,
-                    cb.timesteps,
-                    cb.sigmas,
-                    fiber=self.fiber,
-                )
-            else:
-                logger.debug(
-                    "INVOKE %r",
-                    fns["run_scale"],
-                )
-                (cb.latent_model_input, cb.t, cb.sigma, cb.next_sigma,) = await fns[
-                    "run_scale"
-                ](cb.latents, step, cb.timesteps, cb.sigmas, fiber=self.fiber)
-                logger.debug(
-                    "INVOKE %r",
-                    fns["main"],
-                )
-                (cb.noise_pred,) = await fns["main"](
-                    cb.latent_model_input,
-                    cb.t,
-                    cb.prompt_embeds,
-                    cb.text_embeds,
-                    cb.time_ids,
-                    cb.guidance_scale,
-                    fiber=self.fiber,
-                )
-                logger.debug(
-                    "INVOKE %r",
-                    fns["run_step"],
-                )
-                (cb.latents,) = await fns["run_step"](
-                    cb.noise_pred, cb.latents, cb.sigma, cb.next_sigma, fiber=self.fiber
-                )
+        )
         return
 
-    async def _decode(self, device):
-        req_bs = self.exec_request.batch_size
+    async def _denoise_step(self, cohort: DenoiseCohort):
+        cb = cohort.buffers
+        entrypoints = self.service.inference_functions[self.worker_index]["denoise"]
+        fns = entrypoints[cb.batch_size]
+
+        step = cb.steps_arr.view(cohort.step)
+        if self.service.model_params.use_scheduled_unet:
+            logger.debug(
+                "INVOKE %r",
+                fns["run_forward"],
+            )
+            (cb.latents,) = await fns["run_forward"](
+                cb.latents,
+                cb.prompt_embeds,
+                cb.text_embeds,
+                cb.time_ids,
+                cb.guidance_scale,
+                step,
+                cb.timesteps,
+                cb.sigmas,
+                fiber=self.fiber,
+            )
+        else:
+            logger.debug(
+                "INVOKE %r",
+                fns["run_scale"],
+            )
+            (cb.latent_model_input, cb.t, cb.sigma, cb.next_sigma,) = await fns[
+                "run_scale"
+            ](cb.latents, step, cb.timesteps, cb.sigmas, fiber=self.fiber)
+            logger.debug(
+                "INVOKE %r",
+                fns["main"],
+            )
+            (cb.noise_pred,) = await fns["main"](
+                cb.latent_model_input,
+                cb.t,
+                cb.prompt_embeds,
+                cb.text_embeds,
+                cb.time_ids,
+                cb.guidance_scale,
+                fiber=self.fiber,
+            )
+            logger.debug(
+                "INVOKE %r",
+                fns["run_step"],
+            )
+            (cb.latents,) = await fns["run_step"](
+                cb.noise_pred, cb.latents, cb.sigma, cb.next_sigma, fiber=self.fiber
+            )
+        self.progress[cohort].update()
+        return
+
+    async def _decode(self, device, cohort: DenoiseCohort):
+        cb = cohort.buffers
+        req_bs = cb.batch_size
         prog_bs = req_bs
-        cb = self.exec_request.command_buffer
         # Decode latents to images
         entrypoints = self.service.inference_functions[self.worker_index]["decode"]
         if req_bs not in list(entrypoints.keys()):
             prog_bs = 1
-        for bs, fns in entrypoints.items():
-            if bs == prog_bs:
-                break
+        if prog_bs not in list(entrypoints.keys()):
             raise RuntimeError(f"Decode program batch size {prog_bs} not found.")
+        fns = entrypoints[prog_bs]
         if req_bs != prog_bs:
-            for i in range(req_bs):
+            # Padding rows are not decoded.
+            for i in range(flight_rows(cohort.requests)):
                 # Decode the denoised latents.
                 logger.debug(
                     "INVOKE %r: %s",
@@ -490,48 +666,43 @@ class InferenceExecutorProcess(sf.Process):
             (cb.images,) = await fns["decode"](cb.latents, fiber=self.fiber)
         cb.images_host.copy_from(cb.images)
 
-        # Wait for the device-to-host transfer, so that we can read the
-        # data with .items.
-        if self.service.splat_weights:
-            await device
-        else:
-            check_host_array(cb.images_host)
-
-        image_array = cb.images_host.items
-        dtype = image_array.typecode
-        if cb.images_host.dtype == sfnp.float16:
-            dtype = np.float16
-        self.exec_request.image_array = np.frombuffer(image_array, dtype=dtype).reshape(
-            self.exec_request.batch_size,
-            3,
-            self.exec_request.height,
-            self.exec_request.width,
-        )
+        # Wait for the device-to-host transfer and read the images in place.
+        image_array = await host_array_view(device, cb.images_host)
+        # Scatter the images back to their requests.
+        for request, offset in request_offsets(cohort.requests):
+            request.image_array = image_array[offset : offset + request.batch_size]
+            if not request.phases[InferencePhase.POSTPROCESS]["required"]:
+                # The images are returned as is, and must outlive the command
+                # buffer they were decoded into.
+                request.image_array = request.image_array.copy()
         return
 
-    async def _postprocess(self, device):
+    async def _postprocess(self, device, cohort: DenoiseCohort):
         # Process output images
         # TODO: reimpl with sfnp
-        permuted = np.transpose(self.exec_request.image_array, (0, 2, 3, 1))[0]
-        cast_image = (permuted * 255).round().astype("uint8")
-        processed_image = Image.fromarray(cast_image)
-        self.exec_request.response_image = processed_image
+        for request in cohort.requests:
+            permuted = np.transpose(request.image_array, (0, 2, 3, 1))[0]
+            cast_image = (permuted * 255).round().astype("uint8")
+            processed_image = Image.fromarray(cast_image)
+            request.response_image = processed_image
         return
 
 
-def check_host_array(host_array):
-    waiting = True
-    while waiting:
-        array = host_array.items
-        if host_array.dtype == sfnp.float16:
-            dtype = np.float16
-        arr = np.frombuffer(array, dtype=dtype)
-        if not np.all(arr == 0):
-            check_1 = arr
-            check_2 = np.frombuffer(array, dtype=dtype)
-            if np.array_equal(check_1, check_2):
-                break
-    return
+def flight_rows(requests) -> int:
+    """Number of images requested by a flight."""
+    return sum(request.batch_size for request in requests)
+
+
+def request_offsets(requests):
+    """Yields each request of a flight with the row of its first image."""
+    offset = 0
+    for request in requests:
+        yield request, offset
+        offset += request.batch_size
+
+
+def phase_required(requests, phase: InferencePhase) -> bool:
+    return any(request.phases[phase]["required"] for request in requests)
 
 
 def initialize_command_buffer(fiber, model_params: ModelParams, bs: int = 1):
@@ -204,13 +204,13 @@ class MicroSDXLExecutor(sf.Process):
         exec_process = InferenceExecutorProcess(self.service, fiber)
         if self.service.prog_isolation != sf.ProgramIsolation.PER_FIBER:
             self.service.idle_meta_fibers.append(fiber)
-        exec_process.exec_request = self.exec
+        exec_process.exec_requests = [self.exec]
         exec_process.launch()
         await asyncio.gather(exec_process)
         imgs = []
         await self.exec.done
 
-        imgs.append(exec_process.exec_request.image_array)
+        imgs.append(self.exec.image_array)
 
         self.imgs = imgs
         return
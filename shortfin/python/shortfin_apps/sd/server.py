@@ -94,6 +94,11 @@ async def health() -> Response:
     return Response(status_code=200)
 
 
+@app.get("/status")
+async def status() -> dict:
+    return services["sd"].status()
+
+
 async def generate_request(gen_req: GenerateReqInput, request: Request):
     service = services["sd"]
     gen_req.post_init()
@@ -144,6 +149,8 @@ def configure_service(args, sysman, model_config, flagfile, tuning_spec):
         show_progress=args.show_progress,
         trace_execution=args.trace_execution,
         splat=args.splat,
+        batch_latency_budget_ms=args.batch_latency_budget_ms,
+        embedding_cache_mb=args.embedding_cache_mb,
     )
     for key, vmfb_dict in vmfbs.items():
         for bs in vmfb_dict.keys():
@@ -376,6 +383,18 @@ def main(argv, log_config=UVICORN_LOG_CONFIG):
         choices=["per_fiber", "per_call", "none"],
         help="Concurrency control -- How to isolate programs.",
     )
+    parser.add_argument(
+        "--batch_latency_budget_ms",
+        type=float,
+        default=50.0,
+        help="Concurrency control -- longest time in milliseconds a request waits for others to batch with. The batcher flushes earlier when the observed arrival rate and flight latencies predict waiting would not pay off.",
+    )
+    parser.add_argument(
+        "--embedding_cache_mb",
+        type=int,
+        default=0,
+        help="Device memory in MiB for caching the text encoder outputs of recent prompts, evicting the least recently used ones. 0, the default, disables the cache.",
+    )
     parser.add_argument(
         "--show_progress",
         action="store_true",
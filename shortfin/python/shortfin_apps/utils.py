@@ -6,6 +6,11 @@ import logging
 import asyncio
 import struct
 import threading
+import time
+
+import numpy as np
+
+from collections import OrderedDict
 
 from iree.build.executor import FileNamespace, BuildAction, BuildContext, BuildFile
 from pathlib import Path
@@ -16,6 +21,8 @@ import shortfin as sf
 
 from shortfin.interop.support.device_setup import get_selected_devices
 
+logger = logging.getLogger(__name__)
+
 
 def get_system_args(parser):
     parser.add_argument(
@@ -358,6 +365,141 @@ prog_isolations = {
 }
 
 
+async def host_array_view(
+    device: sf.ScopedDevice, host_array: sfnp.device_array
+) -> np.ndarray:
+    """Returns a NumPy view of `host_array` once the transfers into it completed.
+
+    Awaiting `device` fences the work queued on it by the fiber so far,
+    including copies into `host_array`. The view aliases the mapped host
+    buffer rather than copying it, so it is only valid until `host_array` is
+    written again.
+    """
+    await device
+    # Signed integer dtypes are named sintN by shortfin and intN by NumPy.
+    dtype = np.dtype(str(host_array.dtype).replace("sint", "int"))
+    mapping = host_array.map(read=True)
+    return np.frombuffer(mapping, dtype=dtype).reshape(host_array.shape)
+
+
+def embedding_key(device: sf.ScopedDevice, *parts) -> tuple:
+    """Returns a hashable key for text encoder outputs computed on `device`.
+
+    Token id arrays are keyed by their contents.
+    """
+    return (
+        device.raw_device.name,
+        *(
+            part.tobytes()
+            if isinstance(part, np.ndarray)
+            else tuple(part)
+            if isinstance(part, list)
+            else part
+            for part in parts
+        ),
+    )
+
+
+class EmbeddingCache:
+    """Least recently used cache of text encoder outputs kept on device.
+
+    Entries map a key from `embedding_key` to dedicated device arrays holding
+    the embeddings of one prompt. At most `max_bytes` of device memory is
+    retained; the least recently used entries are evicted to make room.
+    Cached arrays are shared by all requests that hit them and must not be
+    written to.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: OrderedDict[tuple, tuple[sfnp.device_array, ...]] = OrderedDict()
+        # Executors on different workers share the cache.
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def lookup(self, key: tuple) -> Optional[tuple[sfnp.device_array, ...]]:
+        with self._lock:
+            arrays = self._entries.get(key)
+            if arrays is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return arrays
+
+    async def insert(
+        self,
+        device: sf.ScopedDevice,
+        entries: dict[tuple, list[sfnp.device_array]],
+    ) -> dict[tuple, tuple[sfnp.device_array, ...]]:
+        """Caches copies of the arrays of `entries` under their keys.
+
+        The copies are made on the fiber of `device` and awaited together, and
+        only published once they completed so that other fibers may read them.
+
+        Returns:
+            The cached arrays of each key.
+        """
+        copies = {}
+        for key, arrays in entries.items():
+            copies[key] = []
+            for array in arrays:
+                copy = sfnp.device_array.for_device(device, array.shape, array.dtype)
+                copy.copy_from(array)
+                copies[key].append(copy)
+            copies[key] = tuple(copies[key])
+        await device
+        with self._lock:
+            for key, arrays in copies.items():
+                nbytes = self._nbytes(arrays)
+                if nbytes > self.max_bytes:
+                    continue
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    copies[key] = self._entries[key]
+                    continue
+                self._entries[key] = arrays
+                self.nbytes += nbytes
+                while self.nbytes > self.max_bytes:
+                    _, evicted = self._entries.popitem(last=False)
+                    self.nbytes -= self._nbytes(evicted)
+                    self.evictions += 1
+        return copies
+
+    @staticmethod
+    def _nbytes(arrays: tuple[sfnp.device_array, ...]) -> int:
+        return sum(array.dtype.compute_dense_nd_size(array.shape) for array in arrays)
+
+    def counters(self) -> dict[str, int]:
+        """Lookup and eviction counters since the cache was created."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self.nbytes,
+            }
+
+    def __repr__(self):
+        return (
+            f"hit rate {self.hit_rate:.1%} ({self.hits} hits, {self.misses} misses), "
+            f"{len(self)} entries using {self.nbytes / 2**20:.1f} of "
+            f"{self.max_bytes / 2**20:.1f} MiB, {self.evictions} evictions"
+        )
+
+
 class InferenceExecRequest(sf.Message):
     def __init__(self):
         super().__init__()
@@ -573,6 +715,154 @@ class GenerateService:
         )
 
 
+class DenoiseCohort:
+    """Requests that joined a denoising loop together.
+
+    A cohort advances one step at a time and carries the program inputs and
+    outputs of its steps in `buffers`.
+    """
+
+    def __init__(self, requests: list, steps: int, buffers: Any = None):
+        self.requests = requests
+        self.steps = steps
+        self.step = 0
+        self.buffers = buffers
+        self.started_at = time.monotonic()
+
+    @property
+    def finished(self) -> bool:
+        return self.step >= self.steps
+
+
+class DenoiseLoop:
+    """Runs the denoising loops of the cohorts of a flight on one fiber.
+
+    Every cohort advances one step at a time and leaves the loop as soon as
+    its own steps are done, so a cohort with fewer steps is decoded without
+    waiting for the rest. The exported programs take a single timestep per
+    invocation, so each cohort is invoked on its own at every step; flights
+    therefore do not join a running loop and wait for an idle fiber instead.
+
+    This is a common implementation used by SDXL and Flux executors.
+    """
+
+    def __init__(self):
+        self.cohorts: list[DenoiseCohort] = []
+
+    def _fail(self, requests: list):
+        logger.exception("Fatal error in image generation")
+        # TODO: Cancel and set error correctly
+        for request in requests:
+            request.done.set_success()
+
+    async def run(self, requests: list, start, step, finish, release=None):
+        """Runs the loop of `requests` until no cohorts are left.
+
+        Args:
+            requests: Requests of the flight.
+            start: Coroutine function preparing the requests up to their first
+                denoising step. Returns the cohorts of the requests.
+            step: Coroutine function running the next step of a cohort.
+            finish: Coroutine function producing the outputs of a cohort
+                whose steps are done.
+            release: Called with every cohort leaving the loop, whether it
+                finished or failed.
+        """
+        try:
+            self.cohorts = await start(requests)
+        except Exception:
+            self._fail(requests)
+        while self.cohorts:
+            for cohort in list(self.cohorts):
+                try:
+                    if not cohort.finished:
+                        await step(cohort)
+                        cohort.step += 1
+                    if cohort.finished:
+                        await finish(cohort)
+                except Exception:
+                    self._fail(cohort.requests)
+                    cohort.step = cohort.steps
+                if cohort.finished:
+                    self.cohorts.remove(cohort)
+                    if release is not None:
+                        release(cohort)
+
+
+class AdaptiveFlushPolicy:
+    """Decides how long a batcher waits for more requests before flushing.
+
+    Waiting for one more request costs the expected time until the next
+    arrival, estimated from a moving average of inter-arrival times. It gains
+    the latency of the separate flight that request would otherwise need,
+    estimated from moving averages of the flight latency per batch size.
+    Pending requests are flushed once waiting costs more than it gains, or
+    would hold the oldest of them past `latency_budget_s`.
+    """
+
+    def __init__(self, latency_budget_s: float = 0.05, smoothing: float = 0.2):
+        self.latency_budget_s = latency_budget_s
+        # Weight of a new sample in the moving averages.
+        self.smoothing = smoothing
+        self.interarrival_s: Optional[float] = None
+        self.last_arrival: Optional[float] = None
+        self.flight_latency_s: dict[int, float] = {}
+        # Flights are recorded by executors, which may run on other workers.
+        self._lock = threading.Lock()
+
+    def _average(self, average: Optional[float], sample: float) -> float:
+        if average is None:
+            return sample
+        return average + self.smoothing * (sample - average)
+
+    def record_arrival(self, now: Optional[float] = None):
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            if self.last_arrival is not None:
+                self.interarrival_s = self._average(
+                    self.interarrival_s, now - self.last_arrival
+                )
+            self.last_arrival = now
+
+    def record_flight(self, batch_size: int, seconds: float):
+        with self._lock:
+            self.flight_latency_s[batch_size] = self._average(
+                self.flight_latency_s.get(batch_size), seconds
+            )
+
+    def batching_gain_s(self, batch_size: int) -> Optional[float]:
+        """Latency saved by adding a request to a flight of `batch_size` requests
+        rather than flying it on its own, if flights of those sizes were seen."""
+        latencies = self.flight_latency_s
+        if any(bs not in latencies for bs in (1, batch_size, batch_size + 1)):
+            return None
+        return latencies[batch_size] + latencies[1] - latencies[batch_size + 1]
+
+    def flush_delay(
+        self,
+        waiting: int,
+        oldest_wait_s: float,
+        max_batch_size: int,
+        now: Optional[float] = None,
+    ) -> float:
+        """Seconds to wait for more requests before flushing, 0 to flush now."""
+        if waiting >= max_batch_size:
+            return 0.0
+        remaining_s = self.latency_budget_s - oldest_wait_s
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            if self.interarrival_s is None or remaining_s <= 0:
+                return 0.0
+            # The time since the last arrival bounds the current gap.
+            next_arrival_s = max(self.interarrival_s, now - self.last_arrival)
+            gain_s = self.batching_gain_s(waiting)
+        if next_arrival_s > remaining_s:
+            return 0.0
+        if gain_s is not None and gain_s < next_arrival_s:
+            return 0.0
+        return min(remaining_s, (max_batch_size - waiting) * next_arrival_s)
+
+
 class BatcherProcess(sf.Process):
     """The batcher is a persistent process responsible for flighting incoming work
     into batches."""
@@ -580,13 +870,22 @@ class BatcherProcess(sf.Process):
     STROBE_SHORT_DELAY = 0.5
     STROBE_LONG_DELAY = 1.0
 
-    def __init__(self, fiber, name="batcher"):
+    def __init__(
+        self,
+        fiber,
+        name="batcher",
+        flush_policy: Optional[AdaptiveFlushPolicy] = None,
+    ):
         super().__init__(fiber=fiber)
         self.batcher_infeed = self.system.create_queue()
         self.strobe_enabled = True
         self.strobes = 0
         self.pending_requests = set()
         self.logger = logging.getLogger("batcher")
+        # When set, pending requests are timestamped on arrival and flushed as
+        # decided by the policy, see `flush_delay`.
+        self.flush_policy = flush_policy
+        self._strobe_timer: Optional[asyncio.TimerHandle] = None
 
     def shutdown(self):
         """Shutdown the batcher process."""
@@ -607,6 +906,29 @@ class BatcherProcess(sf.Process):
             if self.strobe_enabled:
                 self.submit(StrobeMessage())
 
+    def _timed_strobe(self):
+        self._strobe_timer = None
+        if not self.batcher_infeed.closed:
+            self.submit(StrobeMessage())
+
+    def schedule_strobe(self, delay: float):
+        """Strobes the batcher after `delay` seconds, unless it is strobed earlier."""
+        loop = asyncio.get_running_loop()
+        when = loop.time() + delay
+        if self._strobe_timer is not None:
+            if self._strobe_timer.when() <= when:
+                return
+            self._strobe_timer.cancel()
+        self._strobe_timer = loop.call_at(when, self._timed_strobe)
+
+    def flush_delay(self) -> float:
+        """Seconds to keep the pending requests waiting for more, 0 to flush them now."""
+        now = time.monotonic()
+        oldest = min(request.enqueued_at for request in self.pending_requests)
+        return self.flush_policy.flush_delay(
+            len(self.pending_requests), now - oldest, self.ideal_batch_size, now=now
+        )
+
     def custom_message(self, msg):
         self.logger.error("Illegal message received by batcher: %r", msg)
         exit(1)
@@ -618,6 +940,9 @@ class BatcherProcess(sf.Process):
         while item := await reader():
             self.strobe_enabled = False
             if isinstance(item, InferenceExecRequest):
+                if self.flush_policy is not None:
+                    item.enqueued_at = time.monotonic()
+                    self.flush_policy.record_arrival(item.enqueued_at)
                 self.handle_inference_request(item)
             elif isinstance(item, StrobeMessage):
                 self.strobes += 1
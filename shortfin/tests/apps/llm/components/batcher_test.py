@@ -10,20 +10,30 @@ from shortfin import ProgramIsolation
 
 from shortfin_apps.llm.components.batcher import (
     PrefillExecutorProcess,
+    DecodeBatcherProcess,
     DecodeExecutorProcess,
     LlmBatcherProcess,
     LlmExecutorProcess,
+    MixedBatcherProcess,
+    MixedExecutorProcess,
+    PrefillBatcherProcess,
+    pack_host_array,
 )
 
 from shortfin_apps.llm.components.config_struct import ModelParams, PagedKVCacheParams
+from shortfin_apps.llm.components.kvcache.trie_attention_cache import (
+    TriePagedAttentionCache,
+)
 from shortfin_apps.llm.components.device_array_cache import (
     Allocation as DeviceArrayAllocation,
     WrappedAllocation as DeviceArrayWrappedAllocation,
 )
+from shortfin_apps.llm.components.token_selection_strategy import DecodeConfig
 from shortfin_apps.llm.components.messages import (
     LlmInferenceExecRequest,
     InferencePhase,
 )
+from shortfin_apps.llm.components.scheduling_policy import PriorityPolicy
 
 
 @pytest.fixture
@@ -81,6 +91,48 @@ def prefill_executor_process(model_params, fiber, device_array_cache):
     )
 
 
+@pytest.fixture
+def chunked_prefill_executor_process(fiber, device_array_cache):
+    return PrefillExecutorProcess(
+        fiber=fiber,
+        cache=device_array_cache,
+        functions=None,
+        seq_stride=2,
+        page_tables=None,
+        program_isolation=ProgramIsolation.PER_CALL.value,
+        has_prefill_position=True,
+        chunk_block_size=2,
+        requeue_callback=MagicMock(),
+    )
+
+
+@pytest.fixture
+def mixed_batcher_process(model_params, fiber, cache):
+    model_params.has_prefill_position = True
+    model_params.paged_kv_cache.block_seq_stride = 2
+    return MixedBatcherProcess(
+        fiber=fiber,
+        page_cache=cache,
+        model_params=model_params,
+        prefill_functions=None,
+        program_isolation=ProgramIsolation.PER_CALL.value,
+        token_budget=6,
+        chunk_block_size=2,
+    )
+
+
+@pytest.fixture
+def trie_prefill_batcher_process(model_params, fiber, page_pool):
+    model_params.paged_kv_cache.block_seq_stride = 2
+    return PrefillBatcherProcess(
+        fiber=fiber,
+        page_cache=TriePagedAttentionCache(page_pool=page_pool, tokens_per_page=2),
+        model_params=model_params,
+        prefill_functions=None,
+        program_isolation=ProgramIsolation.PER_CALL.value,
+    )
+
+
 @pytest.fixture(scope="function")
 def decode_executor_process(model_params, fiber, device_array_cache):
     return DecodeExecutorProcess(
@@ -125,6 +177,19 @@ def exec_req_list():
         yield exec_reqs
 
 
+def test_pack_host_array(lsys, device_array_cache):
+    async def _test_pack_host_array():
+        rows = device_array_cache.allocate([3, 4], sfnp.int64)
+        pack_host_array(rows, [[1, 2, 3], [4]])
+        assert rows.host.items.tolist() == [1, 2, 3, 0, 4, 0, 0, 0, 0, 0, 0, 0]
+
+        values = device_array_cache.allocate([4], sfnp.int64)
+        pack_host_array(values, [5, 6], fill=1)
+        assert values.host.items.tolist() == [5, 6, 1, 1]
+
+    lsys.run(_test_pack_host_array())
+
+
 class TestLlmBatcherProcess:
     @pytest.mark.asyncio
     async def test_board_flights(
@@ -419,6 +484,7 @@ class TestPrefillExecutorProcess:
             assert seq_lens == [6, 6, 6, 6]
             assert seq_block_ids == [0, 0, 0, 0]
             assert page_table == data
+            assert prefill_executor_process.padding_efficiency == 24 / (4 * 42)
 
         lsys.run(_test_get_args())
 
@@ -502,6 +568,543 @@ class TestPrefillExecutorProcess:
 
         lsys.run(_test_get_results())
 
+    def test_select_functions(
+        self,
+        model_params,
+        fiber,
+        device_array_cache,
+        exec_req_list: list[LlmInferenceExecRequest],
+    ):
+        functions = {4: "prefill_bs4"}
+        final_functions = {4: "prefill_final_bs4"}
+        executor = PrefillExecutorProcess(
+            fiber=fiber,
+            cache=device_array_cache,
+            functions=functions,
+            seq_stride=model_params.paged_kv_cache.block_seq_stride,
+            page_tables=None,
+            program_isolation=ProgramIsolation.PER_CALL.value,
+            final_functions=final_functions,
+        )
+        executor.exec_requests = exec_req_list
+        assert executor.select_functions() is final_functions
+
+        # Every position is needed, so the full logits are transferred.
+        exec_req_list[1].return_all_logits = True
+        assert executor.select_functions() is functions
+
+
+class TestChunkedPrefillExecutorProcess:
+    def test_chunk_bounds(
+        self,
+        chunked_prefill_executor_process: PrefillExecutorProcess,
+        exec_req_list: list[LlmInferenceExecRequest],
+    ):
+        req = exec_req_list[0]
+        assert chunked_prefill_executor_process.chunk_bounds(req) == (0, 4)
+        assert chunked_prefill_executor_process.is_partial(req)
+
+        req.start_position = 4
+        assert chunked_prefill_executor_process.chunk_bounds(req) == (4, 6)
+        assert not chunked_prefill_executor_process.is_partial(req)
+
+        req.start_position = 0
+        req.return_all_logits = True
+        assert chunked_prefill_executor_process.chunk_bounds(req) == (0, 6)
+
+    def test_get_args(
+        self,
+        lsys,
+        chunked_prefill_executor_process: PrefillExecutorProcess,
+        exec_req_list: list[LlmInferenceExecRequest],
+    ):
+        async def _test_get_args():
+            exec_req_list[1].start_position = 4
+            chunked_prefill_executor_process.exec_requests = exec_req_list
+            chunked_prefill_executor_process.page_tables = []
+
+            args, req_count = await chunked_prefill_executor_process.get_args(
+                len(exec_req_list)
+            )
+            await chunked_prefill_executor_process.fiber.device(0)
+
+            assert len(args) == 4
+            assert req_count == len(exec_req_list)
+
+            tokens, seq_lens, start_positions, seq_block_ids = args
+            assert tokens.shape == [4, 4]
+            assert seq_block_ids.shape == [4, 3]
+
+            assert tokens.device.view(0).items.tolist() == [0, 1, 2, 3]
+            assert tokens.device.view(1).items.tolist() == [5, 6, 0, 0]
+            assert seq_lens.device.items.tolist() == [4, 6, 4, 4]
+            assert start_positions.device.items.tolist() == [0, 4, 0, 0]
+
+        lsys.run(_test_get_args())
+
+    def test_get_results(
+        self,
+        lsys,
+        chunked_prefill_executor_process: PrefillExecutorProcess,
+        exec_req_list: list[LlmInferenceExecRequest],
+    ):
+        async def _test_get_results():
+            exec_req_list[1].start_position = 4
+
+            logits = sfnp.device_array(
+                chunked_prefill_executor_process.fiber.device(0),
+                [4, 4, 16],
+                dtype=sfnp.float16,
+            )
+            data = [i for i in range(16)]
+            with logits.view(1, 1).map(discard=True) as m:
+                m.items = data
+
+            chunked_prefill_executor_process.exec_requests = exec_req_list
+            await chunked_prefill_executor_process.get_results(
+                logits, None, len(exec_req_list)
+            )
+            await chunked_prefill_executor_process.fiber.device(0)
+
+            requeue = chunked_prefill_executor_process.requeue_callback
+            assert requeue.call_count == 3
+            requeued = [call.args[0] for call in requeue.call_args_list]
+            assert exec_req_list[1] not in requeued
+
+            for req in requeued:
+                assert req.start_position == 4
+                assert req.result_logits is None
+                assert not req.done._event.is_set()
+
+            assert exec_req_list[1].result_logits.items.tolist() == data
+            assert exec_req_list[1].done._event.is_set()
+
+        lsys.run(_test_get_results())
+
+    def test_publish_pages(
+        self,
+        chunked_prefill_executor_process: PrefillExecutorProcess,
+        exec_req_list: list[LlmInferenceExecRequest],
+    ):
+        exec_req_list[1].start_position = 4
+        for req in exec_req_list:
+            req.allocation = MagicMock()
+        chunked_prefill_executor_process.exec_requests = exec_req_list
+
+        with patch.object(
+            LlmInferenceExecRequest, "publish_allocated_pages"
+        ) as mock_publish:
+            chunked_prefill_executor_process.publish_pages()
+            assert mock_publish.call_count == 1
+
+        exec_req_list[0].allocation.publish_pages_for_tokens.assert_called_once_with(
+            [0, 1, 2, 3], publish_incomplete_page=False
+        )
+        exec_req_list[1].allocation.publish_pages_for_tokens.assert_not_called()
+
+
+class TestPrefillBatcherProcess:
+    def test_order_pending(self, trie_prefill_batcher_process: PrefillBatcherProcess):
+        batcher = trie_prefill_batcher_process
+        cache = batcher.page_cache
+
+        allocation = cache.acquire_pages_for_tokens([1, 2, 3, 4])
+        allocation.publish_pages_for_tokens(allocation.tokens)
+        allocation.release_pages()
+
+        with patch(
+            "shortfin_apps.llm.components.messages.sf.VoidFuture", new=MockVoidFuture
+        ):
+            reqs = [
+                LlmInferenceExecRequest(
+                    phase=InferencePhase.PREFILL, input_token_ids=tokens
+                )
+                for tokens in [[9, 9, 7, 7], [1, 2, 3, 4, 5, 6], [9, 9, 8], [5]]
+            ]
+
+        ordered = batcher.order_pending(set(reqs))
+
+        # The cache hit goes first, only one request populates `(9, 9)`.
+        assert ordered[0] is reqs[1]
+        assert len(ordered) == 3
+        leader = reqs[0] if reqs[0] in ordered else reqs[2]
+        follower = reqs[2] if leader is reqs[0] else reqs[0]
+        assert set(ordered[1:]) == {leader, reqs[3]}
+
+        # The follower waits until the leader published the shared page.
+        leader.allocation = cache.acquire_pages_for_tokens(leader.input_token_ids)
+        assert follower not in batcher.order_pending({follower})
+
+        leader.allocation.publish_pages_for_tokens(leader.input_token_ids)
+        assert batcher.order_pending({follower}) == [follower]
+
+    def test_board_exhausted_pool(
+        self, trie_prefill_batcher_process: PrefillBatcherProcess
+    ):
+        batcher = trie_prefill_batcher_process
+        cache = batcher.page_cache
+        executor = MagicMock()
+        executor.exec_requests = []
+        batcher.make_process = MagicMock(return_value=executor)
+
+        with patch(
+            "shortfin_apps.llm.components.messages.sf.VoidFuture", new=MockVoidFuture
+        ):
+            req = LlmInferenceExecRequest(
+                phase=InferencePhase.PREFILL, input_token_ids=[1, 2, 3, 4]
+            )
+        req.allocation = cache.acquire_pages_for_tokens(req.input_token_ids)
+        pages = cache.page_pool.acquire_free_pages(8)
+
+        # Verifying speculative tokens needs pages past those already held.
+        req.start_position = 4
+        req.input_token_ids = [1, 2, 3, 4, 5, 6, 7, 8]
+        batcher.board(cache, batcher.fiber, [req])
+        executor.launch.assert_not_called()
+        assert batcher.pending == {req}
+
+        # The request boards once pages are freed.
+        cache.page_pool.free_pages(pages)
+        batcher.pending = set()
+        batcher.board(cache, batcher.fiber, [req])
+        executor.launch.assert_called_once()
+        assert executor.exec_requests == [req]
+        assert batcher.pending == set()
+
+    @pytest.mark.asyncio
+    async def test_board_flights_policy_accounting(
+        self, trie_prefill_batcher_process: PrefillBatcherProcess
+    ):
+        batcher = trie_prefill_batcher_process
+        batcher.scheduling_policy = PriorityPolicy()
+        cache = batcher.page_cache
+        executor = MagicMock()
+        executor.exec_requests = []
+        batcher.make_process = MagicMock(return_value=executor)
+
+        with patch(
+            "shortfin_apps.llm.components.messages.sf.VoidFuture", new=MockVoidFuture
+        ):
+            req = LlmInferenceExecRequest(
+                phase=InferencePhase.PREFILL, input_token_ids=[1, 2, 3, 4]
+            )
+        batcher.handle_inference_request(req)
+        batcher.scheduler._schedule(rid=req.orig_instance_id, count=1)
+        pages = cache.page_pool.acquire_free_pages(10)
+
+        # A request that could not board is not accounted for.
+        await batcher.board_flights()
+        assert batcher.pending == {req}
+        assert batcher.scheduling_policy.queue_times["standard"].count == 0
+        assert batcher.scheduling_policy.usage == {}
+
+        cache.page_pool.free_pages(pages)
+        await batcher.board_flights()
+        assert batcher.pending == set()
+        assert batcher.scheduling_policy.queue_times["standard"].count == 1
+        assert batcher.scheduling_policy.usage == {None: 1.0}
+
+    def test_order_pending_match_lengths(
+        self, trie_prefill_batcher_process: PrefillBatcherProcess
+    ):
+        batcher = trie_prefill_batcher_process
+        cache = batcher.page_cache
+        with patch(
+            "shortfin_apps.llm.components.messages.sf.VoidFuture", new=MockVoidFuture
+        ):
+            reqs = [
+                LlmInferenceExecRequest(
+                    phase=InferencePhase.PREFILL, input_token_ids=tokens
+                )
+                for tokens in [[1, 2, 3, 4], [5, 6, 7, 8]]
+            ]
+
+        with patch.object(
+            cache, "match_length", wraps=cache.match_length
+        ) as match_length:
+            batcher.order_pending(set(reqs))
+            calls = match_length.call_count
+
+            # Match lengths are reused while the trie is unchanged.
+            batcher.order_pending(set(reqs))
+            assert match_length.call_count == calls
+
+            allocation = cache.acquire_pages_for_tokens([1, 2, 3, 4])
+            allocation.publish_pages_for_tokens(allocation.tokens)
+            allocation.release_pages()
+            assert batcher.match_length(reqs[0]) == 4
+
+        # Requests no longer pending are forgotten.
+        batcher.order_pending({reqs[0]})
+        assert set(batcher.match_lengths) == {reqs[0]}
+
+    def test_order_pending_no_sharing(self, llm_batcher_process, exec_req_list):
+        ordered = llm_batcher_process.order_pending(set(exec_req_list))
+        assert set(ordered) == set(exec_req_list)
+
+
+class TestDecodeBatcherProcess:
+    def _make_batcher(self, model_params, fiber, cache, **kwargs):
+        return DecodeBatcherProcess(
+            fiber,
+            cache,
+            model_params,
+            None,
+            ProgramIsolation.PER_CALL.value,
+            **kwargs,
+        )
+
+    def _make_requests(self, cache, token_counts):
+        """Decode requests holding pages for `token_counts`, oldest first."""
+        with patch(
+            "shortfin_apps.llm.components.messages.sf.VoidFuture", new=MockVoidFuture
+        ):
+            reqs = []
+            for i, count in enumerate(token_counts):
+                req = LlmInferenceExecRequest(
+                    phase=InferencePhase.DECODE,
+                    input_token_ids=list(range(count)),
+                    rid=str(i),
+                )
+                req.created_at = i
+                req.start_position = count - 1
+                req._cache = cache
+                req.allocation = cache.acquire_pages_for_tokens(req.input_token_ids)
+                reqs.append(req)
+        return reqs
+
+    def test_invalid_preemption_mode(self, model_params, fiber, cache, page_pool):
+        with pytest.raises(ValueError):
+            self._make_batcher(model_params, fiber, cache, preemption_mode="evict")
+        with pytest.raises(ValueError):
+            self._make_batcher(model_params, fiber, cache, preemption_mode="recompute")
+        with pytest.raises(ValueError):
+            self._make_batcher(
+                model_params,
+                fiber,
+                TriePagedAttentionCache(page_pool=page_pool, tokens_per_page=16),
+                preemption_mode="swap",
+            )
+
+    def test_form_flights_swap(self, lsys, model_params, fiber, cache):
+        async def _test_swap():
+            batcher = self._make_batcher(
+                model_params, fiber, cache, preemption_mode="swap"
+            )
+            # Exhaust the pool: 1 + 4 + 5 pages, each needing one more.
+            oldest, middle, newest = self._make_requests(cache, [16, 64, 80])
+
+            jobs = batcher.form_flights([[newest, oldest], [middle]])
+            assert jobs == [[oldest], [middle]]
+            assert len(oldest.allocation.pages) == 2
+            assert len(middle.allocation.pages) == 5
+            assert newest.allocation is None
+            assert batcher.preempted == {newest}
+            assert batcher.preemption_count == 1
+
+            # Not enough pages to swap the newest request back in.
+            batcher.swap_in_requests()
+            assert len(batcher.swapped) == 1
+            assert newest not in batcher.pending
+
+            middle.allocation.release_pages()
+            batcher.swap_in_requests()
+            assert batcher.swapped == []
+            assert batcher.preempted == set()
+            assert batcher.pending == {newest}
+            assert len(newest.allocation.pages) == 5
+
+        lsys.run(_test_swap())
+
+    def test_form_flights_recompute(self, model_params, fiber, cache):
+        recompute_callback = MagicMock()
+        batcher = self._make_batcher(
+            model_params,
+            fiber,
+            cache,
+            preemption_mode="recompute",
+            recompute_callback=recompute_callback,
+        )
+        oldest, newest = self._make_requests(cache, [64, 96])
+
+        with patch(
+            "shortfin_apps.llm.components.batcher.RecomputeProcess"
+        ) as mock_process_cls:
+            jobs = batcher.form_flights([[oldest, newest]])
+
+        assert jobs == [[oldest]]
+        assert newest.allocation is None
+        assert batcher.preempted == {newest}
+        mock_process_cls.assert_called_once_with(batcher, newest, recompute_callback)
+        mock_process_cls.return_value.launch.assert_called_once()
+        # Only the extended oldest request holds pages.
+        assert cache.page_pool._queue.qsize() == 10 - 5
+
+    def test_preemption_order(self, model_params, fiber, cache):
+        batcher = self._make_batcher(
+            model_params, fiber, cache, scheduling_policy=PriorityPolicy()
+        )
+        oldest, middle, newest = self._make_requests(cache, [16, 16, 16])
+        oldest.scheduling_info.priority = "batch"
+        newest.scheduling_info.priority = "interactive"
+
+        # Lower priority requests are preempted first, then the newest.
+        assert batcher.preemption_order([middle, oldest, newest]) == [
+            newest,
+            middle,
+            oldest,
+        ]
+
+    def test_form_flights_no_preemption(self, model_params, fiber, cache):
+        batcher = self._make_batcher(model_params, fiber, cache)
+        jobs = [self._make_requests(cache, [16])]
+        assert batcher.form_flights(jobs) is jobs
+
+
+class TestMixedBatcherProcess:
+    def test_requires_prefill_position(self, model_params, fiber, cache):
+        with pytest.raises(ValueError):
+            MixedBatcherProcess(
+                fiber=fiber,
+                page_cache=cache,
+                model_params=model_params,
+                prefill_functions=None,
+                program_isolation=ProgramIsolation.PER_CALL.value,
+                token_budget=64,
+            )
+
+    @pytest.mark.asyncio
+    async def test_board_flights(
+        self, mixed_batcher_process: MixedBatcherProcess, exec_req_list
+    ):
+        mixed_batcher_process.board = MagicMock()
+        decode_reqs = exec_req_list[:2]
+        for req in decode_reqs:
+            req.reset(InferencePhase.DECODE)
+            req.start_position = len(req.input_token_ids) - 1
+        # Reserved decode work is scheduled without waiting for a strobe.
+        for req in decode_reqs:
+            mixed_batcher_process.scheduler._schedule(rid=req.orig_instance_id, count=1)
+
+        prefill_reqs = exec_req_list[2:]
+        prefill_reqs[1].start_position = 4
+
+        mixed_batcher_process.pending = set(exec_req_list)
+        await mixed_batcher_process.board_flights()
+
+        assert mixed_batcher_process.board.call_count == 1
+        boarded = mixed_batcher_process.board.call_args.args[2]
+        # 2 decode tokens + the 2 remaining tokens of the continued prompt fit
+        # the budget of 6, the new 4 token chunk does not.
+        assert set(boarded) == set(decode_reqs) | {prefill_reqs[1]}
+        assert mixed_batcher_process.pending == {prefill_reqs[0]}
+
+    @pytest.mark.asyncio
+    async def test_board_flights_split_workgroup(
+        self, mixed_batcher_process: MixedBatcherProcess
+    ):
+        batcher = mixed_batcher_process
+        batcher.board = MagicMock()
+        with patch(
+            "shortfin_apps.llm.components.messages.sf.VoidFuture", new=MockVoidFuture
+        ):
+            beams = [
+                LlmInferenceExecRequest(
+                    phase=InferencePhase.DECODE,
+                    input_token_ids=[1, 2, 3],
+                    orig_instance_id="beams",
+                )
+                for _ in range(6)
+            ]
+        # The workgroup of 6 beams is split over flights of at most 4.
+        batcher.scheduler._schedule(rid="beams", count=len(beams))
+
+        batcher.pending = set(beams)
+        await batcher.board_flights()
+        first = set(batcher.board.call_args.args[2])
+        assert len(first) == 4
+        assert batcher.pending == set(beams) - first
+
+        # The beams left out go first once the others are pending again.
+        batcher.board.reset_mock()
+        batcher.pending = set(beams)
+        await batcher.board_flights()
+        second = set(batcher.board.call_args.args[2])
+        assert second == set(beams) - first
+        assert batcher.deferred == set()
+
+    def test_board_decode_exhausted_pool(
+        self, mixed_batcher_process: MixedBatcherProcess, exec_req_list
+    ):
+        batcher = mixed_batcher_process
+        cache = batcher.page_cache
+        executor = MagicMock()
+        executor.exec_requests = []
+        batcher.make_process = MagicMock(return_value=executor)
+
+        # The request fills its page, its next decode step needs another one.
+        req = exec_req_list[0]
+        req.input_token_ids = list(range(cache.tokens_per_page))
+        req.allocation = cache.acquire_pages_for_tokens(req.input_token_ids)
+        pages = cache.page_pool.acquire_free_pages(9)
+        req.reset(InferencePhase.DECODE)
+        req.start_position = len(req.input_token_ids) - 1
+
+        # A decode step that cannot get a page stays pending.
+        batcher.board(cache, batcher.fiber, [req])
+        executor.launch.assert_not_called()
+        assert batcher.pending == {req}
+
+        cache.page_pool.free_pages(pages)
+        batcher.pending = set()
+        batcher.board(cache, batcher.fiber, [req])
+        executor.launch.assert_called_once()
+        assert batcher.pending == set()
+
+    def test_request_tokens(
+        self, mixed_batcher_process: MixedBatcherProcess, exec_req_list
+    ):
+        req = exec_req_list[0]
+        assert mixed_batcher_process.request_tokens(req) == 4
+        req.start_position = 4
+        assert mixed_batcher_process.request_tokens(req) == 2
+        req.reset(InferencePhase.DECODE)
+        assert mixed_batcher_process.request_tokens(req) == 1
+
+
+class TestMixedExecutorProcess:
+    def test_get_args(self, lsys, fiber, device_array_cache, exec_req_list):
+        async def _test_get_args():
+            executor = MixedExecutorProcess(
+                fiber=fiber,
+                cache=device_array_cache,
+                functions=None,
+                seq_stride=2,
+                page_tables=[],
+                program_isolation=ProgramIsolation.PER_CALL.value,
+                chunk_block_size=2,
+                requeue_callback=MagicMock(),
+            )
+            decode_req = exec_req_list[0]
+            decode_req.reset(InferencePhase.DECODE)
+            decode_req.start_position = len(decode_req.input_token_ids) - 1
+            executor.exec_requests = exec_req_list[:2]
+
+            args, req_count = await executor.get_args(2)
+            await fiber.device(0)
+
+            assert req_count == 2
+            tokens, seq_lens, start_positions, seq_block_ids = args
+            assert tokens.device.view(0).items.tolist() == [5, 0, 0, 0]
+            assert tokens.device.view(1).items.tolist() == [1, 2, 3, 4]
+            assert seq_lens.device.items.tolist() == [6, 4]
+            assert start_positions.device.items.tolist() == [5, 0]
+            assert seq_block_ids.shape == [2, 3]
+            assert not executor.is_partial(decode_req)
+            assert executor.is_partial(exec_req_list[1])
+
+        lsys.run(_test_get_args())
+
 
 class TestDecodeExecutorProcess:
     def test_get_args(
@@ -643,3 +1246,33 @@ class TestDecodeExecutorProcess:
                 assert req.done
 
         lsys.run(_test_get_results())
+
+    def test_get_results_select_tokens(
+        self,
+        lsys,
+        decode_executor_process: DecodeExecutorProcess,
+        exec_req_list: list[LlmInferenceExecRequest],
+    ):
+        async def _test_get_results():
+            logits = sfnp.device_array(
+                decode_executor_process.fiber.device(0),
+                [4, 1, 16],
+                dtype=sfnp.float32,
+            )
+
+            data = [float(i) for i in range(16)]
+            for i in range(len(exec_req_list)):
+                with logits.view(i, 0).map(discard=True) as m:
+                    m.items = data[i:] + data[:i]
+
+            configs = [DecodeConfig(), DecodeConfig(top_k=1), DecodeConfig(top_p=0.0)]
+            for req, config in zip(exec_req_list, configs):
+                req.decode_config = config
+
+            decode_executor_process.exec_requests = exec_req_list
+            await decode_executor_process.get_results(logits, None, len(exec_req_list))
+
+            assert [req.result_token for req in exec_req_list] == [15, 14, 13, None]
+            assert all(req.done._event.is_set() for req in exec_req_list)
+
+        lsys.run(_test_get_results())
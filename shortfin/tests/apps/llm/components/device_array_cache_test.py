@@ -62,10 +62,11 @@ def test_release_allocate_diff(generic_device):
     allocation0 = cache.allocate((1, 2, 3), sfnp.int64)
 
     cache.release(allocation0)
-    allocation1 = cache.allocate((1, 2, 4), sfnp.int64)
+    allocation1 = cache.allocate((1, 64, 4), sfnp.int64)
 
     assert allocation0.device != allocation1.device
     assert allocation0.host != allocation1.host
+    assert cache.misses == 2
 
 
 def test_release_allocate_multiple(generic_device):
@@ -95,20 +96,38 @@ def test_release_allocate_multiple(generic_device):
             assert allocation0[i].host != allocation1[j].host
 
 
+def test_release_allocate_size_class(generic_device):
+    cache = DeviceArrayCache(generic_device)
+    allocation0 = cache.allocate((4, 60), sfnp.int64)
+
+    cache.release(allocation0)
+    # A slightly smaller shape of another dtype reuses the same buffers.
+    allocation1 = cache.allocate((3, 150), sfnp.int32)
+
+    assert allocation1.shape == [3, 150]
+    assert allocation1.dtype == sfnp.int32
+    assert allocation1.key == allocation0.key
+    assert cache.hits == 1
+    assert cache.misses == 1
+
+
 def test_release_allocate_limit(generic_device):
-    cache = DeviceArrayCache(generic_device, max_allocations=1)
+    cache = DeviceArrayCache(generic_device, max_bytes=2304)
 
-    allocation0 = cache.allocate((1, 2, 3), sfnp.int64)
-    allocation1 = cache.allocate((1, 2, 3), sfnp.int64)
+    allocation0 = cache.allocate((128,), sfnp.int64)
+    allocation1 = cache.allocate((128,), sfnp.int64)
 
     cache.release(allocation0)
     cache.release(allocation1)
 
-    # An uncached allocation is used to flush the cache.
-    flush = cache.allocate((1, 2, 4), sfnp.int64)
+    # Only one 1KiB buffer fits alongside a buffer of another size class.
+    flush = cache.allocate((300,), sfnp.int32)
+    cache.release(flush)
+    assert cache.evictions == 1
+    assert cache.cached_bytes == 2304
 
-    allocation2 = cache.allocate((1, 2, 3), sfnp.int64)
-    allocation3 = cache.allocate((1, 2, 3), sfnp.int64)
+    allocation2 = cache.allocate((128,), sfnp.int64)
+    allocation3 = cache.allocate((128,), sfnp.int64)
 
     assert allocation0.device != allocation3.device
     assert allocation0.host != allocation3.host
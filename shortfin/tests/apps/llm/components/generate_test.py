@@ -0,0 +1,42 @@
+# Copyright 2025 Advanced Micro Devices, Inc.
+#
+# Licensed under the Apache License v2.0 with LLVM Exceptions.
+# See https://llvm.org/LICENSE.txt for license information.
+# SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
+
+from unittest.mock import MagicMock
+
+from shortfin_apps.llm.components.generate import TokenStreamer, format_stream_event
+
+
+def test_format_stream_event():
+    assert format_stream_event("Hello") == b"data: Hello\n\n"
+    assert (
+        format_stream_event("a\nb", rid="r0") == b"data(rid=r0): a\ndata(rid=r0): b\n\n"
+    )
+
+
+def test_token_streamer_backlog():
+    responder = MagicMock()
+    responder.stream_backlog.return_value = 0
+    tokenizer = MagicMock()
+    tokenizer.decode.side_effect = lambda seqs: [
+        "".join(chr(ord("a") + t) for t in seq) for seq in seqs
+    ]
+
+    streamer = TokenStreamer(responder, tokenizer, max_backlog=1)
+    streamer.append(0)
+    responder.stream_part.assert_called_once_with(b"data: a\n\n")
+
+    # A slow client accumulates text into the next part.
+    responder.stream_backlog.return_value = 1
+    streamer.append(1)
+    streamer.append(2)
+    assert responder.stream_part.call_count == 1
+
+    responder.stream_backlog.return_value = 0
+    streamer.append(3)
+    responder.stream_part.assert_called_with(b"data: bcd\n\n")
+
+    streamer.finish()
+    assert responder.stream_part.call_count == 2
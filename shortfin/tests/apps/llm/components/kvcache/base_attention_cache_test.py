@@ -553,6 +553,16 @@ def test_fork_pages(lsys, cache_ref_count, tokens, expected_pages, case_name):
             m.fill(1)
 
         new_allocation = cache_ref_count.fork_pages(pages)
+
+        # All pages are shared until the fork writes to its last page.
+        assert new_allocation.pages == pages
+        for page in pages:
+            assert (
+                ref_counts[page.index] == 2
+            ), f"Fork Error in {case_name}: Page {page.index} should have ref_count 2."
+
+        copied = cache_ref_count.copy_on_write([(new_allocation, len(pages) - 1)])
+        assert copied == 1
         new_pages = new_allocation.pages
         # The await here allows the data to finish copying over,
         # before we check the values.
@@ -584,6 +594,9 @@ def test_fork_pages(lsys, cache_ref_count, tokens, expected_pages, case_name):
             ref_counts[new_last_page.index] == 1
         ), f"Fork Error in {case_name}: New last page should have ref_count 1."
 
+        # The source allocation is the last sharer and writes in place.
+        assert cache_ref_count.copy_on_write([(allocation, len(pages))]) == 0
+
         original_page_table = page_tables[0].view(last_page.index).items.tolist()
         new_page_table = page_tables[0].view(new_last_page.index).items.tolist()
 
@@ -608,6 +621,68 @@ async def test_fork_pages_allocation_error(cache_ref_count):
         val == 1 for val in cache_ref_count.ref_counts
     ), "All pages should be in use."
 
-    # Should throw an allocation error when forking
+    # Forking shares all pages, so it needs no free pages
+    new_allocation = cache_ref_count.fork_pages(pages)
+    assert new_allocation.pages == pages
+
+    # Should throw an allocation error when writing to the shared last page
     with pytest.raises(CacheAllocationFailure):
-        cache_ref_count.fork_pages(pages)
+        cache_ref_count.copy_on_write([(new_allocation, len(pages) - 1)])
+
+
+# fmt: off
+@pytest.mark.parametrize(
+   "tokens,token_count,expected_pages,case_name",
+   [   # Tokens                                Keep                 Pages  Case Name
+       (list(range(TEST_PAGE_SIZE * 3)),       TEST_PAGE_SIZE,      1,     "to_exact_page"),
+       (list(range(TEST_PAGE_SIZE * 3)),       TEST_PAGE_SIZE + 1,  2,     "to_partial_page"),
+       (list(range(TEST_PAGE_SIZE * 2)),       TEST_PAGE_SIZE * 2,  2,     "no_op"),
+       (list(range(TEST_PAGE_SIZE * 2)),       0,                   0,     "to_empty"),
+   ],
+)
+# fmt: on
+def test_truncate(cache, tokens, token_count, expected_pages, case_name):
+    total_pages = len(cache.page_pool.attn_page_entries)
+
+    allocation = cache.acquire_pages_for_tokens(tokens)
+    kept = allocation.pages[:expected_pages]
+    allocation.truncate(token_count)
+
+    assert allocation.pages == kept, f"Failed for case: {case_name}"
+    qsize = cache.page_pool._queue.qsize()
+    assert (
+        qsize == total_pages - expected_pages
+    ), f"Truncated pages should be freed for {case_name}"
+    allocation.release_pages()
+
+
+def test_swap_out_swap_in(lsys, cache):
+    async def _test_swap():
+        page_table = cache.page_pool.page_tables[0]
+        allocation = cache.acquire_pages_for_tokens(list(range(TEST_PAGE_SIZE * 2)))
+        for i, page in enumerate(allocation.pages):
+            with page_table.view(page.index).map(discard=True) as m:
+                m.fill(float(i + 1))
+
+        host_pages = cache.swap_out(allocation)
+        assert len(host_pages) == 2
+        assert cache.page_pool._queue.qsize() == TEST_POOL_CAPACITY
+        await page_table.device
+
+        # Take the swapped out pages so they are restored elsewhere.
+        held = cache.page_pool.acquire_free_pages(2)
+        for page in held:
+            with page_table.view(page.index).map(discard=True) as m:
+                m.fill(0)
+
+        restored = cache.swap_in(host_pages)
+        await page_table.device
+        for i, page in enumerate(restored.pages):
+            assert page not in held
+            values = page_table.view(page.index).items.tolist()
+            assert all(val == float(i + 1) for val in values)
+
+        with pytest.raises(CacheAllocationFailure):
+            cache.swap_in([host_pages[0]] * TEST_POOL_CAPACITY)
+
+    lsys.run(_test_swap())
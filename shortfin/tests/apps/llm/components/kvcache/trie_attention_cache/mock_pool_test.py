@@ -8,6 +8,7 @@ Since we mock all dependencies of the page pool, we don't need to initialize sys
 Everything runs A LOT faster this way.
 """
 
+import asyncio
 import pytest
 from typing import List, Tuple
 import shortfin as sf
@@ -21,10 +22,12 @@ import logging
 
 from shortfin_apps.llm.components.kvcache.trie_attention_cache import (
     TriePagedAttentionCache,
+    chain_block_hashes,
 )
 from shortfin_apps.llm.components.kvcache.base_attention_cache import (
     CacheAllocationFailure,
 )
+from shortfin_apps.llm.components.kvcache.host_page_tier import HostPageTier
 from shortfin_apps.llm.components.kvcache.page_pool import (
     PagePool,
     PageInfo,
@@ -60,6 +63,10 @@ class MockScopedDevice:
         self._mock.device_id = 0
         self._mock.device_type = "CPU"
 
+    def __await__(self):
+        # Mocked transfers complete immediately.
+        return iter(())
+
     def __repr__(self):
         return f"MockScopedDevice(device_id={self._mock.device_id})"
 
@@ -279,6 +286,104 @@ def test_page_reuse(trie_cache, published_sequence, test_sequences):
     allocation.release_pages()
 
 
+def test_match_length(trie_cache, published_sequence):
+    """Test matching the cached prefix without taking references"""
+    tokens = list(range(TEST_PAGE_SIZE * 2 + 3))
+    assert trie_cache.match_length(tokens) == 0
+
+    published_sequence(tokens[: TEST_PAGE_SIZE * 2])
+    assert trie_cache.match_length(tokens) == TEST_PAGE_SIZE * 2
+    assert trie_cache.match_length(tokens[: TEST_PAGE_SIZE + 1]) == TEST_PAGE_SIZE
+    assert trie_cache.match_length([42] + tokens) == 0
+
+    # Nothing was referenced, so all pages stay evictable.
+    assert all(leaf.ref_count.is_empty() for leaf in trie_cache.leaves)
+
+
+def test_block_hash_collision(trie_cache, published_sequence):
+    """Test that a colliding block hash is not mistaken for a match"""
+    tokens = list(range(TEST_PAGE_SIZE * 2))
+    other_tokens = list(range(100, 100 + TEST_PAGE_SIZE * 2))
+    published_sequence(tokens)
+
+    # Point the hash of the other sequence's first block at a cached node.
+    _, block_hashes = chain_block_hashes(other_tokens, TEST_PAGE_SIZE)
+    trie_cache._index[block_hashes[0]] = trie_cache._index.pop(
+        chain_block_hashes(tokens, TEST_PAGE_SIZE)[1][0]
+    )
+    assert trie_cache.match_length(other_tokens) == 0
+
+    alloc = trie_cache.acquire_pages_for_tokens(other_tokens, extra_token_slots=0)
+    assert alloc.number_of_published_pages == 0
+    alloc.publish_pages_for_tokens(alloc.tokens)
+    alloc.release_pages()
+
+    # Colliding nodes are indexed side by side, so both prefixes are reused.
+    node = trie_cache.root.children[tuple(other_tokens[:TEST_PAGE_SIZE])]
+    assert len(trie_cache._index[block_hashes[0]]) == 2
+    assert any(other is node for other in trie_cache._index[block_hashes[0]])
+    assert trie_cache.match_length(other_tokens) == TEST_PAGE_SIZE * 2
+    assert len(trie_cache.leaves) == 2
+
+    alloc = trie_cache.acquire_pages_for_tokens(other_tokens, extra_token_slots=0)
+    assert alloc.number_of_published_pages == 2
+    alloc.release_pages()
+
+
+def test_host_tier_restore(trie_cache, page_pool, published_sequence):
+    """Test that evicted pages are restored from the host tier"""
+    trie_cache.host_tier = HostPageTier(page_pool, capacity=4)
+    tokens = list(range(TEST_PAGE_SIZE * 2))
+    published_sequence(tokens)
+
+    async def main():
+        # Exhaust the pool so that the last page of `tokens` is evicted.
+        other_tokens = list(
+            range(1000, 1000 + TEST_PAGE_SIZE * (TEST_POOL_CAPACITY - 1))
+        )
+        # The evicted page is held until its copy to the host completed.
+        with pytest.raises(CacheAllocationFailure):
+            trie_cache.acquire_pages_for_tokens(other_tokens, extra_token_slots=0)
+        assert trie_cache.host_tier.stores == 1
+        assert page_pool.transfers.held_page_count == 1
+        assert trie_cache.root.ref_count.is_empty()
+        await page_pool.fence_transfers()
+        assert page_pool.transfers.held_page_count == 0
+        assert not page_pool.transfers.pending
+
+        alloc = trie_cache.acquire_pages_for_tokens(other_tokens, extra_token_slots=0)
+        assert trie_cache.host_tier.stores == 1
+        blocks, block_hashes = chain_block_hashes(tokens, TEST_PAGE_SIZE)
+        assert (block_hashes[0], blocks[1]) in trie_cache.host_tier
+        assert trie_cache.match_length(tokens) == TEST_PAGE_SIZE * 2
+        page_pool.free_pages(alloc.pages)
+
+        alloc = trie_cache.acquire_pages_for_tokens(tokens, extra_token_slots=0)
+        assert alloc.number_of_published_pages == 2
+        assert trie_cache.host_tier.restores == 1
+        assert len(trie_cache.host_tier) == 0
+        assert trie_cache.match_length(tokens) == TEST_PAGE_SIZE * 2
+        # The restore must complete before a flight reads the page.
+        assert page_pool.transfers.pending
+        await page_pool.fence_transfers()
+        assert not page_pool.transfers.pending
+        alloc.release_pages()
+
+    asyncio.run(main())
+
+
+def test_host_tier_capacity(page_pool):
+    """Test that the host tier drops its least recently used pages"""
+    tier = HostPageTier(page_pool, capacity=2)
+    page = page_pool.attn_page_entries[0]
+    for key in [(1,), (2,), (1,), (3,)]:
+        tier.store(key, page)
+
+    assert tier.evictions == 1
+    assert (1,) in tier and (3,) in tier and (2,) not in tier
+    assert not tier.restore((2,), page)
+
+
 @pytest.fixture
 def filled_cache(trie_cache, published_sequence):
     """Fixture that fills cache with numbered sequences"""
@@ -367,6 +472,27 @@ def test_lru_eviction(trie_cache, access_count):
         recheck.release_pages()
 
 
+def test_eviction_requeues_accessed_leaves(trie_cache, published_sequence):
+    """Test that leaves accessed after being queued are evicted in LRU order"""
+    first = list(range(TEST_PAGE_SIZE))
+    second = list(range(100, 100 + TEST_PAGE_SIZE))
+    published_sequence(first)
+    published_sequence(second)
+
+    # Accessing `first` makes `second` the least recently used leaf.
+    alloc = trie_cache.acquire_pages_for_tokens(first, extra_token_slots=0)
+    alloc.release_pages()
+
+    with trie_cache._lock:
+        assert trie_cache._evict_pages(1) == 1
+    assert trie_cache.match_length(first) == TEST_PAGE_SIZE
+    assert trie_cache.match_length(second) == 0
+
+    assert trie_cache.evicted_pages == 1
+    assert trie_cache.eviction_runs == 1
+    assert trie_cache.eviction_time >= 0.0
+
+
 @pytest.mark.parametrize("publish_steps", [1, 2, 3])
 def test_progressive_publish(trie_cache, publish_steps):
     """Test publishing pages progressively"""
@@ -510,3 +636,37 @@ def test_fork_pages(trie_cache, tokens):
             assert orig.index == forked.index
     finally:
         forked_alloc.release_pages()
+
+
+def test_fork_pages_copy_on_write(trie_cache):
+    """Test that forks share their tail page until they write to it."""
+    tokens = list(range(TEST_PAGE_SIZE + 3))
+    alloc = trie_cache.acquire_pages_for_tokens(tokens, extra_token_slots=0)
+    alloc.publish_pages_for_tokens(alloc.tokens)
+    tail = alloc.pages[-1]
+
+    forks = [trie_cache.fork_pages(alloc.pages, tokens) for _ in range(2)]
+    assert all(fork.pages[-1] is tail for fork in forks)
+    assert len(trie_cache.page_pool.available_pages) == TEST_POOL_CAPACITY - 2
+
+    # Both forks get a private copy, the source writes in place.
+    writes = [(fork, 1) for fork in forks] + [(alloc, 1)]
+    assert trie_cache.copy_on_write(writes) == 2
+    assert alloc.pages[-1] is tail
+    tails = {fork.pages[-1].index for fork in forks}
+    assert len(tails) == 2 and tail.index not in tails
+    assert trie_cache.copy_on_write(writes) == 0
+
+    for allocation in forks + [alloc]:
+        allocation.release_pages()
+
+
+def test_fork_pages_release_before_write(trie_cache):
+    """Test that the last remaining sharer writes its tail page in place."""
+    tokens = list(range(TEST_PAGE_SIZE + 3))
+    alloc = trie_cache.acquire_pages_for_tokens(tokens, extra_token_slots=0)
+    fork = trie_cache.fork_pages(alloc.pages, tokens)
+
+    alloc.release_pages()
+    assert trie_cache.copy_on_write([(fork, 1)]) == 0
+    fork.release_pages()
@@ -22,6 +22,10 @@ from shortfin_apps.llm.components.kvcache.page_pool import (
     PagePool,
     PagePoolConfig,
 )
+from shortfin_apps.llm.components.kvcache.prefix_cache_snapshot import (
+    load_prefix_cache,
+    save_prefix_cache,
+)
 
 
 # Test constants
@@ -99,3 +103,75 @@ def test_partial_page_publishing(trie_cache):
     assert (
         alloc2.pages[1].index != alloc1.pages[1].index
     ), "Should not match the same second page"
+
+
+@pytest.fixture
+def real_system():
+    sc = sf.host.CPUSystemBuilder()
+    with sc.create_system() as ls:
+        yield ls
+
+
+def _create_trie_cache(ls, worker_name):
+    fiber = ls.create_fiber(ls.create_worker(worker_name))
+    config = PagePoolConfig(
+        dtype=sfnp.float32,
+        alloc_page_count=TEST_POOL_CAPACITY,
+        paged_kv_block_size_elements=TEST_BLOCK_SIZE,
+    )
+    page_pool = PagePool(devices=list(fiber.devices_dict.values()), config=config)
+    return TriePagedAttentionCache(page_pool=page_pool, tokens_per_page=TEST_PAGE_SIZE)
+
+
+def _fill_page(page_pool, page, value):
+    page_table = page_pool.page_tables[0]
+    host_page = page_table.view(page.index).for_transfer()
+    with host_page.map(discard=True) as m:
+        m.fill(value)
+    host_page.copy_to(page_table.view(page.index))
+
+
+async def _read_page(page_pool, page):
+    page_view = page_pool.page_tables[0].view(page.index)
+    host_page = page_view.for_transfer()
+    host_page.copy_from(page_view)
+    await page_pool.devices[0]
+    return list(host_page.items)
+
+
+def test_prefix_cache_snapshot_round_trip(real_system, tmp_path):
+    cache = _create_trie_cache(real_system, "test-worker-0")
+    restored_cache = _create_trie_cache(real_system, "test-worker-1")
+    tokens = list(range(TEST_PAGE_SIZE * 2))
+    branch = tokens[:TEST_PAGE_SIZE] + [100] * TEST_PAGE_SIZE
+    for value, sequence in enumerate([tokens, branch]):
+        alloc = cache.acquire_pages_for_tokens(sequence)
+        for page in alloc.pages[alloc.number_of_published_pages :]:
+            _fill_page(cache.page_pool, page, float(value + 1))
+        alloc.publish_pages_for_tokens(alloc.tokens)
+        alloc.release_pages()
+
+    async def round_trip():
+        assert await save_prefix_cache(cache, tmp_path, "model-a") == 3
+
+        # A snapshot of another model configuration is ignored.
+        assert load_prefix_cache(restored_cache, tmp_path, "model-b") == 0
+        assert restored_cache.match_length(tokens) == 0
+
+        assert load_prefix_cache(restored_cache, tmp_path, "model-a") == 3
+        # The page copies are fenced like host tier restores.
+        page_pool = restored_cache.page_pool
+        assert page_pool.transfers.pending
+        await page_pool.fence_transfers()
+        assert not page_pool.transfers.pending
+        assert restored_cache.match_length(tokens) == len(tokens)
+        assert restored_cache.match_length(branch) == len(branch)
+        assert len(restored_cache.leaves) == 2
+
+        alloc = restored_cache.acquire_pages_for_tokens(branch)
+        assert alloc.number_of_published_pages == 2
+        assert await _read_page(page_pool, alloc.pages[0]) == [1.0] * TEST_BLOCK_SIZE
+        assert await _read_page(page_pool, alloc.pages[1]) == [2.0] * TEST_BLOCK_SIZE
+        alloc.release_pages()
+
+    real_system.run(round_trip())
@@ -0,0 +1,159 @@
+# Copyright 2025 Advanced Micro Devices, Inc.
+#
+# Licensed under the Apache License v2.0 with LLVM Exceptions.
+# See https://llvm.org/LICENSE.txt for license information.
+# SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
+
+import threading
+from types import SimpleNamespace
+
+from shortfin_apps.llm.components.kvcache.trie_attention_cache import (
+    TriePagedAttentionCache,
+)
+from shortfin_apps.llm.components.metrics import MetricsRegistry, ServiceMetrics
+from shortfin_apps.llm.components.scheduling_policy import SchedulingPolicy
+
+
+class FakeBatcher:
+    def __init__(self, name, scheduling_policy, preemption_count):
+        self.name = name
+        self.scheduling_policy = scheduling_policy
+        self.preemption_count = preemption_count
+
+
+def _samples(text):
+    """Map each sample line of a Prometheus text exposition to its value."""
+    samples = {}
+    for line in text.splitlines():
+        if line and not line.startswith("#"):
+            name, value = line.rsplit(" ", 1)
+            samples[name] = float(value)
+    return samples
+
+
+def test_counter():
+    registry = MetricsRegistry()
+    counter = registry.counter("requests", "Requests.")
+    by_status = registry.counter("outcomes", "Outcomes.", ["status"])
+
+    text = registry.render()
+    assert "# TYPE requests counter" in text
+    assert _samples(text) == {"requests_total": 0}
+
+    counter.inc()
+    counter.inc(2)
+    by_status.labels("ok").inc()
+    by_status.labels("rejected").inc()
+    by_status.labels("ok").inc()
+    assert _samples(registry.render()) == {
+        "requests_total": 3,
+        'outcomes_total{status="ok"}': 2,
+        'outcomes_total{status="rejected"}': 1,
+    }
+
+
+def test_histogram():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("latency_seconds", "Latency.", [0.1, 1.0])
+    for value in [0.05, 0.1, 0.5, 2.0]:
+        histogram.observe(value)
+
+    text = registry.render()
+    assert "# TYPE latency_seconds histogram" in text
+    assert _samples(text) == {
+        'latency_seconds_bucket{le="0.1"}': 2,
+        'latency_seconds_bucket{le="1"}': 3,
+        'latency_seconds_bucket{le="+Inf"}': 4,
+        "latency_seconds_count": 4,
+        "latency_seconds_sum": 2.65,
+    }
+
+
+def test_collected():
+    registry = MetricsRegistry()
+    state = {"waits": {("prefill",): (3, 1.5)}}
+    registry.collected(
+        "wait_seconds", "Waits.", "summary", lambda: state["waits"], ["batcher"]
+    )
+    registry.collected("pages", "Pages.", "gauge", lambda: {(): 7})
+
+    assert _samples(registry.render()) == {
+        'wait_seconds_count{batcher="prefill"}': 3,
+        'wait_seconds_sum{batcher="prefill"}': 1.5,
+        "pages": 7,
+    }
+
+
+def test_concurrent_recording():
+    registry = MetricsRegistry()
+    counter = registry.counter("items", "Items.", ["kind"])
+    histogram = registry.histogram("sizes", "Sizes.", [10])
+    num_threads = 8
+    iterations = 1000
+
+    def _record():
+        for i in range(iterations):
+            counter.labels("a").inc()
+            histogram.observe(i % 20)
+
+    threads = [threading.Thread(target=_record) for _ in range(num_threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    samples = _samples(registry.render())
+    assert samples['items_total{kind="a"}'] == num_threads * iterations
+    assert samples["sizes_count"] == num_threads * iterations
+    assert samples['sizes_bucket{le="10"}'] == num_threads * iterations * 11 / 20
+
+
+def test_service_metrics(page_pool):
+    cache = TriePagedAttentionCache(page_pool=page_pool, tokens_per_page=16)
+    policy = SchedulingPolicy()
+    policy.queue_times["interactive"].record(0.25)
+    batcher = FakeBatcher("decode", policy, preemption_count=2)
+    service = SimpleNamespace(
+        page_cache=cache,
+        queue_manager=SimpleNamespace(current_queue_size=3, waiting_count=1),
+        prefill_batcher=batcher,
+        decode_batcher=batcher,
+    )
+    metrics = ServiceMetrics(service)
+
+    allocation = cache.acquire_pages_for_tokens(list(range(32)))
+    allocation.publish_pages_for_tokens(allocation.tokens)
+    allocation.release_pages()
+    allocation = cache.acquire_pages_for_tokens(list(range(40)))
+
+    metrics.record_flight("prefill_process", 3, 4, 0.5)
+    metrics.record_flight("decode_process", 2, 4, None)
+    metrics.record_sequence(arrival=1.0, first_token=1.5, end=2.5, tokens=11)
+    metrics.requests.labels("completed").inc()
+    # The mock pool does not track its free pages.
+    page_pool.available_pages = page_pool.available_pages[:7]
+
+    samples = _samples(metrics.render())
+    assert samples['shortfin_llm_requests_total{status="completed"}'] == 1
+    assert samples["shortfin_llm_time_to_first_token_seconds_sum"] == 0.5
+    assert samples["shortfin_llm_time_per_output_token_seconds_sum"] == 0.1
+    assert (
+        samples[
+            'shortfin_llm_queue_wait_seconds_count{batcher="decode",priority="interactive"}'
+        ]
+        == 1
+    )
+    assert (
+        samples['shortfin_llm_batch_occupancy_ratio_sum{process="prefill_process"}']
+        == 0.75
+    )
+    assert samples['shortfin_llm_padding_ratio_sum{process="prefill_process"}'] == 0.5
+    assert samples['shortfin_llm_padding_ratio_sum{process="decode_process"}'] == 0.5
+    assert samples['shortfin_llm_request_queue_size{state="admitted"}'] == 3
+    assert samples['shortfin_llm_request_queue_size{state="waiting"}'] == 1
+    assert samples['shortfin_llm_kv_cache_pages{state="used"}'] == 3
+    assert samples["shortfin_llm_kv_cache_utilization_ratio"] == 0.3
+    assert samples['shortfin_llm_prefix_cache_tokens_total{result="lookup"}'] == 72
+    assert samples['shortfin_llm_prefix_cache_tokens_total{result="hit"}'] == 32
+    assert samples["shortfin_llm_prefix_cache_evicted_pages_total"] == 0
+    assert samples["shortfin_llm_preemptions_total"] == 2
@@ -4,6 +4,10 @@
 # See https://llvm.org/LICENSE.txt for license information.
 # SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
 
+import asyncio
+import pytest
+from types import SimpleNamespace
+
 from shortfin_apps.llm.components.token_selection_strategy.config import DecodeConfig
 from shortfin_apps.llm.components.request_queue_manager import RequestQueueManager
 
@@ -37,3 +41,110 @@ def test_request_queue_manager():
     tasks = queue_manager.current_tasks()
     assert len(tasks) == 1
     assert id0 in tasks
+
+
+class FakePageCache:
+    def __init__(self, page_count, tokens_per_page, cached_tokens=0):
+        self.page_pool = SimpleNamespace(
+            config=SimpleNamespace(alloc_page_count=page_count)
+        )
+        self.tokens_per_page = tokens_per_page
+        self.cached_tokens = cached_tokens
+
+    def match_length(self, tokens):
+        return min(self.cached_tokens, len(tokens))
+
+
+def get_page_decode_configs(max_completion_tokens, beam_count=1):
+    return [
+        DecodeConfig(
+            eos_token_id=0,
+            num_beams=beam_count,
+            max_completion_tokens=max_completion_tokens,
+        )
+    ]
+
+
+def test_request_queue_manager_page_demand():
+    queue_manager = RequestQueueManager(
+        8, page_cache=FakePageCache(page_count=16, tokens_per_page=4, cached_tokens=8)
+    )
+
+    # 5 prompt pages, 2 of them cached, and 2 completion pages per beam
+    demand = queue_manager.page_demand(
+        get_page_decode_configs(8, beam_count=3), [list(range(20))]
+    )
+    assert demand == 3 + 3 * 2
+
+    # Without prompts, only the queue size is checked
+    assert queue_manager.page_demand(get_page_decode_configs(8), None) == 0
+
+
+def test_request_queue_manager_page_admission():
+    queue_manager = RequestQueueManager(
+        8, page_cache=FakePageCache(page_count=10, tokens_per_page=4)
+    )
+
+    # An oversized request is admitted when nothing else is
+    id0 = queue_manager.add_to_queue(get_page_decode_configs(40), [list(range(8))])
+    assert id0 is not None
+    assert queue_manager.current_pages == 12
+
+    id1 = queue_manager.add_to_queue(get_page_decode_configs(4), [list(range(4))])
+    assert id1 is None
+
+    queue_manager.remove_from_queue(id0)
+    assert queue_manager.current_pages == 0
+
+    id2 = queue_manager.add_to_queue(get_page_decode_configs(16), [list(range(16))])
+    assert id2 is not None
+    id3 = queue_manager.add_to_queue(get_page_decode_configs(4), [list(range(4))])
+    assert id3 is not None
+    assert queue_manager.current_pages == 10
+
+    # Pinned pages are not available to requests
+    queue_manager.remove_from_queue(id3)
+    queue_manager.pin_pages(2)
+    id4 = queue_manager.add_to_queue(get_page_decode_configs(4), [list(range(4))])
+    assert id4 is None
+
+
+@pytest.mark.asyncio
+async def test_request_queue_manager_wait_for_admission():
+    queue_manager = RequestQueueManager(
+        8, page_cache=FakePageCache(page_count=10, tokens_per_page=4)
+    )
+    tokens = [list(range(16))]
+
+    id0 = await queue_manager.wait_for_admission(
+        get_page_decode_configs(16), tokens, timeout=0
+    )
+    assert id0 is not None
+
+    # Requests that do not fit wait in arrival order
+    waiter1 = asyncio.create_task(
+        queue_manager.wait_for_admission(get_page_decode_configs(16), tokens, timeout=5)
+    )
+    waiter2 = asyncio.create_task(
+        queue_manager.wait_for_admission(
+            get_page_decode_configs(4), [list(range(4))], timeout=5
+        )
+    )
+    await asyncio.sleep(0)
+    assert queue_manager.waiting_count == 2
+    assert queue_manager.add_to_queue(get_page_decode_configs(1), [[0]]) is None
+
+    queue_manager.remove_from_queue(id0)
+    id1 = await waiter1
+    id2 = await waiter2
+    assert id1 is not None and id2 is not None
+    assert queue_manager.waiting_count == 0
+    assert set(queue_manager.current_tasks()) == {id1, id2}
+
+    # Waiting times out with a hint of when to retry
+    id3 = await queue_manager.wait_for_admission(
+        get_page_decode_configs(4), [list(range(4))], timeout=0.01
+    )
+    assert id3 is None
+    assert queue_manager.waiting_count == 0
+    assert queue_manager.retry_after() >= 1
@@ -4,7 +4,11 @@
 # See https://llvm.org/LICENSE.txt for license information.
 # SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
 
-from shortfin_apps.llm.components.scheduler import Scheduler
+from shortfin_apps.llm.components.scheduler import (
+    LengthBucketBuilder,
+    Scheduler,
+    TokenBudgetWorkloadBuilder,
+)
 
 
 class FakeBatcher:
@@ -207,3 +211,94 @@ def test_scheduler_reserved_two_separate():
     to_schedule = scheduler.should_execute(pending=workload, strobe=2)
     assert sorted(to_schedule[0]) == workload[0]
     assert sorted(to_schedule[1]) == workload[1]
+
+
+# Check that reserved workgroups are scheduled in the order of their pending work
+def test_scheduler_reserved_order():
+    ideal_batch_size = 2
+    scheduler = Scheduler(ideal_batch_size=ideal_batch_size)
+
+    reserve_helper(scheduler, rid=0, count=2)
+    reserve_helper(scheduler, rid=1, count=2)
+
+    workload = {1: ["Task2", "Task3"], 0: ["Task0", "Task1"]}
+    to_schedule = scheduler.should_execute(pending=workload, strobe=0)
+    assert to_schedule == [["Task2", "Task3"], ["Task0", "Task1"]]
+
+
+# Check that suspended work items of preempted requests are not waited for
+def test_scheduler_reserved_suspended():
+    scheduler = Scheduler(ideal_batch_size=10)
+
+    reserve_helper(scheduler, rid=0, count=2)
+    reserve_helper(scheduler, rid=1, count=2)
+
+    workload = make_workload({0: 2, 1: 1})
+    assert scheduler.should_execute(pending=workload, strobe=0) == []
+
+    scheduler.suspend(rid=1, count=1)
+    to_schedule = scheduler.should_execute(pending=workload, strobe=0)
+    assert sorted(to_schedule[0]) == [f"Task{i}" for i in range(3)]
+
+    scheduler.resume(rid=1, count=1)
+    assert scheduler.should_execute(pending=workload, strobe=0) == []
+
+    # Releasing a suspended request clears its suspension
+    scheduler.suspend(rid=1, count=1)
+    release_helper(scheduler, rid=1, count=2)
+    reserve_helper(scheduler, rid=1, count=2)
+    assert scheduler.should_execute(pending=workload, strobe=0) == []
+
+
+# Check that the token budget bounds a flight without splitting jobs
+def test_token_budget_workload_builder():
+    builder = TokenBudgetWorkloadBuilder(ideal_batch_size=4, token_budget=8)
+    assert builder.get_jobs() == []
+
+    assert builder.add_work(["Task0", "Task1"], 2)
+    assert not builder.add_work(["Task2"], 7)
+    assert builder.add_work(["Task3"], 6)
+    assert not builder.add_work(["Task4", "Task5"], 0)
+    assert builder.add_work(["Task6"], 0)
+
+    assert builder.tokens == 8
+    assert builder.get_jobs() == [["Task0", "Task1", "Task3", "Task6"]]
+    assert builder.get_scheduled() == {"Task0", "Task1", "Task3", "Task6"}
+
+
+# Check that oversized work is still accepted into an empty flight
+def test_token_budget_workload_builder_oversized():
+    builder = TokenBudgetWorkloadBuilder(ideal_batch_size=4, token_budget=8)
+    assert builder.add_work(["Task0"], 32)
+    assert not builder.add_work(["Task1"], 1)
+    assert builder.get_jobs() == [["Task0"]]
+
+    # Jobs larger than a batch are left to the caller to split.
+    builder = TokenBudgetWorkloadBuilder(ideal_batch_size=4, token_budget=8)
+    assert not builder.add_work([f"Task{i}" for i in range(5)], 5)
+    assert builder.get_jobs() == []
+
+
+# Check that short and long sequences are split into separate flights
+def test_length_bucket_builder_splits_outliers():
+    builder = LengthBucketBuilder(batch_sizes=[1, 4], seq_stride=16, flight_overhead=64)
+    lengths = {"Short0": 10, "Short1": 12, "Short2": 16, "Long": 1000}
+    flights = builder.build([["Short0", "Long"], ["Short1", "Short2"]], lengths.get)
+    assert flights == [["Short0", "Short1", "Short2"], ["Long"]]
+
+
+# Check that the flight overhead keeps similar sequences together
+def test_length_bucket_builder_merges_similar():
+    builder = LengthBucketBuilder(batch_sizes=[1, 4], seq_stride=16, flight_overhead=64)
+    lengths = {"Task0": 16, "Task1": 20, "Task2": 30, "Task3": 32}
+    flights = builder.build([list(lengths.keys())], lengths.get)
+    assert flights == [["Task0", "Task1", "Task2", "Task3"]]
+    assert builder.build([], lengths.get) == []
+
+
+# Check that flights never exceed the largest batch size
+def test_length_bucket_builder_max_batch_size():
+    builder = LengthBucketBuilder(batch_sizes=[2], seq_stride=16, flight_overhead=0)
+    lengths = {f"Task{i}": 16 for i in range(5)}
+    flights = builder.build([list(lengths.keys())], lengths.get)
+    assert [len(f) for f in flights] == [1, 2, 2]
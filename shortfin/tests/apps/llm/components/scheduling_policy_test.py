@@ -0,0 +1,131 @@
+# Copyright 2025 Advanced Micro Devices, Inc.
+#
+# Licensed under the Apache License v2.0 with LLVM Exceptions.
+# See https://llvm.org/LICENSE.txt for license information.
+# SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
+
+import pytest
+from unittest.mock import patch
+
+from shortfin_apps.llm.components.config_struct import ServerParams
+from shortfin_apps.llm.components.io_struct import SchedulingParams
+from shortfin_apps.llm.components.messages import (
+    InferencePhase,
+    LlmInferenceExecRequest,
+)
+from shortfin_apps.llm.components.scheduling_policy import (
+    PriorityPolicy,
+    SchedulingInfo,
+    SchedulingPolicy,
+    make_scheduling_policy,
+)
+
+
+@pytest.fixture
+def make_request():
+    def _make_request(priority="standard", tenant=None, deadline=None, enqueued_at=0):
+        with patch("shortfin.VoidFuture"):
+            request = LlmInferenceExecRequest(
+                InferencePhase.PREFILL,
+                [1, 2, 3],
+                scheduling_info=SchedulingInfo(
+                    priority=priority,
+                    tenant=tenant,
+                    deadline=deadline,
+                    arrival=enqueued_at,
+                ),
+            )
+        request.enqueued_at = enqueued_at
+        return request
+
+    return _make_request
+
+
+@pytest.fixture
+def now():
+    with patch(
+        "shortfin_apps.llm.components.scheduling_policy.time.monotonic",
+        return_value=100.0,
+    ):
+        yield 100.0
+
+
+def test_scheduling_params():
+    with pytest.raises(ValueError):
+        SchedulingParams(priority="urgent")
+
+    info = SchedulingInfo.from_params(
+        SchedulingParams(priority="batch", tenant="a", deadline_ms=500), arrival=10.0
+    )
+    assert info == SchedulingInfo(
+        priority="batch", tenant="a", deadline=10.5, arrival=10.0
+    )
+    assert SchedulingInfo.from_params(SchedulingParams()).deadline is None
+
+
+def test_make_scheduling_policy():
+    params = ServerParams()
+    assert type(make_scheduling_policy(params)) is SchedulingPolicy
+
+    params.scheduling_policy = "priority"
+    policy = make_scheduling_policy(params)
+    assert isinstance(policy, PriorityPolicy)
+    assert policy.max_queue_wait_s == params.max_queue_wait_s
+
+    params.scheduling_policy = "shortest_first"
+    with pytest.raises(ValueError):
+        make_scheduling_policy(params)
+
+
+def test_default_policy(make_request, now):
+    policy = SchedulingPolicy()
+    requests = [make_request("batch"), make_request("interactive")]
+    assert policy.order(requests) == requests
+
+    policy.boarded(requests)
+    assert policy.queue_times["batch"].count == 1
+    assert policy.queue_times["interactive"].mean_s == now
+    assert policy.queue_times["standard"].count == 0
+
+
+def test_priority_order(make_request, now):
+    policy = PriorityPolicy()
+    batch = make_request("batch")
+    standard = make_request("standard")
+    interactive = make_request("interactive")
+    late = make_request("standard", deadline=now + 5)
+    early = make_request("standard", deadline=now + 1)
+
+    ordered = policy.order([batch, standard, late, interactive, early])
+    assert ordered == [interactive, early, late, standard, batch]
+
+
+def test_priority_max_queue_wait(make_request, now):
+    policy = PriorityPolicy({"batch": 30.0})
+    interactive = make_request("interactive", enqueued_at=now - 40)
+    waiting = make_request("batch", enqueued_at=now - 20)
+    starved = make_request("batch", enqueued_at=now - 40)
+
+    assert policy.order([interactive, waiting, starved]) == [
+        starved,
+        interactive,
+        waiting,
+    ]
+
+
+def test_priority_fair_share(make_request, now):
+    policy = PriorityPolicy()
+    policy.boarded([make_request(tenant="a") for _ in range(3)])
+    policy.boarded([make_request(tenant="b")])
+    assert policy.usage["a"] > policy.usage["b"]
+
+    a = make_request(tenant="a")
+    b = make_request(tenant="b")
+    c = make_request(tenant="c")
+    assert policy.order([a, b, c]) == [c, b, a]
+
+    # Usage decays as other tenants are served.
+    for _ in range(1000):
+        policy.boarded([c])
+    assert "a" not in policy.usage
+    assert policy.order([a, b, c]) == [a, b, c]
@@ -144,6 +144,25 @@ def test_independent_beam_sample_logits_top_k_w_indices(device, independent_beam
     assert token in expected_tokens
 
 
+@pytest.mark.parametrize("top_k,top_p", [(3, None), (None, 0.95)])
+def test_independent_beam_sample_logits_temperature(
+    device, independent_beam, top_k, top_p
+):
+    src = sfnp.device_array(device, [1, 1, 16], dtype=sfnp.float32)
+    data = [float(i) for i in range(math.prod(src.shape))]
+    src.items = data
+
+    # A low temperature concentrates the candidates on the best token, as on
+    # the decode batch.
+    independent_beam.decode_config.temperature = 0.01
+    independent_beam.decode_config.top_k = top_k
+    independent_beam.decode_config.top_p = top_p
+    independent_beam.exec_req.result_logits = src
+
+    tokens = {int(independent_beam.sample_logits(0)) for _ in range(20)}
+    assert tokens == {15}
+
+
 def test_independent_beam_sample_logits_top_p(device, independent_beam):
     independent_beam.decode_config.temperature = 1.0
 
@@ -320,6 +339,51 @@ async def test_independent_decode_single(
             mock_clean_up.assert_called_once()
 
 
+@pytest.mark.asyncio
+async def test_independent_decode_stream(
+    cache,
+    device,
+    dummy_pages,
+    exec_req: LlmInferenceExecRequest,
+):
+    def _batcher_callback(request: LlmInferenceExecRequest):
+        result_logits = sfnp.device_array(device, [1, 1, 16], dtype=sfnp.float32)
+        data = [float(i) for i in range(math.prod(result_logits.shape))]
+        result_logits.items = data
+        request.result_logits = result_logits
+        request.done.set_success()
+
+    results_array = []
+    streamed = []
+
+    def _results_callback(tokens: List[List[int]]):
+        results_array.extend(tokens)
+
+    decode_config = DecodeConfig(
+        num_beams=1,
+        max_completion_tokens=3,
+        eos_token_id=-1,
+    )
+    config = build_token_selector_config(
+        decode_config,
+        prefill_batcher=FakeBatcher(_batcher_callback, _batcher_workitem_callback),
+        decode_batcher=FakeBatcher(_batcher_callback, _batcher_workitem_callback),
+        results_callback=_results_callback,
+        stream_callback=streamed.append,
+    )
+    token_selector = TokenSelector(
+        token_selection_strategy_config=config,
+    )
+
+    exec_req._cache = cache
+    exec_req.allocation = BasePagedAttentionCacheAllocation(dummy_pages, cache=cache)
+    with patch.object(BeamGroup, "clean_up"):
+        await token_selector.decode(exec_req)
+
+    assert streamed == [15, 15, 15]
+    assert results_array == [streamed]
+
+
 @pytest.mark.asyncio
 async def test_independent_decode_multiple_completions(
     cache,
@@ -10,6 +10,9 @@ import random
 
 import shortfin.array as sfnp
 
+from shortfin_apps.llm.components.token_selection_strategy.config import (
+    LogitsNormalization,
+)
 from shortfin_apps.llm.components.token_selection_strategy.sampler import Sampler
 from shortfin_apps.utils import convert_int_to_float, convert_float_to_int
 
@@ -146,3 +149,65 @@ def test_sampler_sample_top_k(device):
         assert len(result_probs) == k
         assert all(token in expected_tokens for token in result_tokens)
         assert all(prob in expected_probs for prob in result_probs)
+
+
+def test_sampler_sample_batch():
+    sampler = Sampler()
+    logits = np.array(
+        [
+            [0.0, 3.0, 1.0, 2.0],
+            [3.0, 0.0, 1.0, 2.0],
+            [0.0, 1.0, 2.0, 3.0],
+            [10.0, 9.0, -10.0, -10.0],
+        ],
+        dtype=np.float16,
+    )
+
+    # Greedy, top_k=1, tiny top_p and top_k=2 rows.
+    for _ in range(16):
+        tokens = sampler.sample_batch(
+            logits,
+            None,
+            temperature=np.array([1.0, 0.5, 1.0, 1.0]),
+            top_k=np.array([0, 1, 0, 2]),
+            top_p=np.array([1.0, 1.0, 0.01, 1.0]),
+        )
+        assert tokens.tolist()[:3] == [1, 0, 3]
+        assert tokens.tolist()[3] in [0, 1]
+
+
+def test_sampler_sample_batch_indices():
+    sampler = Sampler()
+    logits = np.log(np.array([[0.7, 0.2, 0.1], [0.5, 0.4, 0.1]]))
+    indices = np.array([[42, 7, 3], [5, 6, 9]])
+
+    for _ in range(16):
+        tokens = sampler.sample_batch(
+            np.exp(logits),
+            indices,
+            temperature=np.array([1.0, 1.0]),
+            top_k=np.array([0, 2]),
+            top_p=np.array([1.0, 1.0]),
+            logits_normalization=LogitsNormalization.SOFTMAX,
+        )
+        assert tokens[0] == 42
+        assert tokens[1] in [5, 6]
+
+
+def test_sampler_sample_batch_distribution():
+    np.random.seed(0)
+    sampler = Sampler()
+    logits = np.log(np.array([[0.6, 0.3, 0.1]] * 4000))
+
+    tokens = sampler.sample_batch(
+        logits,
+        None,
+        temperature=np.ones(4000),
+        top_k=np.full(4000, 3),
+        top_p=np.full(4000, 0.8),
+    )
+
+    # The nucleus keeps tokens 0 and 1, renormalized to [2/3, 1/3].
+    counts = np.bincount(tokens, minlength=3)
+    assert counts[2] == 0
+    assert abs(counts[0] / 4000 - 2 / 3) < 0.05
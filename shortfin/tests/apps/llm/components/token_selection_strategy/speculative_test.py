@@ -0,0 +1,363 @@
+# Copyright 2025 Advanced Micro Devices, Inc.
+#
+# Licensed under the Apache License v2.0 with LLVM Exceptions.
+# See https://llvm.org/LICENSE.txt for license information.
+# SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
+
+import asyncio
+import logging
+import pytest
+from typing import List
+from unittest.mock import MagicMock, patch
+from uuid import uuid4
+
+import shortfin.array as sfnp
+
+from shortfin_apps.llm.components.messages import (
+    LlmInferenceExecRequest,
+    InferencePhase,
+)
+from shortfin_apps.llm.components.scheduler import Scheduler
+from shortfin_apps.llm.components.token_selection_strategy import (
+    build_token_selector_config,
+    PromptLookupProposer,
+    SpeculativeProposer,
+    SpeculativeStats,
+    supports_speculation,
+    TokenSelector,
+)
+from shortfin_apps.llm.components.token_selection_strategy.config import DecodeConfig
+from shortfin_apps.llm.components.token_selection_strategy.speculative import (
+    accept_draft_tokens,
+    greedy_tokens,
+)
+
+logger = logging.getLogger(__name__)
+
+VOCAB_SIZE = 16
+
+
+class FakeBatcher:
+    def __init__(self, submit_cb, workitem_cb):
+        self.submit = submit_cb
+        self.reserve_workitem = workitem_cb
+        self.complete_workitem = workitem_cb
+
+
+class FakeProposer(SpeculativeProposer):
+    """Proposes the target's continuation, with the `wrong_at`-th draft off."""
+
+    def __init__(self, wrong_at=None):
+        self.wrong_at = wrong_at
+        self.calls = []
+        self.released = False
+
+    async def propose(self, tokens: List[int], count: int) -> List[int]:
+        self.calls.append((list(tokens), count))
+        drafts = []
+        last = tokens[-1]
+        for i in range(count):
+            last = _next_token(last)
+            drafts.append(last + 1 if i == self.wrong_at else last)
+        return drafts
+
+    def release(self):
+        self.released = True
+
+
+class AlternatingProposer(FakeProposer):
+    """Proposes drafts on every other step only."""
+
+    async def propose(self, tokens: List[int], count: int) -> List[int]:
+        drafts = await super().propose(tokens, count)
+        return drafts if len(self.calls) % 2 else []
+
+
+class MockVoidFuture:
+    def __init__(self):
+        self._event = asyncio.Event()
+
+    def set_success(self):
+        self._event.set()
+
+    def __await__(self):
+        return self._event.wait().__await__()
+
+
+class SchedulingBatcher:
+    """Batcher running submitted requests as its `Scheduler` schedules them."""
+
+    def __init__(self, device, ideal_batch_size=4):
+        self.device = device
+        self.scheduler = Scheduler(ideal_batch_size=ideal_batch_size)
+        self.pending: List[LlmInferenceExecRequest] = []
+
+    def submit(self, msg):
+        if not self.scheduler.handle_scheduler(msg):
+            self.pending.append(msg)
+
+    def reserve_workitem(self, *, rid, count):
+        self.scheduler.reserve_workitem(batcher=self, count=count, rid=rid)
+
+    def complete_workitem(self, *, rid, count):
+        self.scheduler.release_workitem(batcher=self, count=count, rid=rid)
+
+    def step(self) -> int:
+        """Runs the scheduled requests, returning how many ran."""
+        rid_map = {}
+        for request in self.pending:
+            rid_map.setdefault(request.orig_instance_id, []).append(request)
+        # Unreserved work is never flushed, only workgroups are scheduled.
+        jobs = self.scheduler.should_execute(rid_map, strobe=0)
+        scheduled = [request for job in jobs for request in job]
+        for request in scheduled:
+            self.pending.remove(request)
+            ids = request.input_token_ids
+            if request.phase == InferencePhase.DECODE:
+                _set_logits(self.device, request, ids[-1:])
+            else:
+                _set_logits(self.device, request, ids[request.start_position :])
+            request.done.set_success()
+        return len(scheduled)
+
+
+def _next_token(token: int) -> int:
+    return (token + 1) % VOCAB_SIZE
+
+
+def _set_logits(device, request: LlmInferenceExecRequest, rows: List[int]):
+    """Set logits choosing `_next_token` of each of `rows` greedily."""
+    logits = sfnp.device_array(device, [1, len(rows), VOCAB_SIZE], dtype=sfnp.float32)
+    data = [0.0] * (len(rows) * VOCAB_SIZE)
+    for i, token in enumerate(rows):
+        data[i * VOCAB_SIZE + _next_token(token)] = 1.0
+    logits.items = data
+    request.result_logits = logits
+
+
+def _batcher_workitem_callback(rid: int, count: int):
+    pass
+
+
+def test_supports_speculation():
+    assert not supports_speculation(DecodeConfig())
+    assert supports_speculation(DecodeConfig(speculative_tokens=4))
+    assert not supports_speculation(DecodeConfig(speculative_tokens=4, num_beams=2))
+    assert not supports_speculation(DecodeConfig(speculative_tokens=4, top_k=8))
+    assert not supports_speculation(DecodeConfig(speculative_tokens=4, top_p=0.9))
+
+
+@pytest.mark.parametrize(
+    "drafts,targets,expected",
+    [
+        ([], [7], [7]),
+        ([1, 2, 3], [1, 2, 3, 4], [1, 2, 3, 4]),
+        ([1, 2, 3], [1, 5, 3, 4], [1, 5]),
+        ([1, 2, 3], [6, 2, 3, 4], [6]),
+    ],
+)
+def test_accept_draft_tokens(drafts, targets, expected):
+    assert accept_draft_tokens(drafts, targets) == expected
+
+
+def test_greedy_tokens(device, exec_req):
+    _set_logits(device, exec_req, [3, 7, 15])
+    assert greedy_tokens(exec_req) == [4, 8, 0]
+
+
+def test_greedy_tokens_w_indices(device, exec_req):
+    _set_logits(device, exec_req, [3, 7])
+    indices = sfnp.device_array(device, [1, 2, VOCAB_SIZE], dtype=sfnp.int64)
+    indices.items = [VOCAB_SIZE - 1 - i for i in range(VOCAB_SIZE)] * 2
+    exec_req.result_indices = indices
+    assert greedy_tokens(exec_req) == [VOCAB_SIZE - 1 - 4, VOCAB_SIZE - 1 - 8]
+
+
+def test_speculative_stats():
+    stats = SpeculativeStats()
+    assert stats.acceptance_rate == 0.0
+    assert stats.tokens_per_step == 0.0
+
+    stats.record(4, 4)
+    stats.record(4, 0)
+    assert stats.steps == 2
+    assert stats.acceptance_rate == 0.5
+    assert stats.tokens_per_step == 3.0
+
+
+@pytest.mark.asyncio
+async def test_prompt_lookup_proposer():
+    proposer = PromptLookupProposer(max_ngram=2)
+
+    # No earlier occurrence of the last token.
+    assert await proposer.propose([1, 2, 3, 4], 3) == []
+
+    # The longest matching n-gram wins over a more recent shorter one.
+    tokens = [1, 2, 3, 4, 9, 2, 5, 1, 2]
+    assert await proposer.propose(tokens, 3) == [3, 4, 9]
+    assert await proposer.propose(tokens, 0) == []
+
+    # The index is extended with the tokens appended since.
+    tokens += [3, 4, 9, 2, 5]
+    assert await proposer.propose(tokens, 2) == [1, 2]
+
+    # The most recent occurrence wins among n-grams of the same size.
+    tokens += [7, 3, 4]
+    assert await proposer.propose(tokens, 4) == [9, 2, 5, 7]
+
+    proposer.release()
+    assert await proposer.propose([6, 6], 2) == [6]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "wrong_at,max_completion_tokens",
+    [
+        (None, 7),
+        (1, 7),
+        (0, 5),
+    ],
+)
+async def test_speculative_decode(device, exec_req, wrong_at, max_completion_tokens):
+    verified = []
+
+    def _prefill_callback(request: LlmInferenceExecRequest):
+        assert request.phase == InferencePhase.PREFILL
+        assert request.return_all_logits
+        ids = request.input_token_ids
+        verified.append((request.start_position, request.draft_token_count))
+        _set_logits(device, request, ids[request.start_position :])
+        request.done.set_success()
+
+    def _decode_callback(request: LlmInferenceExecRequest):
+        assert request.phase == InferencePhase.DECODE
+        ids = request.input_token_ids
+        verified.append((request.start_position, 0))
+        _set_logits(device, request, ids[-1:])
+        request.done.set_success()
+
+    results_array = []
+    streamed = []
+
+    decode_config = DecodeConfig(
+        max_completion_tokens=max_completion_tokens,
+        eos_token_id=-1,
+        speculative_tokens=3,
+    )
+    proposer = FakeProposer(wrong_at=wrong_at)
+    stats = SpeculativeStats()
+    config = build_token_selector_config(
+        decode_config,
+        prefill_batcher=FakeBatcher(_prefill_callback, _batcher_workitem_callback),
+        decode_batcher=FakeBatcher(_decode_callback, _batcher_workitem_callback),
+        results_callback=results_array.extend,
+        stream_callback=streamed.append,
+        speculative_proposer=proposer,
+        speculative_stats=stats,
+    )
+    token_selector = TokenSelector(token_selection_strategy_config=config)
+
+    exec_req.allocation = MagicMock()
+    exec_req.start_position = len(exec_req.input_token_ids) - 1
+    await token_selector.decode(exec_req)
+
+    last = exec_req.input_token_ids[exec_req.prompt_length - 1]
+    expected = []
+    for _ in range(max_completion_tokens):
+        last = _next_token(last)
+        expected.append(last)
+
+    assert streamed == expected
+    assert results_array == [expected]
+    assert proposer.released
+    # Steps without drafts are not recorded.
+    counts = [count for _, count in proposer.calls if count > 0]
+    assert stats.steps == len(counts)
+    assert stats.proposed_tokens == sum(counts)
+    if wrong_at is None:
+        assert stats.acceptance_rate == 1.0
+    else:
+        assert stats.accepted_tokens == sum(min(wrong_at, c) for c in counts)
+
+    # Each step verifies from the last token of the sequence so far.
+    for (start_position, draft_count), (tokens, count) in zip(verified, proposer.calls):
+        assert start_position == len(tokens) - 1
+        assert draft_count == count
+    assert exec_req.allocation.truncate.call_count == len(verified)
+
+
+@pytest.mark.asyncio
+async def test_speculative_decode_concurrent(device):
+    prefill_batcher = SchedulingBatcher(device)
+    decode_batcher = SchedulingBatcher(device)
+    # Long enough for the sequences to repeat, so prompt lookup finds drafts.
+    max_completion_tokens = 24
+
+    def _make_request(start):
+        request = LlmInferenceExecRequest(
+            phase=InferencePhase.PREFILL,
+            input_token_ids=list(range(start, start + 4)),
+            rid=str(uuid4()),
+        )
+        request.allocation = MagicMock()
+        request.start_position = len(request.input_token_ids) - 1
+        return request
+
+    def _make_selector(results, proposer=None, stats=None):
+        config = build_token_selector_config(
+            DecodeConfig(
+                max_completion_tokens=max_completion_tokens,
+                eos_token_id=-1,
+                speculative_tokens=2,
+            ),
+            prefill_batcher=prefill_batcher,
+            decode_batcher=decode_batcher,
+            results_callback=results.extend,
+            speculative_proposer=proposer,
+            speculative_stats=stats,
+        )
+        return TokenSelector(token_selection_strategy_config=config)
+
+    async def _run_batchers(tasks):
+        while not all(task.done() for task in tasks):
+            for _ in range(4):
+                await asyncio.sleep(0)
+            prefill_batcher.step()
+            decode_batcher.step()
+
+    with patch(
+        "shortfin_apps.llm.components.messages.sf.VoidFuture", new=MockVoidFuture
+    ):
+        # One request verifies drafts at every step, one alternates between
+        # verification and decode steps, one looks drafts up in its own
+        # tokens and one decodes regularly.
+        requests = [_make_request(start) for start in (0, 5, 10, 3)]
+        results = [[], [], [], []]
+        lookup_stats = SpeculativeStats()
+        selectors = [
+            _make_selector(results[0], FakeProposer()),
+            _make_selector(results[1], AlternatingProposer()),
+            _make_selector(results[2], PromptLookupProposer(max_ngram=2), lookup_stats),
+            _make_selector(results[3]),
+        ]
+        tasks = [
+            asyncio.create_task(selector.decode(request))
+            for selector, request in zip(selectors, requests)
+        ]
+        await asyncio.wait_for(_run_batchers(tasks), timeout=10)
+        await asyncio.gather(*tasks)
+
+    for request, result in zip(requests, results):
+        last = request.input_token_ids[request.prompt_length - 1]
+        expected = []
+        for _ in range(max_completion_tokens):
+            last = _next_token(last)
+            expected.append(last)
+        assert result[0][: len(expected)] == expected
+
+    assert lookup_stats.steps > 0
+    assert lookup_stats.acceptance_rate == 1.0
+
+    # All reservations were released.
+    assert not prefill_batcher.scheduler._workgroups
+    assert not decode_batcher.scheduler._workgroups
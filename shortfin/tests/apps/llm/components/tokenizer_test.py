@@ -68,3 +68,34 @@ def test_tokenizer_to_array(cpu_fiber, bert_tokenizer):
     print(masks)
     assert masks.view(0).items.tolist() == [1, 1, 1, 1, 1, 1, 0, 0, 0, 0, 0, 0]
     assert masks.view(1).items.tolist() == [1, 1, 1, 1, 1, 0, 0, 0, 0, 0, 0, 0]
+
+
+@pytest.fixture
+def byte_level_tokenizer():
+    import tokenizers
+    import shortfin_apps.llm.components.tokenizer as tokenizer
+
+    raw_tk = tokenizers.Tokenizer(tokenizers.models.BPE())
+    raw_tk.pre_tokenizer = tokenizers.pre_tokenizers.ByteLevel(add_prefix_space=False)
+    raw_tk.decoder = tokenizers.decoders.ByteLevel()
+    trainer = tokenizers.trainers.BpeTrainer(
+        vocab_size=300,
+        initial_alphabet=tokenizers.pre_tokenizers.ByteLevel.alphabet(),
+    )
+    raw_tk.train_from_iterator(["hello world, this is a test"] * 10, trainer)
+    return tokenizer.Tokenizer(raw_tk)
+
+
+def test_incremental_detokenizer(byte_level_tokenizer):
+    from shortfin_apps.llm.components.tokenizer import IncrementalDetokenizer
+
+    text = "hello world, 日本語 🎉\nthis is a test"
+    ids = byte_level_tokenizer.encode([text])[0].ids
+    detokenizer = IncrementalDetokenizer(byte_level_tokenizer)
+
+    parts = [detokenizer.add([token]) for token in ids]
+    parts.append(detokenizer.flush())
+
+    assert "".join(parts) == text
+    # Multi-byte characters are held back until complete.
+    assert all("\ufffd" not in part for part in parts)
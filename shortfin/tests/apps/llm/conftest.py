@@ -31,6 +31,7 @@ from shortfin_apps.llm.components.kvcache.page_pool import (
     PagePool,
     PageInfo,
     PagePoolConfig,
+    PageTransfers,
 )
 
 
@@ -94,6 +95,8 @@ class MockPagePool(PagePool):
             m.fill(0)
         page_table_host.copy_to(page_table)
         self.page_tables.append(page_table)
+        self.devices = [device]
+        self.transfers = PageTransfers(self.devices)
 
         self.config = PagePoolConfig(
             dtype=sfnp.float32,
@@ -0,0 +1,152 @@
+# Copyright 2025 Advanced Micro Devices, Inc.
+#
+# Licensed under the Apache License v2.0 with LLVM Exceptions.
+# See https://llvm.org/LICENSE.txt for license information.
+# SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+
+@pytest.fixture
+def model_params():
+    from shortfin_apps.sd.components.config_struct import ModelParams
+
+    return ModelParams(
+        max_seq_len=64,
+        num_latents_channels=4,
+        dims=[[1024, 1024]],
+        batch_sizes={
+            "clip": [1, 2, 4, 8],
+            "unet": [1, 4, 8],
+            "vae": [1],
+            "scheduler": [1, 2, 4, 8],
+        },
+    )
+
+
+def test_flight_batch_size(model_params):
+    assert model_params.flight_batch_sizes == [1, 4, 8]
+    assert model_params.flight_batch_size(1) == 1
+    assert model_params.flight_batch_size(2) == 4
+    assert model_params.flight_batch_size(4) == 4
+    assert model_params.flight_batch_size(7) == 8
+    assert model_params.flight_batch_size(9) == 9
+
+
+def test_form_flights():
+    from shortfin_apps.sd.components.service import form_flights
+
+    requests = [SimpleNamespace(batch_size=bs) for bs in [1, 2, 1, 1, 8, 1]]
+    flights = form_flights(requests, max_rows=4)
+    assert flights == [
+        requests[0:3],
+        [requests[3]],
+        [requests[4]],
+        [requests[5]],
+    ]
+    assert form_flights([], max_rows=4) == []
+
+
+class FakeRequest:
+    def __init__(self, name, steps):
+        self.name = name
+        self.steps = steps
+        self.done = self
+        self.completed = False
+
+    def set_success(self):
+        self.completed = True
+
+
+def test_denoise_loop():
+    from shortfin_apps.utils import DenoiseCohort, DenoiseLoop
+
+    loop = DenoiseLoop()
+    requests = [FakeRequest("a", 3), FakeRequest("b", 1)]
+    events = []
+    released = []
+
+    async def start(requests):
+        events.append(("start", len(requests)))
+        return [DenoiseCohort([request], request.steps) for request in requests]
+
+    async def step(cohort):
+        events.append(("step", cohort.requests[0].name, cohort.step))
+
+    async def finish(cohort):
+        events.append(("finish", cohort.requests[0].name))
+        for request in cohort.requests:
+            request.done.set_success()
+
+    asyncio.run(loop.run(requests, start, step, finish, release=released.append))
+
+    # Cohorts advance in turns and leave once their own steps are done.
+    assert events == [
+        ("start", 2),
+        ("step", "a", 0),
+        ("step", "b", 0),
+        ("finish", "b"),
+        ("step", "a", 1),
+        ("step", "a", 2),
+        ("finish", "a"),
+    ]
+    assert [cohort.requests[0].name for cohort in released] == ["b", "a"]
+    assert all(request.completed for request in requests)
+    assert not loop.cohorts
+
+
+def test_denoise_loop_failure():
+    from shortfin_apps.utils import DenoiseCohort, DenoiseLoop
+
+    loop = DenoiseLoop()
+    requests = [FakeRequest("a", 2)]
+    released = []
+
+    async def start(requests):
+        return [DenoiseCohort(requests, requests[0].steps)]
+
+    async def step(cohort):
+        raise RuntimeError("invocation failed")
+
+    async def finish(cohort):
+        raise AssertionError("failed cohorts are not finished")
+
+    asyncio.run(loop.run(requests, start, step, finish, release=released.append))
+    assert requests[0].completed
+    assert len(released) == 1
+    assert not loop.cohorts
+
+
+def test_adaptive_flush_policy():
+    from shortfin_apps.utils import AdaptiveFlushPolicy
+
+    policy = AdaptiveFlushPolicy(latency_budget_s=0.1, smoothing=0.5)
+    # Without an observed arrival rate, nothing is worth waiting for.
+    policy.record_arrival(now=0.0)
+    assert policy.flush_delay(1, 0.0, 4, now=0.0) == 0.0
+
+    # Requests arrive every 10ms: wait for the flight to fill.
+    for i in range(1, 5):
+        policy.record_arrival(now=i * 0.01)
+    assert policy.interarrival_s == pytest.approx(0.01)
+    assert policy.flush_delay(1, 0.0, 4, now=0.04) == pytest.approx(0.03)
+    assert policy.flush_delay(3, 0.085, 4, now=0.04) == pytest.approx(0.01)
+    assert policy.flush_delay(3, 0.095, 4, now=0.04) == 0.0
+    # Full flights and requests past their budget are flushed.
+    assert policy.flush_delay(4, 0.0, 4, now=0.04) == 0.0
+    assert policy.flush_delay(1, 0.1, 4, now=0.04) == 0.0
+    # The next request is not expected within the budget.
+    assert policy.flush_delay(1, 0.0, 4, now=0.2) == 0.0
+
+    # Flying one more request saves little: do not wait for it.
+    policy.record_flight(1, 1.0)
+    policy.record_flight(2, 1.995)
+    assert policy.batching_gain_s(1) == pytest.approx(0.005)
+    assert policy.batching_gain_s(2) is None
+    assert policy.flush_delay(1, 0.0, 4, now=0.04) == 0.0
+    policy.record_flight(2, 1.1)
+    policy.record_flight(2, 1.1)
+    assert policy.flush_delay(1, 0.0, 4, now=0.04) > 0.0
@@ -0,0 +1,82 @@
+# Copyright 2025 Advanced Micro Devices, Inc.
+#
+# Licensed under the Apache License v2.0 with LLVM Exceptions.
+# See https://llvm.org/LICENSE.txt for license information.
+# SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
+
+import numpy as np
+import pytest
+
+import shortfin.array as sfnp
+
+from shortfin_apps.utils import EmbeddingCache, embedding_key, host_array_view
+
+
+def test_embedding_key(lsys, fiber):
+    device = fiber.device(0)
+    ids = np.array([[1, 2, 3], [1, 2, 4]], dtype=np.int64)
+    assert embedding_key(device, ids[0]) == embedding_key(device, ids[0].copy())
+    assert embedding_key(device, ids[0]) != embedding_key(device, ids[1])
+    assert embedding_key(device, "t5xxl", 2, [1, 2]) == embedding_key(
+        device, "t5xxl", 2, [1, 2]
+    )
+    assert embedding_key(device, "t5xxl", 2, [1, 2]) != embedding_key(
+        device, "t5xxl", 1, [1, 2]
+    )
+
+
+def test_embedding_cache(lsys, fiber):
+    device = fiber.device(0)
+    # Room for two entries of 8 float16 values.
+    cache = EmbeddingCache(max_bytes=32)
+
+    async def main():
+        embeds = sfnp.device_array.for_device(device, [3, 8], sfnp.float16)
+        staging = embeds.for_transfer()
+        with staging.map(discard=True) as m:
+            m.fill(np.arange(24, dtype=np.float16).reshape(3, 8).tobytes())
+        embeds.copy_from(staging)
+
+        keys = [embedding_key(device, [i]) for i in range(3)]
+        assert cache.lookup(keys[0]) is None
+        inserted = await cache.insert(
+            device, {keys[0]: [embeds.view(0)], keys[1]: [embeds.view(1)]}
+        )
+        (cached,) = inserted[keys[0]]
+        assert cache.nbytes == 32
+
+        # Cached arrays are copies of the encoder outputs.
+        with staging.map(discard=True) as m:
+            m.fill(np.float16(0))
+        embeds.copy_from(staging)
+        (hit,) = cache.lookup(keys[0])
+        assert hit is cached
+        host = hit.for_transfer()
+        host.copy_from(hit)
+        view = await host_array_view(device, host)
+        np.testing.assert_array_equal(view, np.arange(8).reshape(1, 8))
+
+        # The least recently used entry makes room for new ones.
+        await cache.insert(device, {keys[2]: [embeds.view(2)]})
+        assert cache.evictions == 1
+        assert cache.lookup(keys[1]) is None
+        assert cache.lookup(keys[0]) is not None
+        assert cache.lookup(keys[2]) is not None
+        assert len(cache) == 2
+        assert cache.nbytes == 32
+
+        # Entries larger than the cache are not retained.
+        await cache.insert(device, {embedding_key(device, [3]): [embeds]})
+        assert len(cache) == 2
+
+    lsys.run(main())
+    assert cache.hits == 3
+    assert cache.misses == 2
+    assert cache.hit_rate == pytest.approx(0.6)
+    assert cache.counters() == {
+        "hits": 3,
+        "misses": 2,
+        "evictions": 1,
+        "entries": 2,
+        "bytes": 32,
+    }
@@ -0,0 +1,42 @@
+# Copyright 2025 Advanced Micro Devices, Inc.
+#
+# Licensed under the Apache License v2.0 with LLVM Exceptions.
+# See https://llvm.org/LICENSE.txt for license information.
+# SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
+
+import numpy as np
+
+import shortfin.array as sfnp
+
+from shortfin_apps.utils import host_array_view
+
+
+def test_host_array_view(lsys, fiber):
+    device = fiber.device(0)
+    expected = np.zeros([2, 3, 4, 4], dtype=np.float16)
+    expected[1] = np.arange(48).reshape(3, 4, 4)
+
+    async def main():
+        images = sfnp.device_array.for_device(device, [2, 3, 4, 4], sfnp.float16)
+        staging = images.for_transfer()
+        with staging.map(discard=True) as m:
+            m.fill(expected.tobytes())
+        images.copy_from(staging)
+
+        # An all-zero row must not keep the transfer from being observed.
+        images_host = sfnp.device_array.for_host(device, [2, 3, 4, 4], sfnp.float16)
+        images_host.copy_from(images)
+        view = await host_array_view(device, images_host)
+        assert view.shape == (2, 3, 4, 4)
+        assert view.dtype == np.float16
+        np.testing.assert_array_equal(view, expected)
+
+        # The view aliases the host array rather than copying it.
+        with images_host.map(write=True) as m:
+            m.fill(np.float16(2.0))
+        assert np.all(view == 2.0)
+
+        row_view = await host_array_view(device, images_host.view(1))
+        assert row_view.shape == (1, 3, 4, 4)
+
+    lsys.run(main())
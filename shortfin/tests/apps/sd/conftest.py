@@ -6,6 +6,7 @@
 
 import pytest
 
+import shortfin as sf
 from shortfin.support.deps import ShortfinDepNotFoundError
 
 
@@ -15,3 +16,16 @@ def require_deps():
         import shortfin_apps.sd
     except ShortfinDepNotFoundError as e:
         pytest.skip(f"Dep not available: {e}")
+
+
+@pytest.fixture(scope="function")
+def lsys():
+    sc = sf.host.CPUSystemBuilder()
+    lsys = sc.create_system()
+    yield lsys
+    lsys.shutdown()
+
+
+@pytest.fixture(scope="function")
+def fiber(lsys):
+    return lsys.create_fiber(lsys.create_worker("test-worker"))